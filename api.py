@@ -0,0 +1,388 @@
+"""Material Helper 核心接口
+
+不依赖界面上下文的批量材质资产操作，可在后台模式(blender -b)下使用。
+操作符只是这些函数的封装::
+
+    import bpy
+    from MaterialHelper import api
+
+    mats = [mat for mat in bpy.data.materials if mat.name.startswith('Brick')]
+    api.mark_tmp_assets(mats)
+    api.apply_assets(mats)
+"""
+
+import re
+import csv
+import json
+import bpy
+from pathlib import Path
+from collections import defaultdict
+from typing import Iterable, Optional
+
+from .ops.functions import ensure_current_file_asset_cats, C_TMP_ASSET_TAG, _uuid
+from .ops.preview_queue import PreviewQueue
+from .ops.preview_farm import PreviewFarm, default_output_dir
+from .ops.material_hash import material_fingerprint
+from .ops.material_usage import MaterialUsage, MATERIAL_DATA_COLLECTIONS
+
+Materials = Iterable[bpy.types.Material]
+
+
+def is_tmp_asset(mat: bpy.types.Material) -> bool:
+    return mat.asset_data is not None and C_TMP_ASSET_TAG in mat.asset_data.tags
+
+
+def generate_previews(mats: Materials, deferred: Optional[bool] = None, restore: bool = True) -> None:
+    """生成资产预览
+
+    :param mats: 材质
+    :param deferred: 使用预览队列分时生成，默认在界面模式下开启，后台模式下直接生成
+    :param restore: 允许从预览缓存恢复，为False时重新渲染
+    """
+    if deferred is None:
+        deferred = not bpy.app.background
+
+    if deferred:
+        PreviewQueue.request(mats, restore)
+    else:
+        for mat in mats:
+            mat.asset_generate_preview()
+
+
+def render_library_previews(filepath: str, output_dir: Optional[str] = None, resolution: int = 256,
+                            samples: int = 64, workers: int = 0, write_previews: bool = False,
+                            overwrite: bool = False) -> dict[str, float]:
+    """用多个后台进程以Cycles渲染库文件中所有材质的预览，阻塞直到完成
+
+    材质指纹未变化且已渲染的PNG会被跳过，中断后再次调用即可继续。
+
+    :param filepath: 库文件路径
+    :param output_dir: PNG输出目录，默认为库文件旁的 <名称>_previews
+    :param resolution: 分辨率
+    :param samples: 采样数
+    :param workers: 进程数，0为按核心数自动设置
+    :param write_previews: 将PNG写入资产预览，外部库文件会被保存
+    :param overwrite: 重新渲染所有材质
+    :return: 本次渲染的 {材质名: 渲染时间(秒)}
+    """
+    output_dir = Path(output_dir) if output_dir else default_output_dir(filepath)
+    PreviewFarm.start(filepath, output_dir, resolution, samples, workers, write_previews, overwrite)
+    PreviewFarm.wait()
+    return {name: PreviewFarm.log[name]['time'] for name in PreviewFarm.rendered}
+
+
+def load_library_assets(filepath: str, names: Optional[Iterable[str]] = None, link: bool = False,
+                        assets_only: bool = True) -> list[bpy.types.Material]:
+    """从库文件追加或链接材质，已导入过的材质直接复用
+
+    :param filepath: 库文件路径
+    :param names: 材质名，默认为文件中所有材质
+    :param link: 链接而非追加
+    :param assets_only: 只加载标记为资产的材质
+    :return: 材质
+    """
+    # 延迟导入，asset_shelf 会反过来导入 api
+    from .asset_shelf.functions import load_assets_from
+
+    if names is None:
+        names = library_material_names(filepath, assets_only)
+    return load_assets_from(filepath, {'materials': list(names)}, link=link, assets_only=assets_only)
+
+
+def library_material_names(filepath: str, assets_only: bool = True) -> list[str]:
+    """库文件中的材质名，文件修改前结果会被缓存
+
+    :param filepath: 库文件路径
+    :param assets_only: 只列出标记为资产的材质
+    """
+    from .asset_shelf.functions import list_assets
+
+    return list(list_assets(filepath, assets_only).get('materials', []))
+
+
+def mark_tmp_assets(mats: Materials, preview: bool = True) -> list[bpy.types.Material]:
+    """将材质标记为临时资产并放入材质助手目录
+
+    :param mats: 材质
+    :param preview: 生成预览
+    :return: 新标记的材质
+    """
+    mats = [mat for mat in mats if not mat.is_grease_pencil]
+    marked = []
+
+    for mat in mats:
+        if mat.asset_data: continue
+        mat.asset_mark()
+        mat.asset_data.tags.new(C_TMP_ASSET_TAG)
+        marked.append(mat)
+
+    if bpy.data.filepath != '':
+        ensure_current_file_asset_cats()
+        for mat in mats:
+            if not is_tmp_asset(mat): continue
+            if mat.asset_data.catalog_id != _uuid:
+                mat.asset_data.catalog_id = _uuid
+
+    # 设置目录后再请求预览，以便优先处理可见材质
+    if preview and marked:
+        generate_previews(marked)
+
+    return marked
+
+
+def clear_tmp_assets(mats: Optional[Materials] = None) -> int:
+    """清除临时资产
+
+    :param mats: 材质，默认为所有材质
+    :return: 清除数量
+    """
+    if mats is None: mats = bpy.data.materials
+
+    count = 0
+    for mat in mats:
+        if not is_tmp_asset(mat): continue
+        mat.asset_clear()
+        count += 1
+
+    return count
+
+
+def apply_assets(mats: Materials) -> list[bpy.types.Material]:
+    """将临时资产应用为真资产
+
+    :param mats: 材质
+    :return: 应用的材质
+    """
+    applied = []
+    for mat in mats:
+        if not is_tmp_asset(mat): continue
+        tag = mat.asset_data.tags[C_TMP_ASSET_TAG]
+        mat.asset_data.tags.remove(tag)
+        applied.append(mat)
+
+    return applied
+
+
+def duplicate_materials(mats: Materials) -> list[bpy.types.Material]:
+    """复制材质
+
+    :param mats: 材质
+    :return: 新材质
+    """
+    return [mat.copy() for mat in mats]
+
+
+def replace_materials(mapping: dict[bpy.types.Material, bpy.types.Material]) -> int:
+    """替换材质的所有使用者，一次遍历完成所有替换
+
+    :param mapping: {原材质: 新材质}
+    :return: 替换的材质数量
+    """
+    mapping = {src: dst for src, dst in mapping.items() if src != dst and dst is not None}
+    if not mapping: return 0
+
+    def remap(mat):
+        return mapping.get(mat, mat)
+
+    # 常见使用者一次遍历
+    for attr in MATERIAL_DATA_COLLECTIONS:
+        for data in getattr(bpy.data, attr, ()):
+            if data.library is not None: continue
+            for i, mat in enumerate(data.materials):
+                if mat in mapping:
+                    data.materials[i] = remap(mat)
+
+    for obj in bpy.data.objects:
+        if obj.library is not None: continue
+        for slot in obj.material_slots:
+            if slot.link == 'OBJECT' and slot.material in mapping:
+                slot.material = remap(slot.material)
+
+    # 其他使用者(几何节点、修改器输入等)
+    for src, dst in mapping.items():
+        if src.users > int(src.use_fake_user):
+            src.user_remap(dst)
+
+    return len(mapping)
+
+
+def mapping_user_counts(mapping: dict[bpy.types.Material, bpy.types.Material]) -> dict[bpy.types.Material, int]:
+    """每个替换将影响的使用者数量
+
+    :param mapping: {原材质: 新材质}
+    :return: {原材质: 使用者数量}
+    """
+    usage = MaterialUsage()
+    return {src: usage.user_count(src) for src in mapping}
+
+
+def mapping_from_names(names: dict[str, str]) -> dict[bpy.types.Material, bpy.types.Material]:
+    """从名称表获取材质映射，跳过不存在的材质
+
+    :param names: {原材质名: 新材质名}
+    :return: {原材质: 新材质}
+    """
+    materials = bpy.data.materials
+    mapping = {}
+    for src_name, dst_name in names.items():
+        src, dst = materials.get(src_name), materials.get(dst_name)
+        if src is None or dst is None:
+            print(f'Material Helper: Skip mapping {src_name} -> {dst_name}, material not found')
+            continue
+        mapping[src] = dst
+    return mapping
+
+
+def mapping_from_file(filepath: str) -> dict[bpy.types.Material, bpy.types.Material]:
+    """从JSON({原材质名: 新材质名})或CSV(原材质名,新材质名)文件读取映射
+
+    :param filepath: 文件路径
+    :return: {原材质: 新材质}
+    """
+    path = Path(bpy.path.abspath(filepath))
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.suffix.lower() == '.json':
+            names = json.load(f)
+        else:
+            names = {row[0].strip(): row[1].strip() for row in csv.reader(f) if len(row) >= 2}
+
+    return mapping_from_names(names)
+
+
+def mapping_from_rules(rules: Iterable[tuple[str, str]],
+                       mats: Optional[Materials] = None) -> dict[bpy.types.Material, bpy.types.Material]:
+    """按名称正则规则获取映射，如 (r'^(.*)\\.\\d{3}$', r'\\1') 将Brick.001映射到Brick
+
+    :param rules: [(正则, 替换)]，按顺序使用第一条匹配的规则
+    :param mats: 材质，默认为所有材质
+    :return: {原材质: 新材质}
+    """
+    if mats is None: mats = bpy.data.materials
+    rules = [(re.compile(pattern), replacement) for pattern, replacement in rules]
+
+    names = {}
+    for mat in mats:
+        for pattern, replacement in rules:
+            if not pattern.search(mat.name): continue
+            names[mat.name] = pattern.sub(replacement, mat.name)
+            break
+
+    return mapping_from_names(names)
+
+
+def material_dependencies(mats: Materials) -> list[bpy.types.ID]:
+    """获取只被这些材质使用的节点组和图片
+
+    :param mats: 材质
+    :return: 删除材质后将成为孤立数据的ID
+    """
+    removing = set()
+    candidates = set()
+
+    def collect(tree):
+        for node in tree.nodes:
+            if isinstance(getattr(node, 'image', None), bpy.types.Image):
+                candidates.add(node.image)
+            if isinstance(getattr(node, 'node_tree', None), bpy.types.NodeTree):
+                if node.node_tree not in candidates:
+                    candidates.add(node.node_tree)
+                    collect(node.node_tree)
+
+    for mat in mats:
+        removing.add(mat)
+        if mat.node_tree:
+            removing.add(mat.node_tree)
+            collect(mat.node_tree)
+
+    candidates = {id_data for id_data in candidates if
+                  id_data.library is None and not id_data.use_fake_user and id_data.asset_data is None}
+    if not candidates: return []
+
+    user_map = bpy.data.user_map(subset=candidates)
+    # 反复检查，节点组内的节点组在外层被移除后才成为孤立数据
+    orphans = set()
+    changed = True
+    while changed:
+        changed = False
+        for id_data in candidates - orphans:
+            if user_map[id_data] <= removing | orphans:
+                orphans.add(id_data)
+                changed = True
+
+    return list(orphans)
+
+
+def delete_materials(mats: Materials, remove_dependencies: bool = False) -> tuple[int, int]:
+    """使用batch_remove一次性删除材质
+
+    :param mats: 材质
+    :param remove_dependencies: 同时删除只被这些材质使用的节点组和图片
+    :return: (删除材质数量, 删除依赖数量)
+    """
+    mats = list(mats)
+    if not mats: return 0, 0
+
+    dependencies = material_dependencies(mats) if remove_dependencies else []
+    bpy.data.batch_remove(mats + dependencies)
+
+    return len(mats), len(dependencies)
+
+
+# 影响渲染结果但不在节点树中的材质设置
+_DEDUPE_SETTINGS = ('blend_method', 'shadow_method', 'surface_render_method', 'use_backface_culling',
+                    'use_screen_refraction', 'refraction_depth', 'alpha_threshold', 'pass_index',
+                    'displacement_method', 'volume_intersection_method', 'use_sss_translucency')
+
+
+def _dedupe_key(mat: bpy.types.Material, tree_hashes: dict) -> tuple:
+    settings = tuple(getattr(mat, attr, None) for attr in _DEDUPE_SETTINGS)
+    return material_fingerprint(mat, tree_hashes), settings
+
+
+def _canonical_sort_key(mat: bpy.types.Material) -> tuple:
+    """优先保留：真资产 > 无数字后缀的名称 > 使用者多 > 名称短"""
+    is_true_asset = mat.asset_data is not None and not is_tmp_asset(mat)
+    has_suffix = re.search(r'\.\d{3,}$', mat.name) is not None
+    return not is_true_asset, mat.library is not None, has_suffix, -mat.users, len(mat.name), mat.name
+
+
+def find_duplicate_materials(mats: Optional[Materials] = None) -> list[tuple[bpy.types.Material,
+                                                                                list[bpy.types.Material]]]:
+    """按节点树结构查找重复材质
+
+    :param mats: 材质，默认为所有材质
+    :return: [(保留的材质, [重复材质])]
+    """
+    if mats is None: mats = bpy.data.materials
+
+    tree_hashes = {}
+    groups = defaultdict(list)
+    for mat in mats:
+        if mat.is_grease_pencil: continue
+        groups[_dedupe_key(mat, tree_hashes)].append(mat)
+
+    result = []
+    for group in groups.values():
+        if len(group) < 2: continue
+        group.sort(key=_canonical_sort_key)
+        canonical = group[0]
+        # 链接材质和真资产不合并
+        dups = [mat for mat in group[1:] if mat.library is None and
+                (mat.asset_data is None or is_tmp_asset(mat))]
+        if dups:
+            result.append((canonical, dups))
+
+    return result
+
+
+def merge_duplicate_materials(groups: list[tuple[bpy.types.Material, list[bpy.types.Material]]]) -> int:
+    """将重复材质的使用者重映射到保留的材质并删除重复材质
+
+    :param groups: find_duplicate_materials的结果
+    :return: 删除的材质数量
+    """
+    mapping = {mat: canonical for canonical, dups in groups for mat in dups}
+    replace_materials(mapping)
+
+    count, _ = delete_materials(mapping.keys())
+    return count
@@ -1,4 +1,4 @@
-from . import gui, ops, keymaps
+from . import gui, ops, keymaps, raycast, preview_texture
 
 import threading
 
@@ -7,9 +7,13 @@ def register():
     gui.register()
     ops.register()
     keymaps.register()
+    raycast.register()
+    preview_texture.register()
 
 
 def unregister():
+    preview_texture.unregister()
+    raycast.unregister()
     keymaps.unregister()
     ops.unregister()
     gui.unregister()
@@ -6,52 +6,131 @@
 Pose Library - functions.
 """
 
+import os
 from pathlib import Path
-from typing import Any, List, Iterable
+from typing import Any, Dict, List, Iterable, Optional, Tuple
 
 Datablock = Any
+AssetNames = Dict[str, List[str]]
 
 import bpy
 
+# (path, mtime, assets_only): {collection attribute: [names]}
+_listing_cache: Dict[Tuple[str, float, bool], AssetNames] = {}
 
-def load_assets_from(filepath: Path) -> List[Datablock]:
-    if not has_assets(filepath):
+# Custom properties recording where an appended datablock came from.
+SOURCE_PATH_PROP = "mathp_source_path"
+SOURCE_NAME_PROP = "mathp_source_name"
+
+
+def _normpath(filepath) -> str:
+    return os.path.normcase(os.path.normpath(bpy.path.abspath(str(filepath))))
+
+
+def list_assets(filepath: Path, assets_only: bool = True) -> AssetNames:
+    """Names of the datablocks marked as asset, per collection attribute.
+
+    The listing is cached until the file is modified.
+
+    :param assets_only: List every datablock instead when False.
+    """
+    path = _normpath(filepath)
+    key = (path, os.path.getmtime(path), assets_only)
+    listing = _listing_cache.get(key)
+    if listing is not None:
+        return listing
+
+    with bpy.data.libraries.load(path, assets_only=assets_only) as (data_from, _):
+        listing = {attr: list(getattr(data_from, attr)) for attr in dir(data_from)
+                   if getattr(data_from, attr)}
+
+    # Drop listings of older versions of the same file.
+    for old_key in [k for k in _listing_cache if k[0] == path and k[2] == assets_only]:
+        del _listing_cache[old_key]
+    _listing_cache[key] = listing
+    return listing
+
+
+def _imported_from(path: str, attr: str, link: bool) -> Dict[str, Datablock]:
+    """Datablocks of one collection already linked or appended from the library.
+
+    Linked datablocks are matched by their library, appended ones by the
+    source properties set in load_assets_from.
+    """
+    collection = getattr(bpy.data, attr, None)
+    if collection is None:
+        return {}
+
+    imported = {}
+    for datablock in collection:
+        if link:
+            library = datablock.library
+            if library and _normpath(library.filepath) == path:
+                imported[datablock.name] = datablock
+        elif datablock.library is None:
+            source = datablock.get(SOURCE_PATH_PROP)
+            if source is not None and _normpath(source) == path:
+                imported.setdefault(datablock.get(SOURCE_NAME_PROP, datablock.name), datablock)
+    return imported
+
+
+def load_assets_from(filepath: Path, names: Optional[Dict[str, Iterable[str]]] = None,
+                     link: bool = False, assets_only: bool = True) -> List[Datablock]:
+    """Append or link assets from a blend file.
+
+    :param filepath: Library blend file.
+    :param names: {collection attribute: [asset names]}, e.g. {"materials": ["Gold"]}.
+        Defaults to every asset in the file.
+    :param link: Link instead of append.
+    :param assets_only: Only datablocks marked as asset can be loaded.
+    :return: The requested assets, reusing datablocks already imported from the file.
+    """
+    listing = list_assets(filepath, assets_only)
+    if not listing:
         # Avoid loading any datablocks when there are none marked as asset.
         return []
 
-    # Append everything from the file.
-    with bpy.data.libraries.load(str(filepath)) as (
-        data_from,
-        data_to,
-    ):
-        for attr in dir(data_to):
-            setattr(data_to, attr, getattr(data_from, attr))
-
-    # Iterate over the appended datablocks to find assets.
-    def loaded_datablocks() -> Iterable[Datablock]:
-        for attr in dir(data_to):
-            datablocks = getattr(data_to, attr)
-            for datablock in datablocks:
-                yield datablock
+    path = _normpath(filepath)
+    if names is None:
+        names = listing
 
     loaded_assets = []
-    for datablock in loaded_datablocks():
-        if not getattr(datablock, "asset_data", None):
-            continue
+    to_load: AssetNames = {}
+    for attr, wanted in names.items():
+        available = set(listing.get(attr, ()))
+        imported = _imported_from(path, attr, link)
+        for name in wanted:
+            if name not in available:
+                continue
+            if name in imported:
+                loaded_assets.append(imported[name])
+            else:
+                to_load.setdefault(attr, []).append(name)
+
+    if not to_load:
+        return loaded_assets
 
-        # Fake User is lost when appending from another file.
-        datablock.use_fake_user = True
-        loaded_assets.append(datablock)
+    # Only the requested datablocks (and their dependencies) are read.
+    with bpy.data.libraries.load(path, link=link, assets_only=assets_only) as (
+        _,
+        data_to,
+    ):
+        for attr, wanted in to_load.items():
+            setattr(data_to, attr, wanted)
+
+    for attr, wanted in to_load.items():
+        for name, datablock in zip(wanted, getattr(data_to, attr)):
+            if datablock is None:
+                continue
+            if not link:
+                # Fake User is lost when appending from another file.
+                datablock.use_fake_user = datablock.asset_data is not None
+                # Remember the source, the name may get a .001 suffix.
+                datablock[SOURCE_PATH_PROP] = path
+                datablock[SOURCE_NAME_PROP] = name
+            loaded_assets.append(datablock)
     return loaded_assets
 
 
 def has_assets(filepath: Path) -> bool:
-    with bpy.data.libraries.load(str(filepath), assets_only=True) as (
-        data_from,
-        _,
-    ):
-        for attr in dir(data_from):
-            data_names = getattr(data_from, attr)
-            if data_names:
-                return True
-    return False
+    return bool(list_assets(filepath))
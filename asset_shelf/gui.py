@@ -13,6 +13,8 @@ from bpy.types import (
 from pathlib import Path
 from bl_ui_utils.layout import operator_context
 
+from ..ops.library_refresh import LibraryRefresh
+
 
 class MATHP_AST_asset_library(bpy.types.AssetShelf):
     bl_space_type = "VIEW_3D"
@@ -48,13 +50,10 @@ class MATHP_OT_refresh_preview(bpy.types.Operator):
     bl_label = 'Refresh'
 
     def execute(self, context):
-        import bpy
-        a = context.area
-        regions = [r for r in a.regions if r.type == 'ASSET_SHELF']
-        if regions:
-            with bpy.context.temp_override(area=a, region=regions[0]):
-                bpy.ops.asset.library_refresh()
-
+        # 在按钮所在的资产架中立即刷新
+        LibraryRefresh.request()
+        LibraryRefresh.flush(context)
+        self.report({'INFO'}, f'{LibraryRefresh.saved()} refresh requests merged')
         return {'FINISHED'}
 
 
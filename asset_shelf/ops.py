@@ -1,15 +1,20 @@
 import bpy
-from bpy.props import StringProperty, EnumProperty
+from bpy.props import StringProperty, EnumProperty, BoolProperty
 from bpy.types import Operator
 from pathlib import Path
 import blf
+import bmesh
 import gpu
 import math
+import time
 from gpu_extras.batch import batch_for_shader
 from gpu_extras.presets import draw_texture_2d
 from bpy.app.translations import pgettext_iface as _p
 
-from .raycast import ray_cast
+from .raycast import ray_cast, BVHCache
+from .preview_texture import PreviewTextureCache
+from .. import api
+from ..ops.library_refresh import LibraryRefresh
 
 
 class AssetUser:
@@ -24,18 +29,7 @@ class AssetUser:
         self.asset_name = asset_dis.name
         self.asset_dir = Path(self.blend_path).parent
         self.material = context.asset.local_id
-        bpy.ops.asset.library_refresh()
-
-    def ensure_mat_image(self, context):
-        asset = context.asset.local_id
-        asset_preview = asset.preview
-        img = bpy.data.images.new('mathp_preview', *asset_preview.image_size, alpha=True)
-        img.file_format = "PNG"
-        try:
-            img.pixels.foreach_set(asset_preview.image_pixels_float)
-        except TypeError:
-            print(f"Could not save thumbnail from '{asset.name}'")
-        return img
+        LibraryRefresh.request()
 
 
 class MATHP_OT_asset_double_click(AssetUser, Operator):
@@ -45,7 +39,7 @@ class MATHP_OT_asset_double_click(AssetUser, Operator):
     bl_description = "Double click to %s"
 
     def execute(self, context):
-        bpy.ops.asset.library_refresh()
+        LibraryRefresh.request()
         mat = context.asset.local_id
         bpy.ops.mathp.edit_material_asset("INVOKE_DEFAULT", material=mat.name)
         return {'FINISHED'}
@@ -61,9 +55,20 @@ class MATHP_OT_asset_delete(AssetUser, Operator):
     def description(cls, context, event):
         return "Delete %s" % context.asset.local_id.name
 
+    remove_dependencies: BoolProperty(name='Remove Dependencies',
+                                      description='Also delete node groups and images only used by these materials',
+                                      default=False)
+
     def execute(self, context):
         mat = context.asset.local_id
-        bpy.data.materials.remove(mat)
+
+        start = time.perf_counter()
+        count, dep_count = api.delete_materials([mat], self.remove_dependencies)
+
+        LibraryRefresh.request()
+
+        self.report({'INFO'}, f'{count} materials, {dep_count} dependencies deleted '
+                              f'({time.perf_counter() - start:.2f}s)')
         return {'FINISHED'}
 
 
@@ -96,6 +101,52 @@ class MATHP_OT_asset_copy(AssetUser, Operator):
         return {'FINISHED'}
 
 
+def assign_slot(obj: bpy.types.Object, slot_index: int, mat: bpy.types.Material):
+    """设置材质槽，没有材质槽时新建"""
+    if obj.material_slots:
+        obj.material_slots[min(slot_index, len(obj.material_slots) - 1)].material = mat
+    elif obj.data is not None and hasattr(obj.data, 'materials'):
+        obj.data.materials.append(mat)
+
+
+def assign_first_slot(objs, mat: bpy.types.Material):
+    """批量设置第一个材质槽，共享数据只添加一次材质槽"""
+    appended = set()
+    for obj in objs:
+        if obj.material_slots:
+            obj.material_slots[0].material = mat
+        elif hasattr(obj.data, 'materials') and obj.data not in appended:
+            obj.data.materials.append(mat)
+            appended.add(obj.data)
+
+
+def assign_face_new_slot(context, obj: bpy.types.Object, face_index: int, mat: bpy.types.Material) -> bool:
+    """只将命中的面设为该材质，已有相同材质的槽时复用
+
+    :return: 修改器改变了面的数量时无法对应原始网格的面，返回False
+    """
+    mesh = obj.data
+    eval_obj = obj.evaluated_get(context.evaluated_depsgraph_get())
+    # 编辑模式下网格数据在退出前不会更新，需通过bmesh修改
+    bm = bmesh.from_edit_mesh(mesh) if mesh.is_editmode else None
+    faces = bm.faces if bm else mesh.polygons
+    if len(eval_obj.data.polygons) != len(faces) or not 0 <= face_index < len(faces):
+        return False
+
+    slot_index = next((i for i, slot in enumerate(obj.material_slots) if slot.material == mat), None)
+    if slot_index is None:
+        mesh.materials.append(mat)
+        slot_index = len(obj.material_slots) - 1
+
+    if bm:
+        faces.ensure_lookup_table()
+        faces[face_index].material_index = slot_index
+        bmesh.update_edit_mesh(mesh, loop_triangles=False, destructive=False)
+    else:
+        mesh.polygons[face_index].material_index = slot_index
+    return True
+
+
 def ui_scale():
     # return bpy.context.preferences.system.dpi * bpy.context.preferences.system.pixel_size / 72
     return bpy.context.preferences.system.dpi * 1 / 72
@@ -119,15 +170,15 @@ def draw_callback_px(self, context):
     blf.size(font_id, font_size)
     blf.position(font_id, self.mouse_x + offsetX, self.mouse_y, 0)
     if self.target_obj:
-        blf.draw(font_id, self.asset_name + ' > ' + self.target_obj.name)
+        mode = {'NEW_SLOT': ' (+)', 'SELECTED': ' (*)'}.get(self.mode, '')
+        blf.draw(font_id, self.asset_name + ' > ' + self.target_obj.name + mode)
     else:
         blf.draw(font_id, self.asset_name)
 
     # draw image
-    img = self.draw_img
-    if self.draw_img:
+    texture = self.draw_texture
+    if texture:
         gpu.state.blend_set("ALPHA")  # enable alpha blend
-        texture = gpu.texture.from_image(img)
         draw_texture_2d(texture, img_start_pt, img_size, img_size)
         gpu.state.blend_set("NONE")
 
@@ -138,38 +189,78 @@ class ADJT_OT_asset_drag_drop(AssetUser, Operator):
     bl_description = "Select those bones that are used in this pose"
     bl_options = {'REGISTER', 'UNDO'}
 
+    drop_mode: EnumProperty(name='Drop Mode', items=[
+        ('FACE', 'Face Slot', 'Assign to the material slot of the face under the mouse'),
+        ('NEW_SLOT', 'New Slot', 'Add a material slot and assign it to the face under the mouse only (Ctrl)'),
+        ('SELECTED', 'Selected Objects', 'Assign to the first slot of all selected objects (Shift)'),
+    ], default='FACE')
+
     _handle = None
     target_obj = None
-    draw_img = None
+    hit_index = -1
+    mode = 'FACE'
+    draw_texture = None
+    # 光线投射频率限制，Blender没有提供显示器刷新率，使用60Hz
+    # 跳过的移动由计时器补上，鼠标停止后目标仍会更新
+    hit_interval = 1 / 60
+    last_hit_test = 0
+    hit_test_pending = False
+    _timer = None
 
     def execute(self, context):
         if self.target_obj:
-            self.assign_material()
+            self.assign_material(context)
 
         return {'FINISHED'}
 
     def is_drop_action(self):
         return True
 
-    def assign_material(self):
-        # if target has material slot
-        if self.target_obj.material_slots:
-            self.target_obj.material_slots[0].material = self.material
+    def current_mode(self, event) -> str:
+        """按住Ctrl为新建材质槽，Shift为所有选中物体"""
+        if event.shift: return 'SELECTED'
+        if event.ctrl: return 'NEW_SLOT'
+        return self.drop_mode
+
+    def hit_slot(self, context) -> int:
+        """命中面的材质槽序号"""
+        if self.hit_index < 0: return 0
+        slots = BVHCache.get_face_slots(self.target_obj, context.evaluated_depsgraph_get())
+        if 0 <= self.hit_index < len(slots):
+            return slots[self.hit_index]
+        return 0
+
+    def assign_material(self, context):
+        obj = self.target_obj
+        if self.mode == 'SELECTED':
+            objs = set(context.selected_objects)
+            objs.add(obj)
+            assign_first_slot(objs, self.material)
+        elif self.mode == 'NEW_SLOT' and obj.type == 'MESH' and self.hit_index >= 0:
+            if not assign_face_new_slot(context, obj, self.hit_index, self.material):
+                self.report({'WARNING'}, 'Modifiers change the faces, assign to the slot instead')
+                assign_slot(obj, self.hit_slot(context), self.material)
         else:
-            # create new slot
-            self.target_obj.data.materials.append(self.material)
+            assign_slot(obj, self.hit_slot(context), self.material)
 
     def invoke(self, context, event):
         self.ensure_asset(context)
         self.load_pv_image(context)
 
         self.target_obj = None
+        self.hit_index = -1
+        self.mode = self.drop_mode
+        self.last_hit_test = 0
+        self.hit_test_pending = False
         self.mouse_x = event.mouse_region_x
         self.mouse_y = event.mouse_region_y
         self.region = [region for region in context.area.regions if region.type == 'WINDOW'][0]
 
         # add handle
         self._handle = bpy.types.SpaceView3D.draw_handler_add(draw_callback_px, (self, context), 'WINDOW', 'POST_PIXEL')
+        self._timer = context.window_manager.event_timer_add(self.hit_interval, window=context.window)
+        # 拖拽期间场景不变，候选物体只收集一次
+        BVHCache.begin_drag()
         context.window_manager.modal_handler_add(self)
         self.update_area(context)
         return {"RUNNING_MODAL"}
@@ -183,17 +274,28 @@ class ADJT_OT_asset_drag_drop(AssetUser, Operator):
             delta_y = event.mouse_region_y - self.mouse_y
 
             if self.is_drop_action():
-                result, target_obj, view_point, world_loc, normal, location, matrix = ray_cast(context, event)
-                if result:
-                    self.target_obj = target_obj
+                now = time.perf_counter()
+                if now - self.last_hit_test >= self.hit_interval:
+                    self.last_hit_test = now
+                    self.hit_test(context, event)
                 else:
-                    self.target_obj = None
+                    self.hit_test_pending = True
 
             self.mouse_x = event.mouse_region_x
             self.mouse_y = event.mouse_region_y
 
+        elif event.type == 'TIMER' and event.timer == self._timer:
+            # 计时器事件同样带有鼠标位置和修饰键
+            if self.hit_test_pending and self.is_drop_action():
+                self.last_hit_test = time.perf_counter()
+                self.hit_test(context, event)
+
         elif event.type == 'LEFTMOUSE' and event.value == 'RELEASE':
             if self.is_drop_action():
+                # 跳过的移动事件，在放下时补上
+                if self.hit_test_pending:
+                    self.hit_test(context, event)
+                self.mode = self.current_mode(event)
                 if self.target_obj:
                     context.view_layer.objects.active = self.target_obj
                     self.execute(context)
@@ -210,22 +312,29 @@ class ADJT_OT_asset_drag_drop(AssetUser, Operator):
 
         return {'RUNNING_MODAL'}
 
+    def hit_test(self, context, event):
+        result, target_obj, view_point, world_loc, normal, location, matrix, index = ray_cast(context, event)
+        self.target_obj = target_obj if result else None
+        self.hit_index = index if result else -1
+        self.mode = self.current_mode(event)
+        self.hit_test_pending = False
+
     def remove_handle(self, context):
         if self._handle:
             bpy.types.SpaceView3D.draw_handler_remove(self._handle, 'WINDOW')
             self._handle = None
-        self.remove_pv_image()
+        if self._timer:
+            context.window_manager.event_timer_remove(self._timer)
+            self._timer = None
+        BVHCache.end_drag()
+        self.draw_texture = None
 
     def update_area(self, context):
         # update the area
         context.area.tag_redraw()
 
     def load_pv_image(self, context):
-        self.draw_img = self.ensure_mat_image(context)
-
-    def remove_pv_image(self):
-        if self.draw_img:
-            bpy.data.images.remove(self.draw_img)
+        self.draw_texture = PreviewTextureCache.get(context.asset.local_id)
 
 
 def register():
@@ -0,0 +1,61 @@
+import bpy
+import gpu
+import zlib
+from collections import OrderedDict
+from typing import Optional
+
+from bpy.app.handlers import persistent
+
+from ..ops.preview_cache import read_preview_pixels
+
+
+class PreviewTextureCache:
+    """拖拽预览的GPU纹理，按最近使用保留，键为 (材质, 像素校验值, 尺寸)
+
+    预览像素可能由预览缓存、渲染农场或Blender后台渲染写入，没有统一的通知，
+    因此每次使用时读取像素计算校验值，像素未变化时不再上传纹理，也不创建图像数据块。
+    """
+    textures: OrderedDict[tuple, gpu.types.GPUTexture] = OrderedDict()
+    max_size: int = 16
+
+    @classmethod
+    def get(cls, mat: bpy.types.Material) -> Optional[gpu.types.GPUTexture]:
+        try:
+            result = read_preview_pixels(mat)
+        except TypeError:
+            print(f"Material Helper: Could not read preview from '{mat.name}'")
+            return None
+        if result is None: return None
+
+        width, height, pixels = result
+        key = (mat.session_uid, zlib.crc32(pixels), width, height)
+
+        texture = cls.textures.get(key)
+        if texture is not None:
+            cls.textures.move_to_end(key)
+            return texture
+
+        buffer = gpu.types.Buffer('FLOAT', width * height * 4, pixels)
+        texture = gpu.types.GPUTexture((width, height), format='RGBA16F', data=buffer)
+        cls.textures[key] = texture
+        while len(cls.textures) > cls.max_size:
+            cls.textures.popitem(last=False)
+        return texture
+
+    @classmethod
+    def clear(cls):
+        cls.textures.clear()
+
+
+@persistent
+def on_load_post(dummy):
+    PreviewTextureCache.clear()
+
+
+def register():
+    bpy.app.handlers.load_post.append(on_load_post)
+
+
+def unregister():
+    bpy.app.handlers.load_post.remove(on_load_post)
+    PreviewTextureCache.clear()
@@ -3,8 +3,13 @@ import bpy
 from bpy_extras.view3d_utils import region_2d_to_vector_3d as r2d_2_vec3d
 from bpy_extras.view3d_utils import region_2d_to_origin_3d as r2d_2_origin3d
 from bpy_extras.view3d_utils import region_2d_to_location_3d as r2d_2_loc3d
+from bpy.app.handlers import persistent
+from mathutils import Vector
+from mathutils.bvhtree import BVHTree
 
+from array import array
 from contextlib import contextmanager
+from typing import Optional
 
 def mouse_ray(context, event):
     """获取鼠标射线"""
@@ -15,16 +20,248 @@ def mouse_ray(context, event):
     ray_direction = r2d_2_vec3d(region, rv3d, coord)
     return ray_origin, ray_direction
 
+
+class BVHCache:
+    """可见网格物体的BVH树，按需建立，几何数据变化后失效
+
+    BVH树位于物体局部空间，移动物体不需要重建。
+    拖拽期间候选物体列表被缓存，依赖图更新后重新收集。
+    """
+    trees: dict[int, BVHTree] = {}  # session_uid: BVHTree
+    instance_trees: dict[int, BVHTree] = {}  # 实例数据指针: BVHTree
+    instance_bounds: dict[int, tuple[Vector, Vector]] = {}  # 实例数据指针: 局部包围盒
+    instance_owners: dict[int, set[int]] = {}  # session_uid: 该物体生成或作为源物体的实例数据指针
+    bounds: dict[int, tuple[Vector, Vector]] = {}  # session_uid: 局部包围盒(min, max)
+    face_slots: dict[int, array] = {}  # session_uid: 每个面的材质槽序号
+    excluded: set[int] = set()  # 光线投射时排除的物体
+
+    candidates: Optional[list[tuple]] = None  # 拖拽期间缓存的候选物体
+    keep_candidates: bool = False
+
+    @staticmethod
+    def box(obj: bpy.types.Object) -> tuple[Vector, Vector]:
+        corners = [Vector(corner) for corner in obj.bound_box]
+        return Vector(map(min, zip(*corners))), Vector(map(max, zip(*corners)))
+
+    @classmethod
+    def get_bounds(cls, obj: bpy.types.Object) -> tuple[Vector, Vector]:
+        key = obj.session_uid
+        bounds = cls.bounds.get(key)
+        if bounds is None:
+            bounds = cls.bounds[key] = cls.box(obj)
+        return bounds
+
+    @classmethod
+    def get_tree(cls, obj: bpy.types.Object, depsgraph) -> BVHTree:
+        key = obj.session_uid
+        tree = cls.trees.get(key)
+        if tree is None:
+            tree = cls.trees[key] = BVHTree.FromObject(obj.evaluated_get(depsgraph), depsgraph)
+        return tree
+
+    @classmethod
+    def get_face_slots(cls, obj: bpy.types.Object, depsgraph) -> array:
+        """求值网格的面到材质槽数组，与BVH树返回的面序号对应"""
+        key = obj.session_uid
+        slots = cls.face_slots.get(key)
+        if slots is None:
+            polygons = obj.evaluated_get(depsgraph).data.polygons
+            slots = array('i', bytes(len(polygons) * 4))
+            polygons.foreach_get('material_index', slots)
+            cls.face_slots[key] = slots
+        return slots
+
+    @classmethod
+    def get_instance_bounds(cls, obj: bpy.types.Object, owners: tuple[int, ...]) -> tuple[int, tuple[Vector, Vector]]:
+        """实例(集合实例、几何节点实例)的包围盒，以求值数据为键，不建立BVH树
+
+        :param owners: 生成实例的物体和源物体，其几何变化时清除该实例
+        :return: (键, 包围盒)
+        """
+        key = obj.data.as_pointer()
+        bounds = cls.instance_bounds.get(key)
+        if bounds is None:
+            bounds = cls.instance_bounds[key] = cls.box(obj)
+            for owner in owners:
+                cls.instance_owners.setdefault(owner, set()).add(key)
+        return key, bounds
+
+    @classmethod
+    def get_instance_tree(cls, key: int, source) -> Optional[BVHTree]:
+        """实例的BVH树，只在包围盒被射线命中时建立
+
+        :param source: 求值网格，或收集候选时已建立的BVH树
+        """
+        tree = cls.instance_trees.get(key)
+        if tree is None:
+            tree = source if isinstance(source, BVHTree) else mesh_bvh(source)
+            cls.instance_trees[key] = tree
+        return tree
+
+    @classmethod
+    def invalidate(cls, key: int):
+        cls.trees.pop(key, None)
+        cls.bounds.pop(key, None)
+        cls.face_slots.pop(key, None)
+        # 只清除该物体相关的实例
+        for data_key in cls.instance_owners.pop(key, ()):
+            cls.instance_trees.pop(data_key, None)
+            cls.instance_bounds.pop(data_key, None)
+
+    @classmethod
+    def begin_drag(cls):
+        cls.keep_candidates = True
+        cls.candidates = None
+
+    @classmethod
+    def end_drag(cls):
+        cls.keep_candidates = False
+        cls.candidates = None
+
+    @classmethod
+    def clear(cls):
+        cls.trees.clear()
+        cls.instance_trees.clear()
+        cls.instance_bounds.clear()
+        cls.instance_owners.clear()
+        cls.bounds.clear()
+        cls.face_slots.clear()
+        cls.excluded.clear()
+        cls.candidates = None
+
+
+def mesh_bvh(mesh: bpy.types.Mesh) -> BVHTree:
+    """由网格建立BVH树，面序号与网格的面对应"""
+    co = array('f', bytes(len(mesh.vertices) * 12))
+    mesh.vertices.foreach_get('co', co)
+    loops = array('i', bytes(len(mesh.loops) * 4))
+    mesh.loops.foreach_get('vertex_index', loops)
+    starts = array('i', bytes(len(mesh.polygons) * 4))
+    mesh.polygons.foreach_get('loop_start', starts)
+    totals = array('i', bytes(len(mesh.polygons) * 4))
+    mesh.polygons.foreach_get('loop_total', totals)
+
+    verts = [co[i:i + 3] for i in range(0, len(co), 3)]
+    polygons = [loops[start:start + total] for start, total in zip(starts, totals)]
+    return BVHTree.FromPolygons(verts, polygons)
+
+
+def ray_box_distance(origin: Vector, direction: Vector, box_min: Vector, box_max: Vector) -> Optional[float]:
+    """射线与包围盒的相交距离，不相交时返回None"""
+    near, far = -float('inf'), float('inf')
+    for axis in range(3):
+        if abs(direction[axis]) < 1e-12:
+            if not box_min[axis] <= origin[axis] <= box_max[axis]: return None
+            continue
+        t1 = (box_min[axis] - origin[axis]) / direction[axis]
+        t2 = (box_max[axis] - origin[axis]) / direction[axis]
+        if t1 > t2: t1, t2 = t2, t1
+        near, far = max(near, t1), min(far, t2)
+        if near > far or far < 0: return None
+    return max(near, 0.0)
+
+
+# 可以求值为网格的物体类型
+GEOMETRY_TYPES = {'MESH', 'CURVE', 'SURFACE', 'FONT', 'META'}
+
+
+def collect_candidates(depsgraph, view_layer) -> list[tuple]:
+    """可见物体和实例，只读取包围盒
+
+    实例的临时物体在遍历后失效，网格实例保存求值网格，其他类型的实例在此时建立BVH树。
+
+    :return: [(物体, 实例键, 实例源, 包围盒, 矩阵, 使用面序号, 实例父级)]
+    """
+    candidates = []
+    for inst in depsgraph.object_instances:
+        obj = inst.object
+        if obj.type not in GEOMETRY_TYPES: continue
+        original = obj.original
+
+        if inst.is_instance:
+            parent = inst.parent.original if inst.parent else None
+            owners = (original.session_uid,) if parent is None else (original.session_uid, parent.session_uid)
+            key, bounds = BVHCache.get_instance_bounds(obj, owners)
+            if key in BVHCache.instance_trees or obj.type == 'MESH':
+                source = obj.data
+            else:
+                try:
+                    source = BVHTree.FromObject(obj, depsgraph)
+                except (RuntimeError, ValueError):
+                    continue
+            # 几何节点生成的几何体与物体自身的面序号不对应
+            use_index = obj.type == 'MESH' and parent != original
+        else:
+            if not original.visible_get(view_layer=view_layer): continue
+            parent, key, source = None, None, None
+            bounds = BVHCache.get_bounds(original)
+            use_index = obj.type == 'MESH'
+
+        candidates.append((original, key, source, bounds, inst.matrix_world.copy(), use_index, parent))
+    return candidates
+
+
+def bvh_ray_cast(context, origin: Vector, direction: Vector):
+    """只对包围盒相交的可见物体和实例进行BVH光线投射，由近到远，找到更近的交点后跳过更远的物体
+
+    命中实例时返回实例的源物体，几何节点生成的几何体返回其所在物体。
+    面序号只对网格物体及其实例有效，否则为-1。
+
+    :return: (result, location, normal, index, object, matrix)
+    """
+    depsgraph = context.evaluated_depsgraph_get()
+
+    candidates = BVHCache.candidates
+    if candidates is None:
+        candidates = collect_candidates(depsgraph, context.view_layer)
+        if BVHCache.keep_candidates:
+            BVHCache.candidates = candidates
+
+    hits = []
+    for original, key, source, bounds, matrix, use_index, parent in candidates:
+        if original.session_uid in BVHCache.excluded: continue
+        if parent and parent.session_uid in BVHCache.excluded: continue
+
+        matrix_inv = matrix.inverted_safe()
+        local_origin = matrix_inv @ origin
+        local_direction = (matrix_inv.to_3x3() @ direction)
+        dist = ray_box_distance(local_origin, local_direction, *bounds)
+        if dist is None: continue
+        hits.append((dist, original, key, source, matrix, use_index, local_origin, local_direction))
+
+    hits.sort(key=lambda c: c[0])
+
+    best = (False, Vector(), Vector(), -1, None, None)
+    best_dist = float('inf')
+    for box_dist, obj, key, source, matrix, use_index, local_origin, local_direction in hits:
+        # 射线参数在局部空间与世界空间相同，可直接比较
+        if box_dist >= best_dist: break
+
+        if key is None:
+            tree = BVHCache.get_tree(obj, depsgraph)
+        else:
+            tree = BVHCache.get_instance_tree(key, source)
+        location, normal, index, _ = tree.ray_cast(local_origin, local_direction.normalized())
+        if location is None: continue
+
+        world_location = matrix @ location
+        dist = (world_location - origin).length
+        if dist < best_dist:
+            world_normal = (matrix.inverted_safe().transposed().to_3x3() @ normal).normalized()
+            best = (True, world_location, world_normal, index if use_index else -1, obj, matrix)
+            best_dist = dist
+
+    return best
+
+
 def ray_cast(context, event, start_point=None):
     mouse_pos = event.mouse_region_x, event.mouse_region_y
-    scene = context.scene
     region = context.region
 
     if region.type != 'WINDOW':
         region = [region for region in context.area.regions if region.type == 'WINDOW'][0]
 
     region3D = context.space_data.region_3d
-    viewlayer = context.view_layer.depsgraph
 
     # The direction indicated by the mouse position from the current view / The view point of the user
     view_vector = r2d_2_vec3d(region, region3D, mouse_pos)
@@ -33,16 +270,41 @@ def ray_cast(context, event, start_point=None):
     world_loc = r2d_2_loc3d(region, region3D, mouse_pos, view_vector)
     # first hit to get target obj
     if not start_point: start_point = view_point
-    result, location, normal, index, target_obj, matrix = scene.ray_cast(viewlayer, start_point,
-                                                                         view_vector)
-    return result, target_obj, view_point, world_loc, normal, location, matrix
+    result, location, normal, index, target_obj, matrix = bvh_ray_cast(context, start_point, view_vector)
+    return result, target_obj, view_point, world_loc, normal, location, matrix, index
 
 @contextmanager
 def exclude_ray_cast(obj_list: list[bpy.types.Object]):
-    """光线投射时排除物体"""
-    for obj in obj_list:
-        obj.hide_set(True)
-    yield  # 执行上下文管理器中的代码（光线投射）
-    for obj in obj_list:
-        obj.hide_set(False)
-        obj.select_set(True)
\ No newline at end of file
+    """光线投射时排除物体，不改变物体可见性，避免触发依赖图更新"""
+    keys = {obj.session_uid for obj in obj_list} - BVHCache.excluded
+    BVHCache.excluded.update(keys)
+    try:
+        yield  # 执行上下文管理器中的代码（光线投射）
+    finally:
+        BVHCache.excluded.difference_update(keys)
+
+
+@persistent
+def on_depsgraph_update(scene, depsgraph):
+    # 变换、可见性等变化后重新收集候选物体，求值网格也可能已被释放
+    BVHCache.candidates = None
+    for update in depsgraph.updates:
+        # 修改面的材质序号也会标记几何更新
+        if update.is_updated_geometry and isinstance(update.id, bpy.types.Object):
+            BVHCache.invalidate(update.id.original.session_uid)
+
+
+@persistent
+def on_load_post(dummy):
+    BVHCache.clear()
+
+
+def register():
+    bpy.app.handlers.depsgraph_update_post.append(on_depsgraph_update)
+    bpy.app.handlers.load_post.append(on_load_post)
+
+
+def unregister():
+    bpy.app.handlers.depsgraph_update_post.remove(on_depsgraph_update)
+    bpy.app.handlers.load_post.remove(on_load_post)
+    BVHCache.clear()
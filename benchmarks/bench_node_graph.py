@@ -0,0 +1,134 @@
+"""节点对齐与布局的性能测试，不需要Blender::
+
+    python benchmarks/bench_node_graph.py
+    python benchmarks/bench_node_graph.py --sizes 100 1000 --output result.json
+    python benchmarks/bench_node_graph.py --compare old.json
+
+在随机生成的节点树上统计索引建立、依赖查询、依赖对齐、整体布局和鼠标拾取的耗时与峰值内存，
+结果保存为JSON，用于比较不同版本。
+"""
+
+import ast
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from node_graph import GraphIndex, DependenceAligner, SpatialIndex  # noqa: E402
+from node_graph.layout import layered_layout  # noqa: E402
+from node_graph.model import synthetic_tree, node_bounds, abs_location  # noqa: E402
+
+DEFAULT_SIZES = (100, 500, 1000, 5000, 20000)
+HIT_QUERIES = 1000
+
+
+def addon_version() -> str:
+    """从bl_info读取版本，不导入插件"""
+    tree = ast.parse(ROOT.joinpath('__init__.py').read_text(encoding='utf-8'))
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and getattr(node.targets[0], 'id', None) == 'bl_info':
+            return '.'.join(map(str, ast.literal_eval(node.value)['version']))
+    return 'unknown'
+
+
+def measure(func, *args, **kwargs) -> tuple[object, float, int]:
+    """:return: (结果, 耗时秒, 峰值内存byte)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def bench_size(count: int, seed: int) -> dict:
+    tree = synthetic_tree(count, seed)
+    output = tree.nodes[0]
+    result = {'nodes': count, 'links': len(tree.links)}
+
+    index, result['index_time'], result['index_peak'] = measure(GraphIndex.from_tree, tree)
+    _, result['closure_time'], _ = measure(index.all_dependence, output)
+
+    nodes = [node for node in tree.nodes if node.type != 'FRAME' and node not in index.reroutes]
+    sizes = {node: node.dimensions for node in nodes}
+    locations = {node: abs_location(node) for node in nodes}
+
+    # 依赖对齐：选中输出节点的所有上游节点
+    selected = set(index.all_dependence(output)) | {output}
+    aligner = DependenceAligner(index, sizes, locations)
+    _, result['align_time'], result['align_peak'] = measure(aligner.align, output, selected, True)
+
+    _, result['layout_time'], result['layout_peak'] = measure(layered_layout, index, sizes, locations, nodes)
+
+    spatial, result['spatial_build_time'], result['spatial_peak'] = measure(SpatialIndex, node_bounds(tree))
+    rng = random.Random(seed)
+    xs = [loc[0] for loc in locations.values()]
+    ys = [loc[1] for loc in locations.values()]
+    points = [(rng.uniform(min(xs), max(xs)), rng.uniform(min(ys), max(ys))) for _ in range(HIT_QUERIES)]
+
+    start = time.perf_counter()
+    for x, y in points:
+        spatial.pick(x, y)
+    result['hit_test_time'] = (time.perf_counter() - start) / HIT_QUERIES
+
+    return result
+
+
+def format_row(row: dict) -> str:
+    return (f"{row['nodes']:>6} nodes  index {row['index_time'] * 1000:8.2f} ms  "
+            f"align {row['align_time'] * 1000:8.2f} ms  layout {row['layout_time'] * 1000:9.2f} ms  "
+            f"hit {row['hit_test_time'] * 1e6:7.1f} us  "
+            f"peak {max(row['index_peak'], row['align_peak'], row['layout_peak'], row['spatial_peak']) / 1024 / 1024:7.2f} MB")
+
+
+def compare(current: list[dict], previous_file: Path):
+    previous = {row['nodes']: row for row in json.loads(previous_file.read_text(encoding='utf-8'))['results']}
+    keys = ('index_time', 'align_time', 'layout_time', 'hit_test_time')
+    for row in current:
+        old = previous.get(row['nodes'])
+        if old is None: continue
+        changes = '  '.join(f"{key[:-5]} {row[key] / old[key]:5.2f}x" for key in keys if old.get(key))
+        print(f"{row['nodes']:>6} nodes  {changes}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', type=Path, default=None,
+                        help='JSON file, default benchmarks/results/node_graph_<version>.json')
+    parser.add_argument('--compare', type=Path, default=None, help='Previous JSON result to compare with')
+    args = parser.parse_args()
+
+    version = addon_version()
+    results = []
+    for count in args.sizes:
+        row = bench_size(count, args.seed)
+        print(format_row(row))
+        results.append(row)
+
+    output = args.output or Path(__file__).parent.joinpath('results', f'node_graph_{version}.json')
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        'version': version,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'results': results,
+    }, indent=2), encoding='utf-8')
+    print(f'Saved {output}')
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -32,4 +32,46 @@ data = {
     "Manual Refresh": "手动刷新",
     'Refresh Preview': '刷新预览',
     'Select Material Object': '选择材质物体',
+    'Preview Cache': '预览缓存',
+    'Cache Directory': '缓存目录',
+    'Cache Size (MB)': '缓存大小 (MB)',
+    'Clear Preview Cache': '清除预览缓存',
+    'Update Delay (s)': '更新延迟 (秒)',
+    'Dry Run': '试运行',
+    'Remove Dependencies': '删除依赖数据',
+    'Merge Duplicate Materials': '合并重复材质',
+    'Material not found': '未找到材质',
+    'Batch Replace Material': '批量替换材质',
+    'Name Rule': '名称规则',
+    'Render Library Previews': '渲染库预览',
+    'Render material previews with Cycles in background Blender processes': '在多个后台Blender进程中用Cycles渲染材质预览',
+    'Library': '库文件',
+    'Output': '输出',
+    'Resolution': '分辨率',
+    'Samples': '采样',
+    'Workers': '进程数',
+    'Write Asset Previews': '写入资产预览',
+    'Overwrite': '覆盖',
+    'Cancel Render': '取消渲染',
+    'Please save the file or choose a library': '请先保存文件或选择库文件',
+    'Unsaved changes are not rendered': '未保存的修改不会被渲染',
+    'Dependence': '依赖项',
+    'Whole Tree': '整个节点树',
+    'Align the selected dependencies of the node under the mouse': '对齐鼠标下节点的已选依赖项',
+    'Layout the whole node tree in layers from the output node': '从输出节点开始分层排列整个节点树',
+    'Animation FPS': '动画帧率',
+    'Update rate of the align animation, match it to the display refresh rate': '对齐动画的更新频率，与显示器刷新率一致',
+    'Max Animated Nodes': '动画最大节点数',
+    'Move nodes directly without animation above this node count': '节点数量超过该值时直接移动，不播放动画',
+    'Drop Mode': '放置模式',
+    'Face Slot': '面的材质槽',
+    'New Slot': '新材质槽',
+    'Selected Objects': '所有选中物体',
+    'Assign to the material slot of the face under the mouse': '设置鼠标下的面所在的材质槽',
+    'Add a material slot and assign it to the face under the mouse only (Ctrl)': '新建材质槽并只指定给鼠标下的面 (Ctrl)',
+    'Assign to the first slot of all selected objects (Shift)': '设置所有选中物体的第一个材质槽 (Shift)',
+    'Modifiers change the faces, assign to the slot instead': '修改器改变了面，改为设置材质槽',
+    'Please select a material from the list': '请从列表中选择一个材质',
+    'Write the PNGs into the asset previews, an external library is saved': '将PNG写入资产预览，外部库文件会被保存',
+    'Reading Materials': '读取材质',
 }
@@ -0,0 +1,9 @@
+"""节点图算法，不依赖bpy
+
+通过鸭子类型访问节点树(tree.nodes、tree.links、link.from_node等)，
+既可用于Blender节点树，也可用于后台测试和性能测试。
+"""
+
+from .index import GraphIndex
+from .align import DependenceAligner
+from .spatial import SpatialIndex
@@ -0,0 +1,88 @@
+from typing import Hashable, Optional
+
+from .index import GraphIndex
+
+Node = Hashable
+Vector2 = tuple[float, float]
+
+
+class DependenceAligner:
+    """将节点的依赖项排列到节点左侧，依次向下堆叠
+
+    位置为节点的location(框内节点相对于框)，尺寸已除以界面缩放。
+    每个节点在每种模式下只排列一次，耗时与节点数量成线性关系。在树形结构上结果与原来的逐层递归相同；
+    有多个下游节点的共享节点被再次放置时，其上游子树保持第一次排列的位置，不再随之移动。
+    """
+
+    def __init__(self, index: GraphIndex, sizes: dict[Node, Vector2], locations: dict[Node, Vector2],
+                 dis_x: float = 100, dis_y: float = 50):
+        """
+        :param index: GraphIndex
+        :param sizes: {节点: (宽, 高)}
+        :param locations: {节点: 当前位置}
+        :param dis_x: 横向间距
+        :param dis_y: 纵向间距
+        """
+        self.index = index
+        self.sizes = sizes
+        self.locations = locations
+        self.dis_x = dis_x
+        self.dis_y = dis_y
+        self.targets: dict[Node, Vector2] = {}
+        self.visited: set[tuple[Node, bool]] = set()
+
+    def location(self, node: Node) -> Vector2:
+        """已计算的目标位置，否则为当前位置"""
+        return self.targets.get(node, self.locations[node])
+
+    def align(self, node: Node, selected_nodes: Optional[set] = None, check_dependent: bool = False) -> dict[Node, Vector2]:
+        """计算节点依赖项的目标位置
+
+        :param node: 目标节点
+        :param selected_nodes: 只排列该集合中的节点
+        :param check_dependent: 有多个父级的节点放在父级的平均高度
+        :return: {节点: 目标位置}
+        """
+        # 共享的上游节点只排列一次，避免有向无环图上的重复递归
+        if (node, check_dependent) in self.visited: return self.targets
+        self.visited.add((node, check_dependent))
+
+        dependence = self.index.dependence(node, selected_nodes)
+
+        # 设置初始值
+        last_location_x, last_location_y = self.location(node)
+        self.targets.setdefault(node, self.locations[node])
+        last_dimensions_y = self.sizes[node][1]
+
+        for i, sub_node in enumerate(dependence):
+            # 跳过未选中节点
+            if selected_nodes and sub_node not in selected_nodes: continue
+
+            sub_dim_x, sub_dim_y = self.sizes[sub_node]
+
+            # 对齐父级依赖
+            if check_dependent:
+                dependent_nodes = self.index.dependent(sub_node, selected_nodes)
+                if len(dependent_nodes) > 1:
+                    dep_locations = [self.location(depend_node) for depend_node in dependent_nodes]
+                    tg_loc_x = min(loc[0] for loc in dep_locations) - sub_dim_x - self.dis_x
+                    tg_loc_y = sum(loc[1] for loc in dep_locations) / len(dep_locations)
+                    self.targets[sub_node] = (tg_loc_x, tg_loc_y)
+
+                elif len(dependent_nodes) == 1:
+                    # 排列同层级自己
+                    self.align(dependent_nodes[0], selected_nodes)
+
+            # 忽略父级依赖
+            else:
+                # 目标位置 = 上一个节点位置-当前节点宽度-间隔，y轴向对其第一个节点到依赖节点
+                tg_loc_x = last_location_x - sub_dim_x - self.dis_x
+                tg_loc_y = last_location_y - last_dimensions_y - self.dis_y if i != 0 else last_location_y
+                self.targets[sub_node] = (tg_loc_x, tg_loc_y)
+                # 为下一个节点设置
+                last_location_y = tg_loc_y
+                last_dimensions_y = sub_dim_y
+
+            self.align(sub_node, selected_nodes, check_dependent)
+
+        return self.targets
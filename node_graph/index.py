@@ -0,0 +1,129 @@
+from collections import defaultdict
+from typing import Any, Hashable, Iterable, Optional
+
+Node = Hashable
+
+REROUTE_IDNAME = 'NodeReroute'
+
+
+def is_reroute(node) -> bool:
+    return getattr(node, 'bl_idname', None) == REROUTE_IDNAME
+
+
+class GraphIndex:
+    """节点树的邻接索引，reroute节点被折叠为直接连接
+
+    dependence: 上游节点(输入连接的节点)，按输入接口顺序排列
+    dependent: 下游节点(输出连接的节点)
+    """
+
+    def __init__(self, nodes: Iterable[Node], links: Iterable[tuple[Node, Node]], reroutes: Iterable[Node] = ()):
+        """
+        :param nodes: 节点
+        :param links: [(from_node, to_node)]，已按输入接口顺序排列
+        :param reroutes: reroute节点
+        """
+        self.nodes = list(nodes)
+        self.reroutes = set(reroutes)
+
+        raw_up: dict[Node, dict[Node, None]] = defaultdict(dict)
+        raw_down: dict[Node, dict[Node, None]] = defaultdict(dict)
+        for from_node, to_node in links:
+            raw_up[to_node][from_node] = None
+            raw_down[from_node][to_node] = None
+
+        # 未折叠的邻接，reroute节点也作为普通节点
+        self.raw_up, self.raw_down = raw_up, raw_down
+        # 用dict作有序集合，保持输入接口顺序
+        self.up: dict[Node, dict[Node, None]] = {node: self.collapse(raw_up, node) for node in self.nodes}
+        self.down: dict[Node, dict[Node, None]] = {node: self.collapse(raw_down, node) for node in self.nodes}
+
+        self._closures: dict[tuple, list[Node]] = {}
+
+    @classmethod
+    def from_tree(cls, tree: Any) -> 'GraphIndex':
+        """从节点树建立索引，只遍历一次tree.links
+
+        :param tree: bpy.types.NodeTree 或具有相同属性的对象
+        """
+        nodes = list(tree.nodes)
+        input_order: dict[Node, dict] = {}
+
+        def socket_index(node, socket) -> int:
+            order = input_order.get(node)
+            if order is None:
+                order = input_order[node] = {s: i for i, s in enumerate(node.inputs)}
+            return order.get(socket, 0)
+
+        # 与原实现一致，静音的连接也算作依赖
+        links = [(socket_index(link.to_node, link.to_socket), link.from_node, link.to_node) for link in tree.links]
+        links.sort(key=lambda l: l[0])
+
+        return cls(nodes, [(l[1], l[2]) for l in links], [node for node in nodes if is_reroute(node)])
+
+    def collapse(self, raw: dict, node: Node) -> dict[Node, None]:
+        """相邻节点，跳过reroute节点"""
+        result = {}
+        stack = list(reversed(raw.get(node, ())))
+        seen = set()
+        while stack:
+            other = stack.pop()
+            if other in seen: continue
+            seen.add(other)
+            if other in self.reroutes:
+                stack.extend(reversed(raw.get(other, ())))
+            else:
+                result[other] = None
+        return result
+
+    @staticmethod
+    def filtered(adjacent: dict[Node, None], within: Optional[set]) -> list[Node]:
+        if not within: return list(adjacent)
+        return [node for node in adjacent if node in within]
+
+    def dependence(self, node: Node, within: Optional[set] = None) -> list[Node]:
+        """直接上游节点
+
+        :param node: 节点
+        :param within: 只返回该集合中的节点，为空时不过滤
+        """
+        return self.filtered(self.up.get(node, {}), within)
+
+    def dependent(self, node: Node, within: Optional[set] = None) -> list[Node]:
+        """直接下游节点"""
+        return self.filtered(self.down.get(node, {}), within)
+
+    def closure(self, node: Node, upstream: bool = True, within: Optional[set] = None,
+                keep_reroutes: bool = False) -> list[Node]:
+        """所有上游或下游节点，迭代深度优先，按先序排列
+
+        :param node: 起始节点，不包含在结果中
+        :param upstream: True为上游，False为下游
+        :param within: 只经过该集合中的节点
+        :param keep_reroutes: 结果包含路径上的reroute节点
+        """
+        key = (node, upstream, frozenset(within) if within else None, keep_reroutes)
+        if key in self._closures: return self._closures[key]
+
+        if keep_reroutes:
+            adjacency = self.raw_up if upstream else self.raw_down
+        else:
+            adjacency = self.up if upstream else self.down
+        result = []
+        seen = {node}
+        stack = list(reversed(self.filtered(adjacency.get(node, {}), within)))
+        while stack:
+            other = stack.pop()
+            if other in seen: continue
+            seen.add(other)
+            result.append(other)
+            stack.extend(reversed(self.filtered(adjacency.get(other, {}), within)))
+
+        self._closures[key] = result
+        return result
+
+    def all_dependence(self, node: Node, within: Optional[set] = None, keep_reroutes: bool = False) -> list[Node]:
+        return self.closure(node, True, within, keep_reroutes)
+
+    def all_dependent(self, node: Node, within: Optional[set] = None, keep_reroutes: bool = False) -> list[Node]:
+        return self.closure(node, False, within, keep_reroutes)
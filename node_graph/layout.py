@@ -0,0 +1,179 @@
+import numpy as np
+from bisect import bisect_right
+from typing import Hashable, Iterable, Optional
+
+from .index import GraphIndex
+
+Node = Hashable
+Vector2 = tuple[float, float]
+
+SWEEP_NODE_BUDGET = 12000  # 迭代次数 x 节点数量的上限
+
+
+def assign_layers(index: GraphIndex, nodes: Iterable[Node]) -> dict[Node, int]:
+    """按到输出节点的最长路径分层，输出节点为第0层
+
+    :param index: GraphIndex
+    :param nodes: 参与布局的节点
+    :return: {节点: 层}
+    """
+    nodes = list(nodes)
+    within = set(nodes)
+    # 拓扑排序(从输出节点向上游)，下游节点全部确定后才确定该节点的层
+    remaining = {node: len(index.dependent(node, within)) for node in nodes}
+    layers = {node: 0 for node in nodes}
+    stack = [node for node, count in remaining.items() if count == 0]
+
+    while stack:
+        node = stack.pop()
+        for dep in index.dependence(node, within):
+            layers[dep] = max(layers[dep], layers[node] + 1)
+            remaining[dep] -= 1
+            if remaining[dep] == 0:
+                stack.append(dep)
+
+    return layers
+
+
+def count_crossings(upper: list[Node], lower: list[Node], edges: dict[Node, list[Node]]) -> int:
+    """相邻两层间的连线交叉数，按连线排序后统计逆序对
+
+    :param upper: 靠近输出的一层，按顺序排列
+    :param lower: 上游一层，按顺序排列
+    :param edges: {upper节点: [lower节点]}
+    """
+    lower_pos = {node: i for i, node in enumerate(lower)}
+    targets = []
+    for node in upper:
+        targets.extend(sorted(lower_pos[dep] for dep in edges.get(node, ()) if dep in lower_pos))
+    if len(targets) < 2: return 0
+
+    # 有序列表二分插入统计逆序对，每层连线较少，比纯Python树状数组快
+    seen = []
+    crossings = 0
+    for count, pos in enumerate(targets):
+        i = bisect_right(seen, pos)
+        crossings += count - i
+        seen.insert(i, pos)
+
+    return crossings
+
+
+def order_layers(index: GraphIndex, layers: dict[Node, int], locations: dict[Node, Vector2],
+                 sweeps: int = 4) -> list[list[Node]]:
+    """重心法排列每层节点以减少连线交叉，保留交叉最少的结果
+
+    :param index: GraphIndex
+    :param layers: {节点: 层}
+    :param locations: 当前位置，用于初始顺序
+    :param sweeps: 上下来回迭代次数
+    :return: 每层从上到下的节点
+    """
+    count = max(layers.values(), default=-1) + 1
+    ordered = [[] for _ in range(count)]
+    for node in layers:
+        ordered[layers[node]].append(node)
+    for layer in ordered:
+        layer.sort(key=lambda n: -locations[n][1])
+
+    within = set(layers)
+    down = {node: index.dependent(node, within) for node in layers}
+    up = {node: index.dependence(node, within) for node in layers}
+
+    def total_crossings(order):
+        return sum(count_crossings(order[i], order[i + 1], up) for i in range(len(order) - 1))
+
+    best = [layer[:] for layer in ordered]
+    best_crossings = total_crossings(best)
+
+    for sweep in range(sweeps):
+        upstream = sweep % 2 == 0
+        layer_range = range(1, count) if upstream else range(count - 2, -1, -1)
+        neighbours = down if upstream else up
+
+        for i in layer_range:
+            fixed = {node: pos for pos, node in enumerate(ordered[i - 1 if upstream else i + 1])}
+            current = {node: pos for pos, node in enumerate(ordered[i])}
+
+            def barycenter(node):
+                positions = [fixed[n] for n in neighbours[node] if n in fixed]
+                # 没有相邻节点时保持原位置
+                return sum(positions) / len(positions) if positions else current[node]
+
+            ordered[i].sort(key=barycenter)
+
+        crossings = total_crossings(ordered)
+        if crossings < best_crossings:
+            best = [layer[:] for layer in ordered]
+            best_crossings = crossings
+        if best_crossings == 0: break
+
+    return best
+
+
+def stack_layer(desired: np.ndarray, heights: np.ndarray, gap: float) -> np.ndarray:
+    """将一层节点尽量放在期望高度，并按顺序向下排列避免重叠
+
+    :param desired: 每个节点期望的顶部y值
+    :param heights: 节点高度
+    :param gap: 间距
+    :return: 顶部y值
+    """
+    # 节点n的顶部不能高于前一个节点底部-间距，即 top[n] = min_k<=n(desired[k] + offset[k]) - offset[n]
+    offset = np.concatenate(([0.0], np.cumsum(heights[:-1] + gap)))
+    top = np.minimum.accumulate(desired + offset) - offset
+    # 整体上移，使偏移量平均为0
+    return top + np.mean(desired - top)
+
+
+def layered_layout(index: GraphIndex, sizes: dict[Node, Vector2], locations: dict[Node, Vector2],
+                   nodes: Optional[Iterable[Node]] = None, dis_x: float = 100, dis_y: float = 50,
+                   sweeps: int = 4) -> dict[Node, Vector2]:
+    """分层自动布局，输出节点在最右侧，上游节点依次向左排列
+
+    :param index: GraphIndex
+    :param sizes: {节点: (宽, 高)}
+    :param locations: {节点: 当前左上角绝对位置}
+    :param nodes: 参与布局的节点，默认为sizes中的所有节点
+    :param dis_x: 列间距
+    :param dis_y: 行间距
+    :param sweeps: 减少交叉的最大迭代次数，节点较多时减少
+    :return: {节点: 左上角绝对位置}
+    """
+    nodes = list(sizes if nodes is None else nodes)
+    if not nodes: return {}
+
+    # 每次迭代都要遍历所有层，节点很多时减少迭代次数以保持交互速度
+    sweeps = max(1, min(sweeps, SWEEP_NODE_BUDGET // len(nodes)))
+
+    layers = assign_layers(index, nodes)
+    ordered = order_layers(index, layers, locations, sweeps)
+    within = set(nodes)
+
+    widths = np.array([max(sizes[node][0] for node in layer) if layer else 0 for layer in ordered])
+    # 第0层右侧对齐输出节点中最靠右的位置
+    right = max(locations[node][0] + sizes[node][0] for node in ordered[0])
+    column_right = right - np.concatenate(([0.0], np.cumsum(widths[:-1] + dis_x)))
+
+    result = {}
+    centers = {}
+    for i, layer in enumerate(ordered):
+        if not layer: continue
+        heights = np.array([sizes[node][1] for node in layer], dtype=float)
+
+        desired = np.empty(len(layer))
+        for j, node in enumerate(layer):
+            dependents = [centers[n] for n in index.dependent(node, within) if n in centers]
+            if dependents:
+                desired[j] = sum(dependents) / len(dependents) + heights[j] / 2
+            else:
+                desired[j] = locations[node][1]
+
+        tops = stack_layer(desired, heights, dis_y)
+        for j, node in enumerate(layer):
+            x = column_right[i] - sizes[node][0]
+            result[node] = (float(x), float(tops[j]))
+            centers[node] = tops[j] - heights[j] / 2
+
+    return result
+
@@ -0,0 +1,110 @@
+import random
+from typing import Optional
+
+from .index import REROUTE_IDNAME
+
+
+class Socket:
+    __slots__ = ('node', 'name', 'is_output')
+
+    def __init__(self, node: 'Node', name: str, is_output: bool):
+        self.node = node
+        self.name = name
+        self.is_output = is_output
+
+
+class Node:
+    """与bpy.types.Node属性相同的轻量节点，位置为左上角，y轴向上"""
+    __slots__ = ('name', 'bl_idname', 'type', 'location', 'dimensions', 'inputs', 'outputs', 'parent', 'hide')
+
+    def __init__(self, name: str, bl_idname: str = 'ShaderNodeMath', location=(0.0, 0.0), dimensions=(140.0, 100.0),
+                 inputs: int = 1, outputs: int = 1):
+        self.name = name
+        self.bl_idname = bl_idname
+        self.type = 'FRAME' if bl_idname == 'NodeFrame' else 'REROUTE' if bl_idname == REROUTE_IDNAME else 'CUSTOM'
+        self.location = list(location)
+        self.dimensions = tuple(dimensions)
+        self.inputs = [Socket(self, f'Input_{i}', False) for i in range(inputs)]
+        self.outputs = [Socket(self, f'Output_{i}', True) for i in range(outputs)]
+        self.parent: Optional[Node] = None
+        self.hide = False
+
+    def __repr__(self):
+        return f'<Node {self.name}>'
+
+
+class Link:
+    __slots__ = ('from_node', 'from_socket', 'to_node', 'to_socket', 'is_muted')
+
+    def __init__(self, from_socket: Socket, to_socket: Socket):
+        self.from_node = from_socket.node
+        self.from_socket = from_socket
+        self.to_node = to_socket.node
+        self.to_socket = to_socket
+        self.is_muted = False
+
+
+class NodeTree:
+    """与bpy.types.NodeTree属性相同的轻量节点树"""
+
+    def __init__(self):
+        self.nodes: list[Node] = []
+        self.links: list[Link] = []
+
+    def new_node(self, bl_idname: str = 'ShaderNodeMath', **kwargs) -> Node:
+        node = Node(f'Node_{len(self.nodes)}', bl_idname, **kwargs)
+        self.nodes.append(node)
+        return node
+
+    def link(self, from_node: Node, to_node: Node, to_input: int = 0, from_output: int = 0) -> Link:
+        link = Link(from_node.outputs[from_output], to_node.inputs[to_input])
+        self.links.append(link)
+        return link
+
+
+def abs_location(node: Node) -> tuple[float, float]:
+    x, y = node.location
+    while node.parent is not None:
+        node = node.parent
+        x += node.location[0]
+        y += node.location[1]
+    return x, y
+
+
+def node_bounds(tree: NodeTree) -> list[tuple]:
+    """SpatialIndex所需的 (节点, 左上x, 左上y, 宽, 高)"""
+    return [(node, *abs_location(node), *node.dimensions) for node in tree.nodes if node.type != 'FRAME']
+
+
+def synthetic_tree(count: int, seed: int = 0, max_inputs: int = 3, reroute_ratio: float = 0.05,
+                   spread: float = 50.0) -> NodeTree:
+    """生成类似材质节点树的随机节点树，第0个节点为输出节点
+
+    每个节点连接到输出方向上较近的节点，形成较深的有向无环图。
+
+    :param count: 节点数量
+    :param seed: 随机种子
+    :param max_inputs: 每个节点的最大输入数
+    :param reroute_ratio: reroute节点比例
+    :param spread: 每个节点的下游节点在前多少个节点中选择
+    """
+    rng = random.Random(seed)
+    tree = NodeTree()
+    output = tree.new_node('ShaderNodeOutputMaterial', inputs=max_inputs, outputs=0, dimensions=(140.0, 120.0))
+    output.location = [0.0, 0.0]
+
+    for i in range(1, count):
+        if rng.random() < reroute_ratio:
+            node = tree.new_node(REROUTE_IDNAME, inputs=1, outputs=1, dimensions=(16.0, 16.0))
+        else:
+            node = tree.new_node(inputs=max_inputs, outputs=1,
+                                 dimensions=(rng.choice((140.0, 150.0, 240.0)), rng.uniform(80.0, 400.0)))
+        node.location = [rng.uniform(-count * 10, 0), rng.uniform(-count * 5, count * 5)]
+
+        # 连接到已有节点(下游)，reroute只有一个输入
+        for _ in range(rng.randint(1, 2)):
+            target = tree.nodes[rng.randint(max(0, i - int(spread)), i - 1)]
+            if not target.inputs: continue
+            tree.link(node, target, rng.randrange(len(target.inputs)))
+
+    return tree
@@ -0,0 +1,100 @@
+from collections import defaultdict
+from math import hypot, floor
+from typing import Hashable, Iterable, Optional
+
+Node = Hashable
+Bounds = tuple[Node, float, float, float, float]  # (node, 左上x, 左上y, 宽, 高)
+
+
+def sample_points(x: float, y: float, w: float, h: float) -> tuple[tuple[float, float], ...]:
+    """节点四角和四边中点，与node wrangler的最近节点判断一致"""
+    return ((x, y), (x + w, y), (x, y - h), (x + w, y - h),
+            (x + w / 2, y), (x + w / 2, y - h), (x, y - h / 2), (x + w, y - h / 2))
+
+
+class SpatialIndex:
+    """节点边界的均匀网格索引，节点坐标y轴向上，位置为左上角"""
+
+    def __init__(self, bounds: Iterable[Bounds], cell_size: Optional[float] = None):
+        self.bounds = list(bounds)
+        if cell_size is None:
+            cell_size = self.auto_cell_size()
+        self.cell_size = cell_size
+        self.cells: dict[tuple[int, int], list[int]] = defaultdict(list)
+
+        for i, (node, x, y, w, h) in enumerate(self.bounds):
+            x0, y0 = self.cell(x, y - h)
+            x1, y1 = self.cell(x + w, y)
+            for cx in range(x0, x1 + 1):
+                for cy in range(y0, y1 + 1):
+                    self.cells[(cx, cy)].append(i)
+
+        if self.cells:
+            keys = list(self.cells)
+            self.extent = (min(k[0] for k in keys), min(k[1] for k in keys),
+                           max(k[0] for k in keys), max(k[1] for k in keys))
+        else:
+            self.extent = (0, 0, 0, 0)
+
+    def auto_cell_size(self) -> float:
+        """网格大小取节点平均尺寸，每个节点约占1~4个格子"""
+        if not self.bounds: return 100.0
+        total = sum(max(w, h) for _, _, _, w, h in self.bounds)
+        return max(total / len(self.bounds), 1.0)
+
+    def cell(self, x: float, y: float) -> tuple[int, int]:
+        return floor(x / self.cell_size), floor(y / self.cell_size)
+
+    def nodes_at(self, x: float, y: float) -> list[Node]:
+        """包含该点的节点"""
+        result = []
+        for i in self.cells.get(self.cell(x, y), ()):
+            node, nx, ny, w, h = self.bounds[i]
+            if nx <= x <= nx + w and ny - h <= y <= ny:
+                result.append(node)
+        return result
+
+    def nearest(self, x: float, y: float) -> Optional[Node]:
+        """采样点距离最近的节点，由近到远逐圈搜索网格"""
+        if not self.bounds: return None
+
+        cx, cy = self.cell(x, y)
+        min_x, min_y, max_x, max_y = self.extent
+        max_ring = max(abs(cx - min_x), abs(cx - max_x), abs(cy - min_y), abs(cy - max_y))
+        # 从网格范围的边界开始，之前的圈内没有格子
+        min_ring = max(0, cx - max_x, min_x - cx, cy - max_y, min_y - cy)
+
+        best, best_dist = None, float('inf')
+        checked = set()
+        for ring in range(min_ring, max_ring + 1):
+            # 第ring圈外的格子与该点距离至少为 (ring - 1) * cell_size
+            if best_dist <= (ring - 1) * self.cell_size: break
+
+            for key in self.ring_cells(cx, cy, ring):
+                for i in self.cells.get(key, ()):
+                    if i in checked: continue
+                    checked.add(i)
+                    node, nx, ny, w, h = self.bounds[i]
+                    dist = min(hypot(x - px, y - py) for px, py in sample_points(nx, ny, w, h))
+                    if dist < best_dist:
+                        best, best_dist = node, dist
+
+        return best
+
+    @staticmethod
+    def ring_cells(cx: int, cy: int, ring: int):
+        if ring == 0:
+            yield cx, cy
+            return
+        for dx in range(-ring, ring + 1):
+            yield cx + dx, cy + ring
+            yield cx + dx, cy - ring
+        for dy in range(-ring + 1, ring):
+            yield cx + ring, cy + dy
+            yield cx - ring, cy + dy
+
+    def pick(self, x: float, y: float) -> Optional[Node]:
+        """鼠标下只有一个节点时使用该节点，否则使用最近的节点"""
+        under = self.nodes_at(x, y)
+        if len(under) == 1: return under[0]
+        return self.nearest(x, y)
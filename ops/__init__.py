@@ -1,18 +1,31 @@
-from . import op_edit_material_asset, op_tmp_asset, op_align_nodes, op_clear_unused_material, \
-    op_replace_mat
+from . import handlers, op_edit_material_asset, op_tmp_asset, op_align_nodes, op_clear_unused_material, \
+    op_replace_mat, op_dedupe_material, preview_queue, preview_cache, selection_sync, \
+    preview_farm, library_refresh
 
 
 def register():
+    handlers.register()
     op_edit_material_asset.register()
     op_clear_unused_material.register()
     op_replace_mat.register()
+    op_dedupe_material.register()
     op_tmp_asset.register()
     op_align_nodes.register()
+    preview_cache.register()
+    selection_sync.register()
+    preview_farm.register()
 
 
 def unregister():
     op_edit_material_asset.unregister()
     op_clear_unused_material.unregister()
     op_replace_mat.unregister()
+    op_dedupe_material.unregister()
     op_tmp_asset.unregister()
     op_align_nodes.unregister()
+    preview_queue.unregister()
+    preview_cache.unregister()
+    selection_sync.unregister()
+    preview_farm.unregister()
+    library_refresh.unregister()
+    handlers.unregister()
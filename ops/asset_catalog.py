@@ -0,0 +1,178 @@
+import os
+import uuid
+from pathlib import Path
+from typing import Iterable, Optional
+from contextlib import contextmanager
+
+CATALOG_FILENAME = 'blender_assets.cats.txt'
+
+CATALOG_HEADER = """# This is an Asset Catalog Definition file for Blender.
+#
+# Empty lines and lines starting with `#` will be ignored.
+# The first non-ignored line should be the version indicator.
+# Other lines are of the format "UUID:catalog/path/for/assets:simple catalog name"
+
+VERSION 1
+
+"""
+
+
+class CatalogFile:
+    """解析后的目录文件，保留原始行以便追加写入"""
+
+    def __init__(self, path: Path, text: str = ''):
+        self.path = path
+        self.lines: list[str] = text.splitlines()
+        self.catalogs: dict[str, tuple[str, str]] = {}  # uuid: (catalog path, simple name)
+        self.pending: list[tuple[str, str, str]] = []  # 待写入 (uuid, catalog path, simple name)
+
+        for line in self.lines:
+            line = line.strip()
+            if not line or line.startswith('#') or line.startswith('VERSION'): continue
+            parts = line.split(':', 2)
+            if len(parts) != 3: continue
+            self.catalogs[parts[0]] = (parts[1], parts[2])
+
+    def uuid_of(self, catalog_path: str) -> Optional[str]:
+        for cat_uuid, (path, _) in self.catalogs.items():
+            if path == catalog_path:
+                return cat_uuid
+        return None
+
+    def add(self, cat_uuid: str, catalog_path: str, simple_name: str = '') -> bool:
+        """添加目录，已存在时忽略
+
+        :return: 是否新增
+        """
+        if cat_uuid in self.catalogs: return False
+
+        simple_name = simple_name or catalog_path.replace('/', '-')
+        self.catalogs[cat_uuid] = (catalog_path, simple_name)
+        self.pending.append((cat_uuid, catalog_path, simple_name))
+        return True
+
+    def ensure_path(self, catalog_path: str) -> str:
+        """确保目录路径及其所有父级存在
+
+        :param catalog_path: 如 'Material Helper/Metal'
+        :return: 目录uuid
+        """
+        parts = [p for p in catalog_path.split('/') if p]
+        cat_uuid = ''
+        for i in range(len(parts)):
+            sub_path = '/'.join(parts[:i + 1])
+            cat_uuid = self.uuid_of(sub_path)
+            if cat_uuid is None:
+                cat_uuid = str(uuid.uuid4())
+                self.add(cat_uuid, sub_path, parts[i])
+        return cat_uuid
+
+    def to_text(self) -> str:
+        if not self.lines:
+            text = CATALOG_HEADER
+        else:
+            text = '\n'.join(self.lines) + '\n'
+        for cat_uuid, catalog_path, simple_name in self.pending:
+            text += f'{cat_uuid}:{catalog_path}:{simple_name}\n'
+        return text
+
+
+def file_stamp(path: Path) -> Optional[tuple[int, int]]:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class CatalogManager:
+    """目录文件缓存，按路径/修改时间/大小缓存解析结果，使用临时文件替换写入"""
+    cache: dict[str, tuple[Optional[tuple[int, int]], CatalogFile]] = {}  # path: (stamp, CatalogFile)
+
+    @classmethod
+    def load(cls, path: Path) -> CatalogFile:
+        key = str(path)
+        stamp = file_stamp(path)
+        cached = cls.cache.get(key)
+        if cached and cached[0] == stamp and not cached[1].pending:
+            return cached[1]
+
+        text = ''
+        if stamp is not None:
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+
+        cat_file = CatalogFile(path, text)
+        cls.cache[key] = (stamp, cat_file)
+        return cat_file
+
+    @classmethod
+    def write(cls, cat_file: CatalogFile) -> bool:
+        """写入待添加的目录
+
+        :return: 是否写入
+        """
+        if not cat_file.pending: return False
+
+        path = cat_file.path
+        key = str(path)
+        # 读取后文件被其他进程修改，重新读取并合并
+        if file_stamp(path) != cls.cache.get(key, (None,))[0]:
+            pending = cat_file.pending
+            cls.cache.pop(key, None)
+            cat_file = cls.load(path)
+            for entry in pending:
+                cat_file.add(*entry)
+            if not cat_file.pending: return False
+
+        tmp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(cat_file.to_text())
+            os.replace(tmp_path, path)
+        except PermissionError:
+            print('Material Helper: Permission Denied')
+            return False
+        except Exception as e:
+            print('Unexpected Error:', e)
+            return False
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+        # Blender保存的备份文件，避免与新内容冲突
+        backup_path = path.with_name(path.name + '~')
+        if backup_path.exists():
+            backup_path.unlink()
+
+        cls.cache.pop(key, None)
+        cls.load(path)
+        return True
+
+    @classmethod
+    @contextmanager
+    def batch(cls, path: Path):
+        """批量添加目录，退出时一次性写入
+
+        with CatalogManager.batch(path) as cat_file:
+            cat_file.add(uuid, 'Material Helper', 'Material Helper')
+            cat_file.ensure_path('Material Helper/Metal')
+        """
+        cat_file = cls.load(path)
+        try:
+            yield cat_file
+        finally:
+            cls.write(cat_file)
+
+    @classmethod
+    def ensure(cls, path: Path, catalogs: Iterable[tuple[str, str, str]]) -> bool:
+        """确保目录存在
+
+        :param path: 目录文件路径
+        :param catalogs: [(uuid, catalog path, simple name)]
+        :return: 是否写入
+        """
+        cat_file = cls.load(path)
+        for entry in catalogs:
+            cat_file.add(*entry)
+        return cls.write(cat_file)
@@ -0,0 +1,54 @@
+import bpy
+import time
+
+from .functions import material_key
+from .op_edit_material_asset import tag_redraw
+from ..api import mark_tmp_assets
+
+
+class TmpAssetSync:
+    """增量同步临时资产，只处理新增的材质"""
+    known: set[int] = set()  # 已处理材质标识
+
+    @classmethod
+    def reset(cls):
+        cls.known.clear()
+
+    @classmethod
+    def diff(cls) -> tuple[list[bpy.types.Material], int]:
+        """对比已知材质
+
+        :return: (新增材质列表, 移除数量)
+        """
+        current = {material_key(mat): mat for mat in bpy.data.materials}
+        added = [mat for key, mat in current.items() if key not in cls.known]
+        removed = len(cls.known - current.keys())
+
+        cls.known = set(current.keys())
+
+        return added, removed
+
+    @classmethod
+    def sync(cls, full: bool = False) -> int:
+        """同步临时资产
+
+        :param full: 重新处理所有材质
+        :return: 处理的材质数量
+        """
+        start = time.perf_counter()
+
+        if full: cls.reset()
+        added, removed = cls.diff()
+
+        if not added:
+            if removed:
+                print(f'Material Helper: Sync temp asset, 0 touched, {removed} removed')
+            return 0
+
+        touched = mark_tmp_assets(added)
+        tag_redraw()
+
+        print(f'Material Helper: Sync temp asset, {len(touched)} touched, {len(added)} added, {removed} removed '
+              f'({time.perf_counter() - start:.3f}s)')
+
+        return len(touched)
@@ -0,0 +1,119 @@
+import bpy
+import time
+from typing import Callable, Optional
+
+from bpy.app.handlers import persistent
+
+from ..prefs.get_pref import get_pref
+
+
+class Feature:
+    def __init__(self, name: str, callback: Callable[[bpy.types.Scene], None], id_types: Optional[set[str]] = None):
+        """
+        :param name: 名称，用于重复注册和移除
+        :param callback: 静默期结束后调用 callback(scene)
+        :param id_types: 关注的ID类型，如{'OBJECT', 'MATERIAL'}，None表示任意更新
+        """
+        self.name = name
+        self.callback = callback
+        self.id_types = id_types
+
+
+class HandlerDispatcher:
+    """统一的depsgraph更新分发，合并连续更新，在静默期后执行一次"""
+    features: dict[str, Feature] = {}
+    dirty: set[str] = set()  # 待执行的功能
+    last_update: float = 0
+
+    @classmethod
+    def add(cls, name: str, callback, id_types: Optional[set[str]] = None):
+        cls.features[name] = Feature(name, callback, id_types)
+
+    @classmethod
+    def remove(cls, name: str):
+        cls.features.pop(name, None)
+        cls.dirty.discard(name)
+
+    @classmethod
+    def quiet_time(cls) -> float:
+        return get_pref().handler_quiet_time
+
+    @classmethod
+    def on_update(cls, depsgraph: Optional[bpy.types.Depsgraph] = None):
+        for name, feature in cls.features.items():
+            if name in cls.dirty: continue
+            if depsgraph is not None and feature.id_types is not None:
+                if not any(depsgraph.id_type_updated(t) for t in feature.id_types): continue
+            cls.dirty.add(name)
+
+        if not cls.dirty: return
+
+        cls.last_update = time.perf_counter()
+        # 计时器以函数对象识别，每次访问cls.flush都会得到新的绑定方法，需使用模块级函数
+        if not bpy.app.timers.is_registered(flush_timer):
+            bpy.app.timers.register(flush_timer, first_interval=cls.quiet_time())
+
+    @classmethod
+    def flush(cls):
+        quiet_time = cls.quiet_time()
+        remain = quiet_time - (time.perf_counter() - cls.last_update)
+        # 仍有更新，推迟
+        if remain > 0:
+            return remain
+        # 变换或播放时不执行
+        if is_busy():
+            return quiet_time
+
+        scene = bpy.context.scene
+        if scene is None: return quiet_time
+
+        dirty = [name for name in cls.features if name in cls.dirty]
+        cls.dirty.clear()
+
+        for name in dirty:
+            try:
+                cls.features[name].callback(scene)
+            except Exception as e:
+                print(f'Material Helper: {name} update failed', e)
+
+        return None
+
+    @classmethod
+    def clear(cls):
+        cls.dirty.clear()
+        if bpy.app.timers.is_registered(flush_timer):
+            bpy.app.timers.unregister(flush_timer)
+
+
+def flush_timer():
+    return HandlerDispatcher.flush()
+
+
+# Window.modal_operators 在Blender 4.2中加入，之前的版本无法检测变换操作，只依靠静默期推迟
+HAS_MODAL_OPERATORS = bpy.app.version >= (4, 2, 0)
+
+
+def is_busy() -> bool:
+    """是否正在进行变换操作或播放动画"""
+    for window in bpy.context.window_manager.windows:
+        if window.screen.is_animation_playing:
+            return True
+        if not HAS_MODAL_OPERATORS: continue
+        for op in window.modal_operators:
+            if op.bl_idname.upper().startswith('TRANSFORM'):
+                return True
+    return False
+
+
+@persistent
+def depsgraph_update_post(scene, depsgraph):
+    HandlerDispatcher.on_update(depsgraph)
+
+
+def register():
+    bpy.app.handlers.depsgraph_update_post.append(depsgraph_update_post)
+
+
+def unregister():
+    bpy.app.handlers.depsgraph_update_post.remove(depsgraph_update_post)
+    HandlerDispatcher.clear()
@@ -0,0 +1,109 @@
+import bpy
+from typing import Optional
+
+
+def find_asset_area() -> Optional[tuple]:
+    """查找可以刷新资产库的区域，优先资产浏览器，其次资产架
+
+    :return: (window, area, region) 或 None
+    """
+    shelf = None
+    for window in bpy.context.window_manager.windows:
+        for area in window.screen.areas:
+            if area.type == 'FILE_BROWSER' and area.ui_type == 'ASSETS':
+                region = next((r for r in area.regions if r.type == 'WINDOW'), None)
+                if region: return window, area, region
+            elif shelf is None and area.type == 'VIEW_3D':
+                region = next((r for r in area.regions if r.type == 'ASSET_SHELF'), None)
+                if region: shelf = (window, area, region)
+    return shelf
+
+
+def context_asset_area(context) -> Optional[tuple]:
+    """当前上下文所在的资产浏览器或资产架
+
+    :return: (window, area, region) 或 None
+    """
+    area = getattr(context, 'area', None)
+    if area is None: return None
+    if area.type == 'FILE_BROWSER' and context.region:
+        return context.window, area, context.region
+    if area.type == 'VIEW_3D':
+        region = next((r for r in area.regions if r.type == 'ASSET_SHELF'), None)
+        if region: return context.window, area, region
+    return None
+
+
+class LibraryRefresh:
+    """合并短时间内的资产库刷新请求，只刷新一次
+
+    所有代码应调用request()，而不是直接调用bpy.ops.asset.library_refresh()。
+    """
+    delay: float = 0.1  # 合并窗口 秒
+
+    requests: int = 0  # 请求总数
+    refreshes: int = 0  # 实际刷新次数
+    pending: bool = False
+
+    @classmethod
+    def request(cls):
+        cls.requests += 1
+        if cls.pending: return
+
+        cls.pending = True
+        # 计时器以函数对象识别，每次访问cls.tick都会得到新的绑定方法，需使用模块级函数
+        if not bpy.app.timers.is_registered(refresh_timer):
+            bpy.app.timers.register(refresh_timer, first_interval=cls.delay)
+
+    @classmethod
+    def saved(cls) -> int:
+        """被合并或跳过的请求数量"""
+        return cls.requests - cls.refreshes
+
+    @classmethod
+    def tick(cls):
+        cls.flush()
+        return None
+
+    @classmethod
+    def flush(cls, context=None):
+        """立即执行等待中的刷新，需要在刷新后马上使用资产时调用
+
+        :param context: 当前区域为资产浏览器或带资产架的3D视图时在该区域中刷新
+        """
+        if not cls.pending: return
+        cls.pending = False
+        if bpy.app.timers.is_registered(refresh_timer):
+            bpy.app.timers.unregister(refresh_timer)
+
+        found = context_asset_area(context) if context is not None else None
+        # 没有显示资产的区域时无需刷新，打开时会重新读取
+        if found is None: found = find_asset_area()
+        if found is None: return
+
+        window, area, region = found
+        try:
+            with bpy.context.temp_override(window=window, area=area, region=region):
+                bpy.ops.asset.library_refresh()
+            cls.refreshes += 1
+            print(f'Material Helper: Asset library refreshed, {cls.refreshes} refreshes for {cls.requests} requests '
+                  f'({cls.saved()} merged)')
+        except Exception as e:
+            print(f'Material Helper: Asset library refresh failed: {e}')
+
+    @classmethod
+    def clear(cls):
+        cls.pending = False
+        cls.requests = 0
+        cls.refreshes = 0
+
+        if bpy.app.timers.is_registered(refresh_timer):
+            bpy.app.timers.unregister(refresh_timer)
+
+
+def refresh_timer():
+    return LibraryRefresh.tick()
+
+
+def unregister():
+    LibraryRefresh.clear()
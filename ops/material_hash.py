@@ -0,0 +1,189 @@
+import bpy
+import os
+import hashlib
+from typing import Optional
+
+HASH_VERSION = 2  # 更改哈希内容时递增，使旧缓存失效
+
+# 节点基础属性，不影响渲染结果
+_SKIP_PROPS = {
+    'rna_type', 'type', 'location', 'width', 'width_hidden', 'height', 'dimensions', 'name', 'label',
+    'inputs', 'outputs', 'internal_links', 'parent', 'use_custom_color', 'color', 'select', 'show_options',
+    'show_preview', 'hide', 'show_texture', 'bl_idname', 'bl_label', 'bl_description', 'bl_icon',
+    'bl_static_type', 'bl_width_default', 'bl_width_min', 'bl_width_max', 'bl_height_default',
+    'bl_height_min', 'bl_height_max', 'is_active_output', 'location_absolute', 'warning_propagation',
+}
+
+
+def _round(value):
+    if isinstance(value, float):
+        return round(value, 5)
+    return value
+
+
+def id_token(id_data: Optional[bpy.types.ID]) -> str:
+    """被引用数据的标识，图片使用绝对路径
+
+    :param id_data: bpy.types.ID
+    :return: str
+    """
+    if id_data is None:
+        return 'None'
+    if isinstance(id_data, bpy.types.Image):
+        if id_data.packed_file:
+            return f'IM:packed:{id_data.name}:{tuple(id_data.size)}'
+        if id_data.source in {'FILE', 'SEQUENCE', 'MOVIE', 'TILED'}:
+            path = bpy.path.abspath(id_data.filepath, library=id_data.library)
+            # 磁盘上的图片修改后指纹随之改变
+            try:
+                mtime = os.path.getmtime(path)
+            except OSError:
+                mtime = 0
+            return f'IM:{path}:{mtime}:{id_data.colorspace_settings.name}'
+        return f'IM:{id_data.source}:{id_data.name}:{tuple(id_data.size)}'
+    return f'{type(id_data).__name__}:{id_data.name}'
+
+
+def prop_value(data, prop) -> object:
+    """将rna属性转换为可哈希的值
+
+    :param data: bpy_struct
+    :param prop: bpy.types.Property
+    :return:
+    """
+    value = getattr(data, prop.identifier, None)
+
+    if prop.type == 'POINTER':
+        if isinstance(value, bpy.types.ID):
+            return id_token(value)
+        return None  # 嵌套结构跳过，如颜色渐变由下方单独处理
+    if prop.type == 'COLLECTION':
+        return None
+    if getattr(prop, 'is_array', False):
+        try:
+            return tuple(_round(v) for v in value)
+        except TypeError:
+            return None
+    if prop.type == 'ENUM' and prop.is_enum_flag:
+        return tuple(sorted(value))
+    return _round(value)
+
+
+def _hash_struct(h, data, skip=frozenset()):
+    for prop in data.bl_rna.properties:
+        if prop.identifier in _SKIP_PROPS or prop.identifier in skip: continue
+        value = prop_value(data, prop)
+        if value is None: continue
+        h.update(f'{prop.identifier}={value!r};'.encode())
+
+
+def _hash_node(h, node, tree_hashes):
+    h.update(f'N:{node.bl_idname};'.encode())
+    _hash_struct(h, node)
+
+    # 颜色渐变 / 曲线等嵌套数据
+    if ramp := getattr(node, 'color_ramp', None):
+        h.update(f'ramp:{ramp.interpolation}:{ramp.color_mode};'.encode())
+        for el in ramp.elements:
+            h.update(f'{_round(el.position)}:{tuple(_round(c) for c in el.color)};'.encode())
+    if mapping := getattr(node, 'mapping', None):
+        for curve in getattr(mapping, 'curves', ()):
+            for pt in curve.points:
+                h.update(f'{tuple(_round(v) for v in pt.location)}:{pt.handle_type};'.encode())
+
+    # 节点组递归
+    if node.bl_idname in {'ShaderNodeGroup', 'GeometryNodeGroup'} and node.node_tree:
+        h.update(f'G:{tree_fingerprint(node.node_tree, tree_hashes)};'.encode())
+
+    # 未链接的输入接口默认值
+    for i, socket in enumerate(node.inputs):
+        if socket.is_linked or not socket.enabled: continue
+        if not hasattr(socket, 'default_value'): continue
+        h.update(f'I{i}:{socket.identifier}={socket_value(socket)!r};'.encode())
+
+    # 输出接口默认值，值节点和RGB节点的数值保存在输出接口中，链接时同样生效
+    for i, socket in enumerate(node.outputs):
+        if not socket.enabled or not hasattr(socket, 'default_value'): continue
+        h.update(f'O{i}:{socket.identifier}={socket_value(socket)!r};'.encode())
+
+
+def socket_value(socket) -> object:
+    value = socket.default_value
+    if isinstance(value, bpy.types.ID):
+        return id_token(value)
+    try:
+        return tuple(_round(v) for v in value)
+    except TypeError:
+        return _round(value)
+
+
+def tree_fingerprint(tree: bpy.types.NodeTree, tree_hashes: Optional[dict] = None) -> str:
+    """节点树结构指纹，与节点名称和位置无关
+
+    :param tree: bpy.types.NodeTree
+    :param tree_hashes: 节点组缓存 {tree: hash}
+    :return: str
+    """
+    if tree_hashes is None: tree_hashes = {}
+    if tree in tree_hashes: return tree_hashes[tree]
+    tree_hashes[tree] = ''  # 防止循环引用
+
+    # 每个节点单独哈希，按哈希排序以消除名称与顺序影响
+    node_hash = {}
+    for node in tree.nodes:
+        if node.bl_idname in {'NodeFrame', 'NodeReroute'}: continue
+        h = hashlib.sha1()
+        _hash_node(h, node, tree_hashes)
+        node_hash[node] = h.hexdigest()
+
+    def socket_owner(socket):
+        # 跳过转接点，找到真正的来源接口
+        node = socket.node
+        while node.bl_idname == 'NodeReroute':
+            links = node.inputs[0].links
+            if not links: return None, None
+            socket = links[0].from_socket
+            node = socket.node
+        return node, socket
+
+    links = []
+    for link in tree.links:
+        if link.is_muted or not link.is_valid: continue
+        if link.to_node.bl_idname == 'NodeReroute': continue
+        from_node, from_socket = socket_owner(link.from_socket)
+        if from_node is None or from_node not in node_hash: continue
+        if link.to_node not in node_hash: continue
+        links.append(f'{node_hash[from_node]}.{from_socket.identifier}>'
+                     f'{node_hash[link.to_node]}.{link.to_socket.identifier}')
+
+    h = hashlib.sha1()
+    h.update(f'T:{tree.bl_idname};'.encode())
+    for value in sorted(node_hash.values()):
+        h.update(value.encode())
+    for value in sorted(links):
+        h.update(value.encode())
+
+    tree_hashes[tree] = h.hexdigest()
+    return tree_hashes[tree]
+
+
+def material_fingerprint(mat: bpy.types.Material, tree_hashes: Optional[dict] = None,
+                         include_preview: bool = False) -> str:
+    """材质结构指纹，用于预览缓存和查重
+
+    :param mat: bpy.types.Material
+    :param tree_hashes: 节点组缓存，批量计算时复用
+    :param include_preview: 包含预览形状设置，用于预览缓存，查重时不应包含
+    :return: str
+    """
+    h = hashlib.sha1()
+    h.update(f'V{HASH_VERSION};{mat.use_nodes};'.encode())
+    if include_preview:
+        h.update(f'{mat.preview_render_type};{getattr(mat, "mathp_preview_render_type", "")};'.encode())
+    h.update(f'{tuple(_round(c) for c in mat.diffuse_color)};{_round(mat.metallic)};{_round(mat.roughness)};'.encode())
+    h.update(f'{mat.blend_method};{getattr(mat, "surface_render_method", "")};'.encode())
+
+    if mat.use_nodes and mat.node_tree:
+        h.update(tree_fingerprint(mat.node_tree, tree_hashes).encode())
+
+    return h.hexdigest()
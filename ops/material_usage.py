@@ -0,0 +1,87 @@
+import bpy
+from collections import defaultdict
+
+from .functions import C_TMP_ASSET_TAG
+
+# 拥有材质列表的数据类型
+MATERIAL_DATA_COLLECTIONS = ('meshes', 'curves', 'metaballs', 'volumes', 'pointclouds', 'hair_curves',
+                             'grease_pencils', 'grease_pencils_v3')
+
+# 引用材质的几何节点
+node_idnames = {
+    'GeometryNodeReplaceMaterial',
+    'GeometryNodeSetMaterial',
+    'GeometryNodeMaterialSelection',
+    'GeometryNodeInputMaterial',
+}
+
+
+class MaterialUsage:
+    """材质使用者索引，一次遍历物体、网格等数据、几何节点和修改器"""
+
+    def __init__(self):
+        self.users: dict[bpy.types.Material, list[bpy.types.ID]] = defaultdict(list)
+        self.build()
+
+    def add(self, mat, user):
+        if isinstance(mat, bpy.types.Material):
+            self.users[mat].append(user)
+
+    def build(self):
+        # 网格等数据上的材质
+        for attr in MATERIAL_DATA_COLLECTIONS:
+            for data in getattr(bpy.data, attr, ()):
+                if data.users == 0: continue
+                for mat in data.materials:
+                    self.add(mat, data)
+
+        # 物体上的材质和几何节点修改器输入
+        for obj in bpy.data.objects:
+            if obj.users == 0: continue
+            for slot in obj.material_slots:
+                if slot.link == 'OBJECT':
+                    self.add(slot.material, obj)
+
+            for mod in obj.modifiers:
+                if mod.type != 'NODES': continue
+                for key in mod.keys():
+                    self.add(mod[key], obj)
+
+        # 几何节点树中的材质
+        for tree in bpy.data.node_groups:
+            if tree.bl_idname != 'GeometryNodeTree' or tree.users == 0: continue
+            for node in tree.nodes:
+                if node.bl_idname in node_idnames:
+                    self.add(getattr(node, 'material', None), tree)
+                for socket in node.inputs:
+                    if socket.type == 'MATERIAL' and not socket.is_linked:
+                        self.add(socket.default_value, tree)
+
+    def is_used(self, mat: bpy.types.Material) -> bool:
+        return bool(self.users.get(mat))
+
+    @staticmethod
+    def is_protected(mat: bpy.types.Material) -> bool:
+        """只清理临时资产，链接数据、真资产和普通材质均不视为孤立材质"""
+        if mat.library is not None or mat.override_library is not None:
+            return True
+        if mat.asset_data is None:
+            return True
+        return C_TMP_ASSET_TAG not in mat.asset_data.tags
+
+    @staticmethod
+    def has_real_users(mat: bpy.types.Material) -> bool:
+        """除伪用户外的引用计数，覆盖索引未统计的使用者(蜡笔笔刷、驱动器、自定义属性等)"""
+        return mat.users - int(mat.use_fake_user) > 0
+
+    @classmethod
+    def orphans(cls) -> list[bpy.types.Material]:
+        """未使用的临时资产，由引用计数判断，不需要建立索引"""
+        return [mat for mat in bpy.data.materials if not cls.is_protected(mat) and not cls.has_real_users(mat)]
+
+    def used_tmp_assets(self) -> list[bpy.types.Material]:
+        """被索引到使用者的临时资产，用于试运行报告"""
+        return [mat for mat in self.users if not self.is_protected(mat)]
+
+    def user_count(self, mat: bpy.types.Material) -> int:
+        return len(self.users.get(mat, ()))
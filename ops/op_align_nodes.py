@@ -1,9 +1,15 @@
 import bpy
-from numpy import mean
-from math import sqrt, hypot
-from bpy.props import StringProperty
+import time
+import numpy as np
+from array import array
 from typing import Optional
+from bpy.props import StringProperty, EnumProperty
+from bpy.app.handlers import persistent
 from ..prefs.get_pref import get_pref
+from ..node_graph import GraphIndex
+from ..node_graph.layout import layered_layout
+from ..node_graph.spatial import SpatialIndex
+from ..node_graph.align import DependenceAligner
 
 import blf
 
@@ -17,112 +23,6 @@ def dis_y() -> int:
     return get_pref().node_dis_y
 
 
-def connected_socket(self) -> list[bpy.types.NodeSocket]:
-    """获取接口所链接的另一非reroute接口
-
-    :param self: bpy.types.NodeSocket
-    :return: list[bpy.types.NodeSocket]
-    """
-    _connected_sockets = []
-
-    socket = self
-    if socket.is_output:
-        # while socket.is_linked and socket.links[0].to_node.bl_rna.name == 'Reroute':
-        #     socket = socket.links[0].to_node.outputs[0]
-        if socket.is_linked:
-            for link in socket.links:
-                _connected_sockets.append(link.to_socket)
-    else:
-        # while socket.is_linked and socket.links[0].from_node.bl_rna.name == 'Reroute':
-        #     socket = socket.links[0].from_node.inputs[0]
-        if socket.is_linked:
-            for link in socket.links:
-                _connected_sockets.append(link.from_socket)
-
-    return _connected_sockets
-
-
-def get_dependence(node, selected_nodes=None) -> list[bpy.types.Node]:
-    """获取节点子依赖项
-
-    :param node:  bpy.types.Node
-    :param selected_nodes:  list[bpy.types.Node]
-    :return: list[bpy.types.Node]
-    """
-    dependence_nodes = list()
-    for input in node.inputs:
-        _connected_sockets = connected_socket(input)
-        if not _connected_sockets: continue
-
-        for socket in _connected_sockets:
-            if (selected_nodes and socket.node in selected_nodes) or (selected_nodes is None):
-                dependence_nodes.append(socket.node)
-
-    return dependence_nodes
-
-
-def get_dependent(node: bpy.types.Node, selected_nodes: Optional[list[bpy.types.Node]] = None) -> list[bpy.types.Node]:
-    """获取节点父依赖项
-
-    :param node:  bpy.types.Node
-    :param selected_nodes:  list[bpy.types.Node]
-    :return: list[bpy.types.Node]
-    """
-    dependent_nodes = list()
-    for output in node.outputs:
-        _connected_sockets = connected_socket(output)
-
-        if not _connected_sockets: continue
-
-        for socket in _connected_sockets:
-            if (selected_nodes and socket.node in selected_nodes) or (selected_nodes is None):
-                dependent_nodes.append(socket.node)
-
-    return dependent_nodes
-
-
-def get_all_dependence(node: bpy.types.Node, selected_nodes: Optional[list[bpy.types.Node]] = None):
-    """获取节点所有依赖项
-
-    :param node:  bpy.types.Node
-    :param selected_nodes:  list[bpy.types.Node]
-    :return: list[bpy.types.Node]
-    """
-    all_dependence_nodes = list()
-    dependence = get_dependence(node, selected_nodes)
-
-    for dependence_node in dependence:
-        all_dependence_nodes.append(dependence_node)
-
-        sub_dependence = get_all_dependence(dependence_node, selected_nodes)
-        for sub_node in sub_dependence:
-            if sub_node not in all_dependence_nodes:
-                all_dependence_nodes.append(sub_node)
-
-    return all_dependence_nodes
-
-
-def get_all_dependent(node: bpy.types.Node, selected_nodes: Optional[list[bpy.types.Node]] = None):
-    """获取节点所有父级依赖项
-
-    :param node:  bpy.types.Node
-    :param selected_nodes:  list[bpy.types.Node]
-    :return: list[bpy.types.Node]
-    """
-    all_dependent_nodes = list()
-    dependent = get_dependent(node, selected_nodes)
-
-    for dependent_node in dependent:
-        all_dependent_nodes.append(dependent_node)
-
-        sub_dependent = get_all_dependent(dependent_node, selected_nodes)
-        for sub_node in sub_dependent:
-            if sub_node not in all_dependent_nodes:
-                all_dependent_nodes.append(sub_node)
-
-    return all_dependent_nodes
-
-
 def dpifac() -> float:
     """获取用户屏幕缩放，用于矫正节点宽度/长度和摆放位置
 
@@ -155,16 +55,6 @@ def get_center_point(node, loc) -> tuple[float, float]:
     return mid_x, mid_y
 
 
-def get_offset_from_anim(fac) -> float:
-    """从动画值获取偏移比例
-
-    :param fac: 动画完成比，0~1
-    :return: 偏移比
-    """
-
-    return sqrt(min(max(fac, 0), 1))
-
-
 class MATHP_OT_move_dependence(bpy.types.Operator):
     bl_idname = 'mathp.move_dependence'
     bl_label = 'Move Dependence'
@@ -215,9 +105,13 @@ class MATHP_OT_move_dependence(bpy.types.Operator):
         self.mouseDX = event.mouse_x
         self.mouseDY = event.mouse_y
         # 获取对应节点
-        self.target_node = node_at_pos(context.space_data.edit_tree.nodes, context, event)
-        self.dependence = get_all_dependence(self.target_node)
-        self.dependent = get_all_dependent(self.target_node)
+        tree = context.space_data.edit_tree
+        self.target_node = node_at_pos(tree, context, event)
+        if self.target_node is None: return {'CANCELLED'}
+        index = GraphIndex.from_tree(tree)
+        # reroute节点跟随移动
+        self.dependence = index.all_dependence(self.target_node, keep_reroutes=True)
+        self.dependent = index.all_dependent(self.target_node, keep_reroutes=True)
 
         self.append_handler(context)
 
@@ -281,13 +175,31 @@ class MATHP_OT_align_dependence(bpy.types.Operator):
     bl_idname = 'mathp.align_dependence'
     bl_label = 'Align Dependence Nodes'
 
+    mode: EnumProperty(name='Mode', items=[
+        ('DEPENDENCE', 'Dependence', 'Align the selected dependencies of the node under the mouse'),
+        ('TREE', 'Whole Tree', 'Layout the whole node tree in layers from the output node'),
+    ], default='DEPENDENCE')
+
     node_loc_dict = None  # node:{ori_loc:(x,y),tg_loc:(x,y)}
+    index = None  # GraphIndex
 
     target_node = None
     # 动画控制
-    anim_fac = 0  # 动画比例 0~1
-    anim_iter = 30  # 动画更新 秒
+    anim_fac = 0  # 动画比例 0~2，包含1的延迟
     anim_time = 0.05  # 持续时间 秒
+    anim_start = 0
+    # 批量写入 tree.nodes.foreach_set('location')
+    anim_tree = None
+    anim_indices = None  # 移动节点在tree.nodes中的序号
+    anim_ori = None  # numpy (n,2)
+    anim_tg = None
+    anim_delay = None
+    # 帧统计
+    frame_time = 1 / 60
+    last_frame = 0
+    frames = 0
+    dropped_frames = 0
+    last_stats = None  # 上次动画的 {frames, fps, dropped, duration}
     # handle
     _timer = None
     _handle = None
@@ -297,11 +209,12 @@ class MATHP_OT_align_dependence(bpy.types.Operator):
     @classmethod
     def poll(cls, context):
         if not context.window_manager.mathp_node_anim:
-            return hasattr(context, 'selected_nodes') and len(context.selected_nodes) != 0
+            return hasattr(context, 'selected_nodes') and context.space_data.edit_tree is not None
 
     def append_handle(self):
-        self._timer = bpy.context.window_manager.event_timer_add(self.anim_time / self.anim_iter,
-                                                                 window=bpy.context.window)  # 添加计时器检测状态
+        # 按显示刷新率更新，动画进度按时间计算，丢帧不会拖慢动画
+        self.frame_time = 1 / get_pref().align_anim_fps
+        self._timer = bpy.context.window_manager.event_timer_add(self.frame_time, window=bpy.context.window)
         args = (self, bpy.context)
         self._handle = bpy.types.SpaceNodeEditor.draw_handler_add(draw_process_callback_px, args, 'WINDOW',
                                                                   'POST_PIXEL')
@@ -319,17 +232,70 @@ class MATHP_OT_align_dependence(bpy.types.Operator):
         self._timer = None
         self.anim_fac = 0
         self.draw_pos = [0, 0]
+        tree = context.space_data.edit_tree
+        if self.mode == 'DEPENDENCE' and len(context.selected_nodes) == 0: return {'CANCELLED'}
         # 获取鼠标下的节点
-        self.target_node = node_at_pos(context.space_data.edit_tree.nodes, context, event)
-        selected_nodes = tuple(list(context.selected_nodes) + [self.target_node])
+        self.target_node = node_at_pos(tree, context, event)
+        if self.target_node is None: return {'CANCELLED'}
+        self.index = GraphIndex.from_tree(tree)
         # 获取位置
-        self.align_dependence(self.target_node, selected_nodes, check_dependent=True)
+        if self.mode == 'TREE':
+            self.align_tree(tree)
+        else:
+            selected_nodes = set(context.selected_nodes)
+            selected_nodes.add(self.target_node)
+            self.align_dependence(self.target_node, selected_nodes)
+
+        self.prepare_anim(tree)
+
+        # 节点过多时跳过动画
+        if len(self.node_loc_dict) > get_pref().align_anim_max_nodes:
+            self.write_locations(self.anim_tg)
+            return {'FINISHED'}
 
+        self.anim_start = self.last_frame = time.perf_counter()
+        self.frames = self.dropped_frames = 0
         self.append_handle()
         return {"RUNNING_MODAL"}
 
+    def prepare_anim(self, tree):
+        """将起止位置整理为数组，每帧向量化计算并批量写入"""
+        node_index = {node: i for i, node in enumerate(tree.nodes)}
+        nodes = list(self.node_loc_dict)
+        count = len(nodes)
+
+        self.anim_tree = tree
+        self.anim_indices = np.array([node_index[node] for node in nodes], dtype=np.int64)
+        self.anim_ori = np.array([self.node_loc_dict[node]['ori_loc'] for node in nodes], dtype=np.float32)
+        self.anim_tg = np.array([self.node_loc_dict[node]['tg_loc'] for node in nodes], dtype=np.float32)
+        self.anim_ori = self.anim_ori.reshape(count, 2)
+        self.anim_tg = self.anim_tg.reshape(count, 2)
+        # 对节点依次进行移动动画
+        self.anim_delay = np.arange(count, dtype=np.float32) / max(count, 1)
+
+    def write_locations(self, locations):
+        """一次写入所有节点位置
+
+        :param locations: numpy (n,2)，与 anim_indices 对应
+        """
+        nodes = self.anim_tree.nodes
+        buffer = np.empty(len(nodes) * 2, dtype=np.float32)
+        nodes.foreach_get('location', buffer)
+        buffer = buffer.reshape(-1, 2)
+        buffer[self.anim_indices] = locations
+        nodes.foreach_set('location', buffer.ravel())
+        self.anim_tree.update_tag()
+
     def modal(self, context, event):
         if event.type == 'TIMER':
+            now = time.perf_counter()
+            # 超过1.5帧才到达视为丢帧
+            elapsed = now - self.last_frame
+            if elapsed > self.frame_time * 1.5:
+                self.dropped_frames += int(elapsed / self.frame_time) - 1
+            self.last_frame = now
+            self.frames += 1
+
             # 绘制
             # --------
             node = self.target_node
@@ -344,119 +310,62 @@ class MATHP_OT_align_dependence(bpy.types.Operator):
             self.draw_pos = bpy.context.region.view2d.view_to_region(top_left[0], top_left[1], clip=False)
             # --------
 
+            # 与原实现相同，每个anim_time推进1，加上延迟共2个anim_time
+            self.anim_fac = (now - self.anim_start) / self.anim_time
+
             if self.anim_fac >= 1 + 1:  # 添加1动画延迟以完成动画
                 self.remove_handle()
                 # 强制对齐
-                for node, loc_info in self.node_loc_dict.items():
-                    node.location = loc_info['tg_loc']
-
+                self.write_locations(self.anim_tg)
+                self.report_stats(now)
+                context.area.tag_redraw()
                 return {'FINISHED'}
-            # 对节点依次进行移动动画
-            for i, node in enumerate(self.node_loc_dict.keys()):
-                delay = i / len(self.node_loc_dict)
-                self.offset_node(node, self.anim_fac, delay)
 
-            self.anim_fac += 1 / (self.anim_iter + 1)  # last delay
+            offset_fac = np.sqrt(np.clip(self.anim_fac - self.anim_delay, 0, 1))
+            self.write_locations(self.anim_ori + (self.anim_tg - self.anim_ori) * offset_fac[:, None])
+            context.area.tag_redraw()
 
         return {"PASS_THROUGH"}
 
-    def offset_node(self, node, anim_fac, delay=0.1):
-        """
+    def report_stats(self, now):
+        duration = now - self.anim_start
+        stats = {'frames': self.frames,
+                 'fps': self.frames / duration if duration else 0,
+                 'dropped': self.dropped_frames,
+                 'duration': duration}
+        MATHP_OT_align_dependence.last_stats = stats
+        print(f'Material Helper: Align animation {stats["frames"]} frames, {stats["fps"]:.0f} fps, '
+              f'{stats["dropped"]} dropped, {len(self.node_loc_dict)} nodes')
 
-        :param node: bpy.types.Node
-        :param anim_fac: 动画比 0~1
-        :param delay: 延迟
-        :return:
-        """
-        ori_loc = self.node_loc_dict[node]['ori_loc']
-        tg_loc = self.node_loc_dict[node]['tg_loc']
+    def align_tree(self, tree):
+        """整个节点树分层布局，reroute和框保持原位
 
-        offset_fac = get_offset_from_anim(anim_fac - delay)
+        :param tree: bpy.types.NodeTree
+        """
+        nodes = [node for node in tree.nodes if node.type != 'FRAME' and node not in self.index.reroutes]
+        sizes = {node: get_dimensions(node) for node in nodes}
+        locations = {node: tuple(abs_node_location(node)) for node in nodes}
 
-        offset_x = (tg_loc[0] - ori_loc[0]) * offset_fac
-        offset_y = (tg_loc[1] - ori_loc[1]) * offset_fac
+        layout = layered_layout(self.index, sizes, locations, dis_x=dis_x(), dis_y=dis_y())
 
-        node.location = ori_loc[0] + offset_x, ori_loc[1] + offset_y
+        for node, (x, y) in layout.items():
+            # 框内节点的位置相对于框
+            parent_x, parent_y = abs_node_location(node.parent) if node.parent else (0, 0)
+            self.node_loc_dict[node] = {'ori_loc': tuple(node.location),
+                                        'tg_loc': (x - parent_x, y - parent_y)}
 
-    def align_dependence(self, node, selected_nodes=None, check_dependent=False):
+    def align_dependence(self, node, selected_nodes):
         """提取节点的目标位置，用于动画
 
         :param node: bpy.types.Node
-        :param selected_nodes: list[bpy.types.Node]
-        :parm check_dependent: 检查父级依赖
-        :return: bpy.types.Node
+        :param selected_nodes: set[bpy.types.Node]
         """
+        sizes = {n: get_dimensions(n) for n in selected_nodes}
+        locations = {n: tuple(n.location) for n in selected_nodes}
 
-        dependence = get_dependence(node, selected_nodes)
-
-        # 设置初始值
-        dim_x, dim_y = get_dimensions(node)
-
-        if node in self.node_loc_dict:
-            last_location_x, last_location_y = self.node_loc_dict[node]['tg_loc']
-        else:
-            last_location_x = node.location.x
-            last_location_y = node.location.y
-            # active node as dependent
-            self.node_loc_dict[node] = {'ori_loc': tuple(node.location),
-                                        'tg_loc': tuple(node.location)}
-
-        last_dimensions_x = dim_x
-        last_dimensions_y = dim_y
-
-        for i, sub_node in enumerate(dependence):
-            # 跳过未选中节点
-            if selected_nodes and sub_node not in selected_nodes: continue
-
-            sub_dim_x, sub_dim_y = get_dimensions(sub_node)
-
-            # 对齐父级依赖
-            if check_dependent:
-                dependent_nodes = get_dependent(sub_node, selected_nodes)
-                if len(dependent_nodes) > 1:
-                    ori_loc = (sub_node.location.x, sub_node.location.y)
-
-                    dep_loc_x = list()
-                    dep_loc_y = list()
-
-                    for i, depend_node in enumerate(dependent_nodes):
-                        if depend_node in self.node_loc_dict:
-                            dep_loc_x.append(self.node_loc_dict[depend_node]['tg_loc'][0])
-                            dep_loc_y.append(self.node_loc_dict[depend_node]['tg_loc'][1])
-
-                        else:
-                            dep_loc_x.append(depend_node.location.x)
-                            dep_loc_y.append(depend_node.location.y)
-
-                    tg_loc_x = min(dep_loc_x) - sub_dim_x - dis_x()
-                    tg_loc_y = mean(dep_loc_y)
-
-                    # 记录位置用于动画
-                    self.node_loc_dict[sub_node] = {'ori_loc': ori_loc,
-                                                    'tg_loc': (tg_loc_x, tg_loc_y)}
-
-                elif len(dependent_nodes) == 1:
-                    # 排列同层级自己
-                    parent_node = dependent_nodes[0]
-                    self.align_dependence(parent_node, selected_nodes)
-
-
-            # 忽略父级依赖
-            else:
-                ori_loc = (sub_node.location.x, sub_node.location.y)
-                # 目标位置 = 上一个节点位置-当前节点宽度-间隔，y轴向对其第一个节点到依赖节点
-                tg_loc_x = last_location_x - sub_dim_x - dis_x()
-                tg_loc_y = last_location_y - last_dimensions_y - dis_y() if i != 0 else last_location_y
-                # 记录位置用于动画
-                self.node_loc_dict[sub_node] = {'ori_loc': ori_loc,
-                                                'tg_loc': (tg_loc_x, tg_loc_y)}
-                # 为下一个节点设置
-                last_location_y = tg_loc_y
-                last_dimensions_y = sub_dim_y
-
-            self.align_dependence(sub_node, selected_nodes, check_dependent)
-
-        return node
+        aligner = DependenceAligner(self.index, sizes, locations, dis_x(), dis_y())
+        for n, tg_loc in aligner.align(node, selected_nodes, check_dependent=True).items():
+            self.node_loc_dict[n] = {'ori_loc': locations[n], 'tg_loc': tg_loc}
 
 
 # 以下三个函数来自node wrangler
@@ -480,55 +389,64 @@ def store_mouse_cursor(context, event) -> None:
         space.cursor_location = tree.view_center
 
 
-def node_at_pos(nodes, context, event) -> bpy.types.Node:
-    nodes_under_mouse = []
-    target_node = None
+class NodeSpatialCache:
+    """每个节点树的节点边界空间索引，节点数量、位置、尺寸变化或节点树更新后重建"""
+    cache: dict[int, tuple[tuple, SpatialIndex]] = {}  # tree pointer: (signature, index)
+    version: int = 0  # 节点树更新计数，重命名、改变父级框等无法从位置判断的变化
 
-    store_mouse_cursor(context, event)
-    x, y = context.space_data.cursor_location
+    @classmethod
+    def signature(cls, tree) -> tuple:
+        """只用foreach_get读取位置和尺寸，不逐个访问节点"""
+        nodes = tree.nodes
+        location = array('f', bytes(len(nodes) * 2 * 4))
+        dimensions = array('f', bytes(len(nodes) * 2 * 4))
+        nodes.foreach_get('location', location)
+        nodes.foreach_get('dimensions', dimensions)
+        return len(nodes), location.tobytes() + dimensions.tobytes(), dpifac(), cls.version
 
-    # Make a list of each corner (and middle of border) for each node.
-    # Will be sorted to find nearest point and thus nearest node
-    node_points_with_dist = []
-    for node in nodes:
-        skipnode = False
-        if node.type == 'FRAME': continue  # no point trying to link to a frame node
+    @classmethod
+    def get(cls, tree) -> SpatialIndex:
+        key = tree.as_pointer()
+        signature = cls.signature(tree)
+        cached = cls.cache.get(key)
+        if cached and cached[0] == signature: return cached[1]
+
+        # 保存节点名而不是节点，撤销后节点引用会失效
+        fac = dpifac()
+        bounds = []
+        for node in tree.nodes:
+            if node.type == 'FRAME': continue  # no point trying to link to a frame node
+            locx, locy = abs_node_location(node)
+            bounds.append((node.name, locx, locy, node.dimensions.x / fac, node.dimensions.y / fac))
 
-        dimx = node.dimensions.x / dpifac()
-        dimy = node.dimensions.y / dpifac()
-        locx, locy = abs_node_location(node)
+        index = SpatialIndex(bounds)
+        cls.cache[key] = (signature, index)
+        return index
 
-        if skipnode: continue
+    @classmethod
+    def clear(cls):
+        cls.cache.clear()
 
-        node_points_with_dist.append([node, hypot(x - locx, y - locy)])  # Top Left
-        node_points_with_dist.append([node, hypot(x - (locx + dimx), y - locy)])  # Top Right
-        node_points_with_dist.append([node, hypot(x - locx, y - (locy - dimy))])  # Bottom Left
-        node_points_with_dist.append([node, hypot(x - (locx + dimx), y - (locy - dimy))])  # Bottom Right
 
-        node_points_with_dist.append([node, hypot(x - (locx + (dimx / 2)), y - locy)])  # Mid Top
-        node_points_with_dist.append([node, hypot(x - (locx + (dimx / 2)), y - (locy - dimy))])  # Mid Bottom
-        node_points_with_dist.append([node, hypot(x - locx, y - (locy - (dimy / 2)))])  # Mid Left
-        node_points_with_dist.append([node, hypot(x - (locx + dimx), y - (locy - (dimy / 2)))])  # Mid Right
+@persistent
+def on_depsgraph_update(scene, depsgraph):
+    # 重命名节点和改变父级框会更新节点树，嵌入的节点树以材质等所有者的更新出现
+    for update in depsgraph.updates:
+        if isinstance(update.id, bpy.types.NodeTree) or getattr(update.id, 'node_tree', None) is not None:
+            NodeSpatialCache.version += 1
+            return
 
-    nearest_node = sorted(node_points_with_dist, key=lambda k: k[1])[0][0]
 
-    for node in nodes:
-        if node.type != 'FRAME' and skipnode is False:
-            locx, locy = abs_node_location(node)
-            dimx = node.dimensions.x / dpifac()
-            dimy = node.dimensions.y / dpifac()
-            if (locx <= x <= locx + dimx) and \
-                    (locy - dimy <= y <= locy):
-                nodes_under_mouse.append(node)
-
-    if len(nodes_under_mouse) == 1:
-        if nodes_under_mouse[0] != nearest_node:
-            target_node = nodes_under_mouse[0]  # use the node under the mouse if there is one and only one
-        else:
-            target_node = nearest_node  # else use the nearest node
-    else:
-        target_node = nearest_node
-    return target_node
+def node_at_pos(tree, context, event) -> Optional[bpy.types.Node]:
+    """鼠标下只有一个节点时使用该节点，否则使用最近的节点
+
+    :param tree: bpy.types.NodeTree
+    """
+    store_mouse_cursor(context, event)
+    x, y = context.space_data.cursor_location
+
+    name = NodeSpatialCache.get(tree).pick(x, y)
+    return tree.nodes.get(name) if name is not None else None
 
 
 def register():
@@ -538,9 +456,12 @@ def register():
     # 防止多个操作符同时运行
     bpy.types.WindowManager.mathp_node_move = bpy.props.BoolProperty(default=False)
     bpy.types.WindowManager.mathp_node_anim = bpy.props.BoolProperty(default=False)
+    bpy.app.handlers.depsgraph_update_post.append(on_depsgraph_update)
 
 
 def unregister():
+    bpy.app.handlers.depsgraph_update_post.remove(on_depsgraph_update)
+    NodeSpatialCache.clear()
     bpy.utils.unregister_class(MATHP_OT_move_dependence)
     bpy.utils.unregister_class(MATHP_OT_align_dependence)
 
@@ -1,38 +1,66 @@
 import bpy
-
-node_idnames = {
-
-    'GeometryNodeReplaceMaterial',
-    'GeometryNodeSetMaterial',
-    'GeometryNodeMaterialSelection'
-}
+import time
+from bpy.props import BoolProperty
 
 from .op_tmp_asset import update_tmp_asset
 from .op_edit_material_asset import tag_redraw, SaveUpdate
-from .functions import _uuid, C_TMP_ASSET_TAG
+from .material_usage import MaterialUsage
+from .. import api
 
 
 class MATHP_OT_clear_unused_material(bpy.types.Operator):
+    """Delete temp asset materials that are not used by any object, mesh data or geometry nodes"""
     bl_label = "Clear Unused Material"
     bl_idname = "mathp.clear_unused_material"
     bl_options = {'REGISTER', 'UNDO'}
 
+    dry_run: BoolProperty(name='Dry Run', description='Only report unused materials, do not delete',
+                          default=False)
+    remove_dependencies: BoolProperty(name='Remove Dependencies',
+                                      description='Also delete node groups and images only used by unused materials',
+                                      default=False)
+
+    orphans = []  # 用于对话框显示
+
+    def invoke(self, context, event):
+        MATHP_OT_clear_unused_material.orphans = [mat.name for mat in MaterialUsage.orphans()]
+        return context.window_manager.invoke_props_dialog(self)
+
+    def draw(self, context):
+        layout = self.layout
+        layout.prop(self, 'dry_run')
+        layout.prop(self, 'remove_dependencies')
+
+        orphans = MATHP_OT_clear_unused_material.orphans
+        col = layout.column(align=True)
+        col.label(text=f'Unused: {len(orphans)}', icon='MATERIAL')
+        for name in orphans[:10]:
+            col.label(text=name)
+        if len(orphans) > 10:
+            col.label(text='...')
+
     def execute(self, context):
-        for mat in bpy.data.materials:
-            if not mat.asset_data: continue
-            if C_TMP_ASSET_TAG in mat.asset_data.tags:
-                mat.asset_clear()
-            if mat.users == 0:
-                bpy.data.materials.remove(mat)
-            else:
-                mat.asset_mark()
-                mat.asset_generate_preview()
-                mat.asset_data.tags.new(C_TMP_ASSET_TAG)
-                if mat.asset_data.catalog_id != _uuid:
-                    mat.asset_data.catalog_id = _uuid
+        start = time.perf_counter()
+        orphans = MaterialUsage.orphans()
+        names = [mat.name for mat in orphans]
+
+        for name in names:
+            print(f'Material Helper: Unused material {name}')
+
+        if self.dry_run:
+            # 只在试运行时建立索引，列出保留的临时资产及其使用者
+            usage = MaterialUsage()
+            for mat in usage.used_tmp_assets():
+                users = ', '.join(user.name for user in usage.users[mat])
+                print(f'Material Helper: Used material {mat.name} by {users}')
+            self.report({'INFO'}, f'{len(names)} unused materials found')
+            return {'FINISHED'}
 
+        count, dep_count = api.delete_materials(orphans, self.remove_dependencies)
         tag_redraw()
 
+        self.report({'INFO'}, f'{count} unused materials, {dep_count} dependencies deleted '
+                              f'({time.perf_counter() - start:.2f}s)')
         return {'FINISHED'}
 
 
@@ -0,0 +1,62 @@
+import bpy
+import time
+from bpy.props import BoolProperty
+
+from .op_edit_material_asset import tag_redraw
+from .. import api
+
+
+class MATHP_OT_dedupe_material(bpy.types.Operator):
+    """Merge materials with identical node trees (Mat.001, Mat.002...) into one"""
+    bl_label = "Merge Duplicate Materials"
+    bl_idname = "mathp.dedupe_material"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    dry_run: BoolProperty(name='Dry Run', description='Only report duplicate materials, do not merge',
+                          default=False)
+
+    groups = []  # 用于对话框显示 [(保留名称, 重复数量)]
+
+    def invoke(self, context, event):
+        MATHP_OT_dedupe_material.groups = [(canonical.name, len(dups)) for canonical, dups in
+                                           api.find_duplicate_materials()]
+        return context.window_manager.invoke_props_dialog(self)
+
+    def draw(self, context):
+        layout = self.layout
+        layout.prop(self, 'dry_run')
+
+        groups = MATHP_OT_dedupe_material.groups
+        col = layout.column(align=True)
+        col.label(text=f'Groups: {len(groups)}  Duplicates: {sum(n for _, n in groups)}', icon='MATERIAL')
+        for name, count in groups[:10]:
+            col.label(text=f'{name}  x{count}')
+        if len(groups) > 10:
+            col.label(text='...')
+
+    def execute(self, context):
+        start = time.perf_counter()
+        groups = api.find_duplicate_materials()
+
+        for canonical, dups in groups:
+            print(f'Material Helper: {canonical.name} <- {", ".join(mat.name for mat in dups)}')
+
+        dup_count = sum(len(dups) for _, dups in groups)
+        if self.dry_run:
+            self.report({'INFO'}, f'{len(groups)} groups, {dup_count} duplicate materials found')
+            return {'FINISHED'}
+
+        count = api.merge_duplicate_materials(groups)
+        tag_redraw()
+
+        self.report({'INFO'}, f'{len(groups)} groups merged, {count} materials freed '
+                              f'({time.perf_counter() - start:.2f}s)')
+        return {'FINISHED'}
+
+
+def register():
+    bpy.utils.register_class(MATHP_OT_dedupe_material)
+
+
+def unregister():
+    bpy.utils.unregister_class(MATHP_OT_dedupe_material)
@@ -8,14 +8,90 @@ from bpy.types import Operator
 from bpy.props import (IntProperty, FloatProperty, StringProperty, EnumProperty, BoolProperty)
 from bpy.types import GizmoGroup
 from contextlib import contextmanager
+from bpy.app.handlers import persistent
 
 from ..prefs.get_pref import get_pref
+from .handlers import HandlerDispatcher
+
+
+class EditorSession():
+    """单个材质编辑窗口的状态"""
+
+    def __init__(self, style: str, window: bpy.types.Window, material: str):
+        self.style = style
+        self.window_key = window.as_pointer()
+        self.screen_name = window.screen.name
+        self.material = material  # 材质名
+
+    def get_window(self) -> Union[bpy.types.Window, None]:
+        for window in bpy.context.window_manager.windows:
+            if window.as_pointer() == self.window_key:
+                return window
+        return None
+
+    def retarget(self, mat: bpy.types.Material) -> bool:
+        """将已打开的编辑窗口切换到新材质
+
+        :return: 窗口是否仍然存在
+        """
+        window = self.get_window()
+        if window is None: return False
+
+        # 之前编辑的材质不会再触发关闭，切换前更新其预览
+        if self.material != mat.name and (old_mat := bpy.data.materials.get(self.material)):
+            request_preview(old_mat)
+
+        self.material = mat.name
+        for area in window.screen.areas:
+            if area.type == 'VIEW_3D':
+                area.spaces[0].lock_object = bpy.context.view_layer.objects.active
+            area.tag_redraw()
+        return True
 
+    def close(self):
+        """窗口关闭后清理"""
+        if mat := bpy.data.materials.get(self.material):
+            request_preview(mat)
 
-class State():
+        # 清理多余screen
+        if screen := bpy.data.screens.get(self.screen_name):
+            screen.user_clear()
+
+
+class EditorSessions():
+    """按窗口样式保存编辑窗口，再次编辑时复用"""
+    sessions: dict[str, EditorSession] = {}  # style: EditorSession
     window_count: int = 1
-    new_window: Union[bpy.types.Window, None] = None
-    last_edit_mat: Union[bpy.types.Material, None] = None
+
+    @classmethod
+    def retarget(cls, style: str, mat: bpy.types.Material) -> bool:
+        session = cls.sessions.get(style)
+        if session is None: return False
+        if session.retarget(mat): return True
+
+        cls.sessions.pop(style).close()
+        return False
+
+    @classmethod
+    def add(cls, style: str, mat: bpy.types.Material):
+        window = bpy.context.window_manager.windows[-1]
+        window.screen.name = f'tmp_mathp_{style}'
+        cls.sessions[style] = EditorSession(style, window, mat.name)
+        cls.window_count = len(bpy.context.window_manager.windows)
+
+    @classmethod
+    def check_closed(cls) -> list[EditorSession]:
+        """窗口数量减少时才检查各个会话
+
+        :return: 已关闭的会话
+        """
+        count = len(bpy.context.window_manager.windows)
+        decreased = count < cls.window_count
+        cls.window_count = count
+        if not decreased: return []
+
+        closed = [style for style, session in cls.sessions.items() if session.get_window() is None]
+        return [cls.sessions.pop(style) for style in closed]
 
 
 def allowSaveUpdate():
@@ -122,19 +198,12 @@ def split_shader_3d_area():
     return area_shader, area_3d
 
 
-def update_window_count():
-    State.window_count = len(bpy.context.window_manager.windows)
-    State.new_window = bpy.context.window_manager.windows[-1]
-
-
 def window_style_1():
     """大窗口,左属性面板右节点面板
 
     :return:
     """
-    update_window_count()
     bpy.ops.wm.window_new()  # 使用新窗口
-    update_window_count()
     split_shader_3d_area()
 
 
@@ -145,9 +214,7 @@ def window_style_2(flip_header=True):
     """
     # 创建新窗口
     # bpy.ops.render.view_show('INVOKE_AREA')
-    update_window_count()
     bpy.ops.screen.userpref_show("INVOKE_AREA")  # 使用偏好设置而不是渲染（版本更改导致渲染不再置顶）
-    update_window_count()
 
     if get_pref().use_shader_ball_pv:
         area_3d, area_shader = split_shader_3d_area()
@@ -191,11 +258,104 @@ def pop_up_window(style='2'):
         window_style_2()
 
 
-def set_shader_ball_mat(mat, coll):
-    """导入并设置材质球模型/材质
+def request_preview(mat):
+    """通过预览队列生成预览，未修改的材质将从缓存恢复"""
+    from .preview_queue import PreviewQueue
+    PreviewQueue.request([mat])
+
+
+SHADER_BALL_TYPES = ('FLAT', 'SPHERE', 'CUBE', 'HAIR', 'SHADERBALL', 'CLOTH', 'FLUID')
+C_SHADER_BALL_TAG = 'mathp_shader_ball'  # 物体自定义属性，记录材质球类型
+
+
+class ShaderBallPool:
+    """会话内的材质球物体池，只从文件加载一次，编辑时只切换材质"""
+    objects: dict[str, str] = {}  # type: object name
+    unavailable: set[str] = set()  # 文件中不存在的类型，避免重复读取
+    coll_name: str = 'tmp_mathp'
+    saved_material: Union[str, None] = None  # 保存文件时正在编辑的材质，保存后恢复
+
+    @classmethod
+    def get_object(cls, ball_type: str) -> Union[bpy.types.Object, None]:
+        obj = bpy.data.objects.get(cls.objects.get(ball_type, ''))
+        # 撤销或打开文件后物体可能已失效
+        if obj is None or obj.get(C_SHADER_BALL_TAG) != ball_type:
+            return None
+        return obj
+
+    @classmethod
+    def objects_loaded(cls) -> list[bpy.types.Object]:
+        return [obj for obj in map(cls.get_object, SHADER_BALL_TYPES) if obj is not None]
+
+    @classmethod
+    def ensure_collection(cls) -> bpy.types.Collection:
+        coll = bpy.data.collections.get(cls.coll_name)
+        if coll is None:
+            coll = bpy.data.collections.new(cls.coll_name)
+            coll.hide_render = True
+        return coll
+
+    @classmethod
+    def ensure_loaded(cls):
+        """一次性加载所有缺失的材质球"""
+        missing = [t for t in SHADER_BALL_TYPES if t not in cls.unavailable and cls.get_object(t) is None]
+        if not missing: return
+
+        shader_ball_lib = Path(__file__).parent.parent.joinpath('shader_ball_lib')
+        blend_file = shader_ball_lib.joinpath('shader_ball.blend')
+
+        with bpy.data.libraries.load(str(blend_file), link=False) as (data_from, data_to):
+            names = [name for name in data_from.objects if name in missing]
+            data_to.objects = names
+        cls.unavailable.update(t for t in missing if t not in names)
+
+        coll = cls.ensure_collection()
+        for ball_type, obj in zip(names, data_to.objects):
+            if obj is None or obj.data is None: continue
+            obj[C_SHADER_BALL_TAG] = ball_type
+            # 移动到比较远的地方
+            obj.location = (10000, 10000, 10000)
+            obj.hide_viewport = True
+            if obj.type == 'MESH':
+                obj.data.shade_smooth()
+            if not obj.material_slots:
+                obj.data.materials.append(None)
+            obj.material_slots[0].link = 'OBJECT'  # 同类型共享网格，材质设置在物体上
+
+            coll.objects.link(obj)
+            cls.objects[ball_type] = obj.name
+
+    @classmethod
+    def show(cls, scene: bpy.types.Scene) -> bpy.types.Collection:
+        coll = cls.ensure_collection()
+        if coll.name not in scene.collection.children:
+            scene.collection.children.link(coll)
+        return coll
+
+    @classmethod
+    def hide(cls, scene: bpy.types.Scene):
+        coll = bpy.data.collections.get(cls.coll_name)
+        if coll and coll.name in scene.collection.children:
+            scene.collection.children.unlink(coll)
+
+    @classmethod
+    def clear(cls):
+        coll = bpy.data.collections.get(cls.coll_name)
+        for obj in cls.objects_loaded():
+            me = obj.data
+            bpy.data.objects.remove(obj)
+            if me and me.users == 0:
+                bpy.data.meshes.remove(me)
+        if coll:
+            bpy.data.collections.remove(coll)
+        cls.objects.clear()
+        cls.unavailable.clear()
+
+
+def set_shader_ball_mat(mat):
+    """从材质球池中取出对应模型并设置材质
 
     :param mat: bpy.types.Material
-    :param coll: bpy.types.Collection
     :return:
     """
     # 获取设置
@@ -204,30 +364,28 @@ def set_shader_ball_mat(mat, coll):
         if mat_pv_type == 'NONE':
             mat_pv_type = mat.mathp_preview_render_type
 
-        shader_ball_lib = Path(__file__).parent.parent.joinpath('shader_ball_lib')
-        blend_file = shader_ball_lib.joinpath('shader_ball.blend')
-
-        with bpy.data.libraries.load(str(blend_file), link=False) as (data_from, data_to):
-            data_to.objects = [mat_pv_type]
-
-        tmp_obj = data_to.objects[0]
+        ShaderBallPool.ensure_loaded()
+        ShaderBallPool.show(bpy.context.scene)
 
-        # 移动到比较远的地方
-        tmp_obj.location = (10000, 10000, 10000)
+        tmp_obj = None
+        for ball_type in SHADER_BALL_TYPES:
+            obj = ShaderBallPool.get_object(ball_type)
+            if obj is None: continue
+            obj.hide_viewport = ball_type != mat_pv_type
+            if ball_type == mat_pv_type:
+                tmp_obj = obj
 
-        coll.objects.link(tmp_obj)
+        if tmp_obj is None:
+            print(f'Material Helper: Shader ball {mat_pv_type} not found')
+            return
 
         # 设置激活项和材质
+        for obj in bpy.context.view_layer.objects.selected:
+            obj.select_set(False)
         bpy.context.view_layer.objects.active = tmp_obj
 
-        bpy.ops.object.select_all(action='DESELECT')
-        bpy.context.object.select_set(True)
-        bpy.ops.object.shade_smooth()
-
         tmp_obj.select_set(True)
-        tmp_obj.active_material = mat
-
-        State.last_edit_mat = mat.name
+        tmp_obj.material_slots[0].material = mat
 
 
 class MATHP_OT_edit_material_asset(Operator):
@@ -278,24 +436,22 @@ class MATHP_OT_edit_material_asset(Operator):
                 return self._return(msg='请选择一个本地材质资产', type='WARNING')
             # print(selected_mat)
 
-        # 创建集合
-        tmp_coll = bpy.data.collections[
-            'tmp_mathp'] if 'tmp_mathp' in bpy.data.collections else bpy.data.collections.new(
-            'tmp_mathp')
-        if 'tmp_mathp' not in context.scene.collection.children:
-            context.scene.collection.children.link(tmp_coll)
-
         # 设置材质球/材质
+        set_shader_ball_mat(selected_mat[0])
+        request_preview(selected_mat[0])
 
-        set_shader_ball_mat(selected_mat[0], tmp_coll)
-        selected_mat[0].asset_generate_preview()
+        # 复用已打开的编辑窗口
+        style = get_pref().window_style
+        if EditorSessions.retarget(style, selected_mat[0]):
+            return {'FINISHED'}
 
         # 设置鼠标位置，以便弹窗出现在正中央
         w = context.window
         w_center_x, w_center_y = w.width / 2, w.height / 2
         w.cursor_warp(int(w_center_x), int(w_center_y))
         # 弹窗
-        pop_up_window(style=get_pref().window_style)
+        pop_up_window(style=style)
+        EditorSessions.add(style, selected_mat[0])
 
         return {'FINISHED'}
 
@@ -311,7 +467,7 @@ class MATHP_OT_update_mat_pv(Operator):
         # 更新材质预览
         mat = bpy.data.materials.get(self.mat_name)
         if mat:
-            mat.asset_generate_preview()
+            request_preview(mat)
 
         return {'FINISHED'}
 
@@ -353,60 +509,64 @@ class MATHP_UI_update_mat_pv(GizmoGroup):
         self.foo_gizmo = gz
 
 
-from bpy.app.handlers import persistent
-
-
-@persistent
-def del_tmp_obj(scene, depsgraph):
-    """删除用于预览的模型/网格/屏幕缓存
+def del_tmp_obj(scene):
+    """编辑窗口关闭后更新预览并收起材质球
 
     :param scene:
-    :param depsgraph:
     :return:
     """
-    try:
-        _ = bpy.context.window_manager.windows[State.window_count - 1]
-        return
-    except IndexError:
-        pass
-    finally:
-        update_window_count()
-
-    if allowSaveUpdate():
-        if mat := bpy.data.materials.get(State.last_edit_mat):
-            mat.asset_generate_preview()
-
-        coll = bpy.data.collections.get('tmp_mathp')
-        if coll:
-            # 清理临时物体
-            for obj in bpy.data.collections['tmp_mathp'].objects:
-                me = obj.data
-                bpy.data.objects.remove(obj)
-                bpy.data.meshes.remove(me)
+    if not allowSaveUpdate(): return
 
-            bpy.data.collections.remove(coll)
+    for session in EditorSessions.check_closed():
+        session.close()
 
-        if 'tmp_mathp' in bpy.data.screens:
-            # 清理多余screen
-            for s in bpy.data.screens:
-                if not s.name.startswith('tmp_mathp'): continue
-                s.user_clear()
+    if EditorSessions.sessions: return
+
+    # 材质球保留在池中，只移出场景并清除材质
+    for obj in ShaderBallPool.objects_loaded():
+        obj.material_slots[0].material = None
+    ShaderBallPool.hide(scene)
+
+
+@persistent
+def remove_pool_pre_save(dummy):
+    """材质球池只在会话中使用，不写入文件"""
+    ShaderBallPool.saved_material = None
+    if EditorSessions.sessions:
+        for obj in ShaderBallPool.objects_loaded():
+            if not obj.hide_viewport and obj.material_slots[0].material:
+                ShaderBallPool.saved_material = obj.material_slots[0].material.name
+    ShaderBallPool.clear()
+
+
+@persistent
+def restore_pool_post_save(dummy):
+    """保存后恢复仍在编辑的材质球"""
+    name, ShaderBallPool.saved_material = ShaderBallPool.saved_material, None
+    mat = bpy.data.materials.get(name) if name else None
+    if mat is None: return
+
+    set_shader_ball_mat(mat)
+    for session in EditorSessions.sessions.values():
+        session.retarget(mat)
+
+
+@persistent
+def remove_pool_pre_load(dummy):
+    # 编辑窗口随文件关闭
+    ShaderBallPool.clear()
+    EditorSessions.sessions.clear()
 
 
 def update_shader_ball(self, context):
-    coll = bpy.data.collections.get('tmp_mathp')
+    coll = bpy.data.collections.get(ShaderBallPool.coll_name)
 
-    if not coll: return
+    if not coll or coll.name not in context.scene.collection.children: return
 
     mat = self.id_data
 
-    for obj in bpy.data.collections['tmp_mathp'].objects:
-        me = obj.data
-        bpy.data.objects.remove(obj)
-        bpy.data.meshes.remove(me)
-
-    set_shader_ball_mat(mat, coll)
-    mat.asset_generate_preview()
+    set_shader_ball_mat(mat)
+    request_preview(mat)
 
     for a in context.window.screen.areas:
         if a.type == 'VIEW_3D':
@@ -430,11 +590,19 @@ def register():
         bpy.utils.register_class(MATHP_OT_edit_material_asset)
     bpy.utils.register_class(MATHP_OT_update_mat_pv)
     # bpy.utils.register_class(MATHP_UI_update_mat_pv)
-    bpy.app.handlers.depsgraph_update_pre.append(del_tmp_obj)
+    # 关闭窗口不对应任何ID类型的更新，不做过滤，在之后的任意更新中检查
+    HandlerDispatcher.add('del_tmp_obj', del_tmp_obj)
+    bpy.app.handlers.save_pre.append(remove_pool_pre_save)
+    bpy.app.handlers.save_post.append(restore_pool_post_save)
+    bpy.app.handlers.load_pre.append(remove_pool_pre_load)
 
 
 def unregister():
-    bpy.app.handlers.depsgraph_update_pre.remove(del_tmp_obj)
+    HandlerDispatcher.remove('del_tmp_obj')
+    bpy.app.handlers.save_pre.remove(remove_pool_pre_save)
+    bpy.app.handlers.save_post.remove(restore_pool_post_save)
+    bpy.app.handlers.load_pre.remove(remove_pool_pre_load)
+    ShaderBallPool.clear()
     bpy.utils.unregister_class(MATHP_OT_edit_material_asset)
     bpy.utils.unregister_class(MATHP_OT_update_mat_pv)
     # bpy.utils.unregister_class(MATHP_UI_update_mat_pv)
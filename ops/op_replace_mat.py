@@ -1,53 +1,259 @@
 import bpy
+from bisect import bisect_left
 
-from bpy.props import StringProperty, EnumProperty
+from bpy.props import StringProperty, IntProperty, EnumProperty
 from .op_tmp_asset import get_local_selected_assets
+from .. import api
+
+
+class MaterialSearchIndex:
+    """材质名称搜索索引，仅在材质增删或重命名后重建"""
+    signature: tuple[str, ...] = ()  # bpy.data.materials.keys()
+    lower_names: list[str] = []
+    sorted_names: list[tuple[str, int]] = []  # (小写名称, 原索引)，用于前缀二分查找
+    results: dict[tuple[str, bool], tuple[list[int], list[int]]] = {}  # (filter, 按名称排序): (flags, order)
+    last_filter: str = ''  # 列表当前的过滤文本
+
+    @classmethod
+    def ensure(cls):
+        signature = tuple(bpy.data.materials.keys())
+        if signature == cls.signature: return
+
+        cls.signature = signature
+        cls.lower_names = [name.lower() for name in signature]
+        cls.sorted_names = sorted((name, i) for i, name in enumerate(cls.lower_names))
+        cls.results.clear()
+
+    @classmethod
+    def search(cls, text: str) -> list[int]:
+        """前缀匹配在前，子串匹配在后
+
+        :param text: 搜索文本
+        :return: 匹配材质的索引
+        """
+        cls.ensure()
+        text = text.lower()
+        if not text: return list(range(len(cls.lower_names)))
+
+        prefix = []
+        i = bisect_left(cls.sorted_names, (text, -1))
+        while i < len(cls.sorted_names) and cls.sorted_names[i][0].startswith(text):
+            prefix.append(cls.sorted_names[i][1])
+            i += 1
+
+        prefix_set = set(prefix)
+        substring = [i for i, name in enumerate(cls.lower_names) if text in name and i not in prefix_set]
+
+        return prefix + substring
+
+    @classmethod
+    def filter(cls, text: str, bitflag: int, sort_alpha: bool = False) -> tuple[list[int], list[int]]:
+        """UIList过滤结果
+
+        :param sort_alpha: 按名称排序，否则前缀匹配在前
+        :return: (flags, order)
+        """
+        cls.ensure()
+        cls.last_filter = text
+        key = (text, sort_alpha)
+        if key in cls.results: return cls.results[key]
+
+        count = len(cls.lower_names)
+        if sort_alpha:
+            flags = [0] * count if text else [bitflag] * count
+            for i in cls.search(text) if text else ():
+                flags[i] = bitflag
+            order = [0] * count
+            for pos, (_, i) in enumerate(cls.sorted_names):
+                order[i] = pos
+            result = (flags, order)
+        elif not text:
+            result = ([bitflag] * count, [])
+        else:
+            matches = cls.search(text)
+            flags = [0] * count
+            order = [0] * count
+            matched = set(matches)
+            for pos, i in enumerate(matches):
+                flags[i] = bitflag
+                order[i] = pos
+            pos = len(matches)
+            for i in range(count):
+                if i in matched: continue
+                order[i] = pos
+                pos += 1
+            result = (flags, order)
+
+        cls.results[key] = result
+        return result
+
+    @classmethod
+    def is_visible(cls, index: int) -> bool:
+        """该索引的材质是否显示在当前过滤后的列表中"""
+        cls.ensure()
+        if not 0 <= index < len(cls.lower_names): return False
+        if not cls.last_filter: return True
+        return cls.last_filter.lower() in cls.lower_names[index]
+
+
+class MATHP_UL_replace_mat(bpy.types.UIList):
+    def draw_item(self, context, layout, data, item, icon, active_data, active_propname, index):
+        # 只为显示的条目加载预览
+        layout.label(text=item.name, icon_value=layout.icon(item))
+
+    def draw_filter(self, context, layout):
+        # 不支持反选和倒序，只显示搜索和按名称排序
+        row = layout.row(align=True)
+        row.prop(self, 'filter_name', text='')
+        row.prop(self, 'use_filter_sort_alpha', text='', icon='SORTALPHA')
+
+    def filter_items(self, context, data, propname):
+        return MaterialSearchIndex.filter(self.filter_name, self.bitflag_filter_item, self.use_filter_sort_alpha)
 
 
 class MATHP_OT_replace_mat(bpy.types.Operator):
     bl_label = "Replace Selected Material to..."
     bl_idname = "mathp.replace_mat"
-    bl_property = 'enum_mats'
     bl_options = {'REGISTER', 'UNDO'}
 
-    _enum_mats = []  # store
+    material: StringProperty(name='Material', description='Target material name, use the list if empty',
+                             options={'SKIP_SAVE'})
 
     @classmethod
     def poll(cls, context):
         return hasattr(context, 'selected_assets') and context.selected_assets
 
-    def get_mats(self, context) -> list:
-        enum_mats = MATHP_OT_replace_mat._enum_mats
-        enum_mats.clear()
-
-        for i, m in enumerate(bpy.data.materials):
-            enum_mats.append((m.name, m.name, '', m.preview.icon_id, i))
-        return enum_mats
-
-    enum_mats: EnumProperty(
-        name="Material",
-        items=get_mats,
-    )
-
     def invoke(self, context, event):
-        context.window_manager.invoke_search_popup(self)
-        return {'FINISHED'}
+        # 每次打开时清除选择，避免未选择时使用上次或第一个材质
+        context.window_manager.mathp_replace_mat_index = -1
+        MaterialSearchIndex.last_filter = ''
+        return context.window_manager.invoke_props_dialog(self, width=300)
+
+    def draw(self, context):
+        layout = self.layout
+        layout.template_list('MATHP_UL_replace_mat', '', bpy.data, 'materials',
+                             context.window_manager, 'mathp_replace_mat_index', rows=10)
 
     def execute(self, context):
         match_obj = get_local_selected_assets(context)
         selected_mat = [obj for obj in match_obj if isinstance(obj, bpy.types.Material)]
 
         if not selected_mat:
-            return self._return(msg='请选择一个本地材质资产', type='WARNING')
-        # print(selected_mat)
-        selected_mat[0].user_remap(bpy.data.materials[self.enum_mats])
+            self.report({'WARNING'}, '请选择一个本地材质资产')
+            return {'CANCELLED'}
+
+        if self.material:
+            target = bpy.data.materials.get(self.material)
+        else:
+            index = context.window_manager.mathp_replace_mat_index
+            if not MaterialSearchIndex.is_visible(index):
+                self.report({'WARNING'}, 'Please select a material from the list')
+                return {'CANCELLED'}
+            target = bpy.data.materials[index]
+
+        if target is None:
+            self.report({'WARNING'}, 'Material not found')
+            return {'CANCELLED'}
+
+        api.replace_materials({selected_mat[0]: target})
+
+        return {'FINISHED'}
+
+
+class MATHP_OT_batch_replace_mat(bpy.types.Operator):
+    """Replace many materials at once from the selection, a JSON/CSV file or name rules"""
+    bl_label = "Batch Replace Material"
+    bl_idname = "mathp.batch_replace_mat"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    source: EnumProperty(name='Source', items=[
+        ('SELECTION', 'Selection', 'Replace all selected material assets with the target material'),
+        ('FILE', 'File', 'JSON {"source": "target"} or CSV rows "source,target"'),
+        ('RULES', 'Name Rule', 'Regular expression on material names'),
+    ], default='RULES')
+
+    material: StringProperty(name='Target')
+    filepath: StringProperty(name='File', subtype='FILE_PATH')
+    pattern: StringProperty(name='Pattern', default=r'^(.*)\.\d{3}$')
+    replacement: StringProperty(name='Replacement', default=r'\1')
+
+    preview = []  # 用于对话框显示 [(原材质名, 新材质名, 使用者数量)]
+    preview_key = None
+
+    def get_mapping(self, context) -> dict:
+        if self.source == 'SELECTION':
+            target = bpy.data.materials.get(self.material)
+            if target is None or not hasattr(context, 'selected_assets'): return {}
+            match_obj = get_local_selected_assets(context)
+            return {obj: target for obj in match_obj if isinstance(obj, bpy.types.Material)}
+        elif self.source == 'FILE':
+            if not self.filepath: return {}
+            return api.mapping_from_file(self.filepath)
+        else:
+            if not self.pattern: return {}
+            return api.mapping_from_rules([(self.pattern, self.replacement)])
+
+    def update_preview(self, context):
+        key = (self.source, self.material, self.filepath, self.pattern, self.replacement)
+        if key == MATHP_OT_batch_replace_mat.preview_key: return
+
+        MATHP_OT_batch_replace_mat.preview_key = key
+        try:
+            mapping = self.get_mapping(context)
+            counts = api.mapping_user_counts(mapping)
+        except Exception as e:
+            print('Material Helper:', e)
+            mapping, counts = {}, {}
+        MATHP_OT_batch_replace_mat.preview = [(src.name, dst.name, counts[src]) for src, dst in mapping.items()
+                                              if src != dst]
+
+    def invoke(self, context, event):
+        MATHP_OT_batch_replace_mat.preview_key = None
+        return context.window_manager.invoke_props_dialog(self, width=400)
+
+    def draw(self, context):
+        layout = self.layout
+        layout.use_property_split = True
+        layout.prop(self, 'source')
+        if self.source == 'SELECTION':
+            layout.prop_search(self, 'material', bpy.data, 'materials')
+        elif self.source == 'FILE':
+            layout.prop(self, 'filepath')
+        else:
+            layout.prop(self, 'pattern')
+            layout.prop(self, 'replacement')
+
+        self.update_preview(context)
+        preview = MATHP_OT_batch_replace_mat.preview
+        col = layout.column(align=True)
+        col.label(text=f'Replace: {len(preview)}  Users: {sum(p[2] for p in preview)}', icon='MATERIAL')
+        for src, dst, users in preview[:10]:
+            col.label(text=f'{src} > {dst}  ({users})')
+        if len(preview) > 10:
+            col.label(text='...')
+
+    def execute(self, context):
+        try:
+            mapping = self.get_mapping(context)
+        except Exception as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+
+        count = api.replace_materials(mapping)
+        self.report({'INFO'}, f'{count} materials replaced')
 
         return {'FINISHED'}
 
 
 def register():
+    bpy.utils.register_class(MATHP_UL_replace_mat)
     bpy.utils.register_class(MATHP_OT_replace_mat)
+    bpy.utils.register_class(MATHP_OT_batch_replace_mat)
+    bpy.types.WindowManager.mathp_replace_mat_index = IntProperty(name='Material', default=-1)
 
 
 def unregister():
+    bpy.utils.unregister_class(MATHP_OT_batch_replace_mat)
     bpy.utils.unregister_class(MATHP_OT_replace_mat)
+    bpy.utils.unregister_class(MATHP_UL_replace_mat)
+    del bpy.types.WindowManager.mathp_replace_mat_index
@@ -1,5 +1,6 @@
 import bpy
 import os
+import time
 
 from bpy.types import Operator, Menu
 from bpy.props import StringProperty, BoolProperty, EnumProperty
@@ -7,12 +8,16 @@ from pathlib import Path
 from bpy_extras import asset_utils
 
 from .op_edit_material_asset import get_local_selected_assets, tag_redraw
-from .functions import ensure_current_file_asset_cats, C_TMP_ASSET_TAG, selectedAsset, _uuid
+from .functions import C_TMP_ASSET_TAG, selectedAsset
+from .asset_sync import TmpAssetSync
+from .preview_queue import draw_progress
+from .preview_farm import draw_progress as draw_farm_progress
+from .. import api
+from .handlers import HandlerDispatcher
+from .selection_sync import on_sync_toggle
+from .library_refresh import LibraryRefresh
 from bpy.utils import previews
 
-G_MATERIAL_COUNT = 0  # 材质数量，用于更新临时资产
-G_ACTIVE_MATS_LIST = []  # 选中材质列表
-
 
 class MATHP_OT_set_tmp_asset(Operator):
     bl_idname = "mathp.set_tmp_asset"
@@ -20,29 +25,13 @@ class MATHP_OT_set_tmp_asset(Operator):
     bl_options = {'INTERNAL'}
 
     def execute(self, context):
-        for mat in bpy.data.materials:
-            if mat.asset_data: continue
-            if mat.is_grease_pencil: continue
-            mat.asset_mark()
-            mat.asset_generate_preview()
-            mat.asset_data.tags.new(C_TMP_ASSET_TAG)
-
-        tag_redraw()
+        # 完整同步，重新处理所有材质
+        TmpAssetSync.sync(full=True)
 
         if bpy.data.filepath == '':
             return {'CANCELLED'}
 
-        ensure_current_file_asset_cats()
-
-        for mat in bpy.data.materials:
-            if mat.asset_data is None: continue
-            if C_TMP_ASSET_TAG in mat.asset_data.tags:
-                if mat.asset_data.catalog_id != _uuid:
-                    mat.asset_data.catalog_id = _uuid
-        try:
-            bpy.ops.asset.library_refresh()
-        except Exception as e:
-            print(e)
+        LibraryRefresh.request()
 
         return {'FINISHED'}
 
@@ -53,12 +42,9 @@ class MATHP_OT_clear_tmp_asset(Operator):
     bl_options = {'INTERNAL'}
 
     def execute(self, context):
-        for mat in bpy.data.materials:
-            if mat.asset_data is None: continue
-
-            if C_TMP_ASSET_TAG in mat.asset_data.tags:
-                mat.asset_clear()
+        api.clear_tmp_assets()
 
+        TmpAssetSync.reset()
         tag_redraw()
 
         return {'FINISHED'}
@@ -76,11 +62,8 @@ class MATHP_OT_set_true_asset(selectedAsset, Operator):
         match_obj = get_local_selected_assets(context)
         selected_mats = [obj for obj in match_obj if isinstance(obj, bpy.types.Material)]
 
-        for mat in selected_mats:
-            if C_TMP_ASSET_TAG in mat.asset_data.tags:
-                tag = mat.asset_data.tags[C_TMP_ASSET_TAG]
-                mat.asset_data.tags.remove(tag)
-                self.report({'INFO'}, '{} is set as True Asset'.format(mat.name))
+        for mat in api.apply_assets(selected_mats):
+            self.report({'INFO'}, '{} is set as True Asset'.format(mat.name))
 
         tag_redraw()
 
@@ -93,17 +76,24 @@ class MATHP_OT_delete_asset(selectedAsset, Operator):
     bl_label = 'Delete'
     bl_options = {'UNDO'}
 
+    remove_dependencies: BoolProperty(name='Remove Dependencies',
+                                      description='Also delete node groups and images only used by these materials',
+                                      default=False)
+
     def invoke(self, context, event):
-        return context.window_manager.invoke_confirm(self, event)
+        return context.window_manager.invoke_props_dialog(self)
 
     def execute(self, context):
         match_obj = get_local_selected_assets(context)
         selected_mats = [obj for obj in match_obj if isinstance(obj, bpy.types.Material)]
 
-        for mat in selected_mats:
-            bpy.data.materials.remove(mat)
+        start = time.perf_counter()
+        count, dep_count = api.delete_materials(selected_mats, self.remove_dependencies)
+
+        LibraryRefresh.request()
 
-        bpy.ops.asset.library_refresh()
+        self.report({'INFO'}, f'{count} materials, {dep_count} dependencies deleted '
+                              f'({time.perf_counter() - start:.2f}s)')
 
         return {'FINISHED'}
 
@@ -121,8 +111,7 @@ class MATHP_OT_duplicate_asset(selectedAsset, Operator):
         match_obj = get_local_selected_assets(context)
         selected_mats = [obj for obj in match_obj if isinstance(obj, bpy.types.Material)]
 
-        for mat in selected_mats:
-            mat.copy()
+        api.duplicate_materials(selected_mats)
 
         for mat in selected_mats:
             context.space_data.activate_asset_by_id(mat)
@@ -143,8 +132,8 @@ class MATHP_OT_refresh_asset_pv(selectedAsset, Operator):
         match_obj = get_local_selected_assets(context)
         selected_mats = [obj for obj in match_obj if isinstance(obj, bpy.types.Material)]
 
-        for mat in selected_mats:
-            mat.asset_generate_preview()
+        # 手动刷新时重新渲染，不使用缓存
+        api.generate_previews(selected_mats, restore=False)
 
         return {'FINISHED'}
 
@@ -266,8 +255,7 @@ class MATHP_OT_add_material(Operator):
         # 获取材质库已有材质名
         icon_dir = Path(__file__).parent.parent.joinpath('mat_lib')
         blend_file = icon_dir.joinpath('mat.blend')
-        with bpy.data.libraries.load(str(blend_file), link=False) as (data_from, data_to):
-            mats = data_from.materials
+        mats = api.library_material_names(str(blend_file), assets_only=False)
 
         # 根据材质库材质动态注册
         def dy_modal(_self, _context, _event):
@@ -286,12 +274,15 @@ class MATHP_OT_add_material(Operator):
             return {'PASS_THROUGH'}
 
         def dy_invoke(_self, _context, _event):
-            with bpy.data.libraries.load(_self.blend_file, link=False) as (data_from, data_to):
-                data_to.materials = [_self.material]
-
-            # 刷新资产库
-            bpy.ops.asset.library_refresh()
-            _self.material = data_to.materials[0]
+            # 已追加过的材质直接复用
+            loaded = api.load_library_assets(_self.blend_file, [_self.material], assets_only=False)
+            if not loaded:
+                return {'CANCELLED'}
+
+            # 刷新资产库，之后的modal需要激活新资产，立即刷新而不等待合并
+            LibraryRefresh.request()
+            LibraryRefresh.flush(_context)
+            _self.material = loaded[0]
             _self._timer = _context.window_manager.event_timer_add(0.01, window=_context.window)
             _context.window_manager.modal_handler_add(_self)
             return {"RUNNING_MODAL"}
@@ -343,6 +334,8 @@ class MATHP_MT_asset_browser_menu(Menu):
 
         layout.separator()
         layout.operator('mathp.clear_unused_material', icon='X')
+        layout.operator('mathp.dedupe_material', icon='DUPLICATE')
+        layout.operator('mathp.render_library_previews', icon='RENDER_STILL')
 
         layout.separator()
 
@@ -351,6 +344,7 @@ class MATHP_MT_asset_browser_menu(Menu):
         layout.operator('mathp.rename_asset')
         layout.operator_context = 'INVOKE_DEFAULT'
         layout.operator('mathp.replace_mat')
+        layout.operator('mathp.batch_replace_mat')
         layout.operator('mathp.delete_asset')
         layout.separator()
 
@@ -370,6 +364,8 @@ def draw_asset_browser(self, context):
     row.operator('mathp.edit_material_asset', icon='NODETREE')
     row.operator('mathp.replace_mat', icon='CON_TRANSLIKE')
     row.operator('mathp.clear_unused_material', icon='NODE_MATERIAL')
+    draw_progress(row)
+    draw_farm_progress(row)
 
 
 def draw_context_menu(self, context):
@@ -385,74 +381,20 @@ def draw_context_menu(self, context):
     layout.separator()
 
 
-from bpy.app.handlers import persistent
-
-
-@persistent
-def update_tmp_asset(scene, depsgraph):
+def update_tmp_asset(scene):
     if scene.mathp_update_mat is False: return
-
-    global G_MATERIAL_COUNT
-    old_value = G_MATERIAL_COUNT
-
-    if len(bpy.data.materials) != old_value:
-        G_MATERIAL_COUNT = len(bpy.data.materials)
-        bpy.ops.mathp.set_tmp_asset()
-
-
-@persistent
-def update_active_object_material(scene, depsgraph):
-    wm = bpy.context.window_manager
-    if scene.mathp_update_mat is False:
-        return
-    elif wm.mathp_update_active_obj_mats is False:
-        return
-    elif not hasattr(bpy.context, 'object'):
-        return
-    elif bpy.context.object is None:
-        return
-    elif bpy.context.object.type not in {'MESH', 'CURVE', 'FONT', 'META', 'VOLUME', 'GPENCIL', 'SURFACE'}:
-        return
-    elif len(bpy.context.object.material_slots) == 0:
-        return
-    # 获取面板
-    asset_area = None
-    for area in bpy.context.window.screen.areas:
-        if area.type == 'FILE_BROWSER' and area.ui_type == 'ASSETS':
-            asset_area = area
-            break
-
-    if asset_area is None: return
-
-    # 获取材质
-    global G_ACTIVE_MATS_LIST
-    G_ACTIVE_MATS_LIST.clear()
-
-    for mat_slot in bpy.context.object.material_slots:
-        G_ACTIVE_MATS_LIST.append(mat_slot.material)
-
-    G_ACTIVE_MATS_LIST.reverse()
-
-    try:
-        asset_area.spaces[0].deselect_all()  # window上有bug
-        # 激活材质
-        space_data = asset_area.spaces[0]
-        assert asset_utils.SpaceAssetInfo.is_asset_browser(space_data)
-
-        if bpy.context.object.select_get():
-            for mat in G_ACTIVE_MATS_LIST:
-                space_data.activate_asset_by_id(mat, deferred=False)
-
-
-    except Exception as e:
-        print(e)
+    # 只处理新增材质
+    if TmpAssetSync.sync() == 0: return
+    LibraryRefresh.request()
 
 
 def update_user_control(self, context):
     if context.scene.mathp_update_mat is True:
-        bpy.ops.mathp.set_tmp_asset()
+        TmpAssetSync.sync(full=True)
     else:
-        bpy.ops.mathp.clear_tmp_asset()
+        api.clear_tmp_assets()
+        TmpAssetSync.reset()
+    tag_redraw()
 
 
 def remove_all_tmp_tags():
@@ -497,10 +439,12 @@ def register():
                                                     update=update_user_control)
     bpy.types.WindowManager.mathp_update_active_obj_mats = BoolProperty(name='Object / Material Select Sync',
                                                                         description="If checked, the active object's materials will be automatically selected",
-                                                                        default=False)
+                                                                        default=False,
+                                                                        update=on_sync_toggle)
     # handle
-    bpy.app.handlers.depsgraph_update_post.append(update_tmp_asset)
-    bpy.app.handlers.depsgraph_update_pre.append(update_active_object_material)
+    # 新建、复制、追加材质都会标记MATERIAL类型，同数量替换也会产生新材质；
+    # 追加/链接物体时一并带入的材质额外由OBJECT类型覆盖
+    HandlerDispatcher.add('tmp_asset', update_tmp_asset, {'MATERIAL', 'OBJECT'})
     # ui
     bpy.utils.register_class(MATHP_MT_asset_browser_menu)
     bpy.types.ASSETBROWSER_MT_editor_menus.append(draw_asset_browser)
@@ -520,8 +464,7 @@ def unregister():
     remove_all_tmp_tags()
     unregister_icon()
     # handle
-    bpy.app.handlers.depsgraph_update_post.remove(update_tmp_asset)
-    bpy.app.handlers.depsgraph_update_pre.remove(update_active_object_material)
+    HandlerDispatcher.remove('tmp_asset')
     del bpy.types.Scene.mathp_update_mat
     # ui
     bpy.utils.unregister_class(MATHP_MT_asset_browser_menu)
@@ -0,0 +1,225 @@
+import bpy
+import os
+import time
+import zlib
+import struct
+from array import array
+from pathlib import Path
+from typing import Optional
+
+from ..prefs.get_pref import get_pref
+
+_HEADER = struct.Struct('<4sII')  # magic, width, height
+_MAGIC = b'MHPV'
+
+
+def default_cache_dir() -> Path:
+    return Path(bpy.utils.user_resource('DATAFILES', path='material_helper_preview_cache'))
+
+
+def read_preview_pixels(mat: bpy.types.Material) -> Optional[tuple[int, int, array]]:
+    """读取材质预览像素
+
+    :param mat: bpy.types.Material
+    :return: (width, height, pixels) 或 None
+    """
+    preview = mat.preview
+    if preview is None: return None
+    width, height = preview.image_size
+    if width == 0 or height == 0: return None
+
+    pixels = array('f', bytes(width * height * 4 * 4))
+    preview.image_pixels_float.foreach_get(pixels)
+    return width, height, pixels
+
+
+def preview_checksum(mat: bpy.types.Material) -> int:
+    """预览像素校验值，用于判断后台渲染是否已完成"""
+    result = read_preview_pixels(mat)
+    if result is None: return 0
+    return zlib.crc32(result[2].tobytes())
+
+
+class PreviewCache:
+    """以材质指纹为键的磁盘预览缓存，超出容量时按最近使用淘汰"""
+    index: Optional[dict[str, list]] = None  # fingerprint: [size, last_use]
+    size: int = 0  # 当前缓存总大小 byte
+    cache_dir: Optional[Path] = None
+
+    hits: int = 0
+    misses: int = 0
+
+    @classmethod
+    def get_dir(cls) -> Path:
+        pref_dir = get_pref().preview_cache_dir
+        cache_dir = Path(bpy.path.abspath(pref_dir)) if pref_dir else default_cache_dir()
+
+        if cache_dir != cls.cache_dir:
+            cls.cache_dir = cache_dir
+            cls.index = None
+
+        return cache_dir
+
+    @classmethod
+    def max_size(cls) -> int:
+        return get_pref().preview_cache_size * 1024 * 1024
+
+    @classmethod
+    def ensure_index(cls) -> dict[str, list]:
+        """首次使用时扫描缓存目录建立索引"""
+        cache_dir = cls.get_dir()
+        if cls.index is not None: return cls.index
+
+        cls.index = {}
+        cls.size = 0
+        if not cache_dir.exists(): return cls.index
+
+        for entry in os.scandir(cache_dir):
+            if not entry.name.endswith('.pv'): continue
+            stat = entry.stat()
+            cls.index[entry.name[:-3]] = [stat.st_size, stat.st_mtime]
+            cls.size += stat.st_size
+
+        return cls.index
+
+    @classmethod
+    def file_path(cls, fingerprint: str) -> Path:
+        return cls.get_dir().joinpath(fingerprint + '.pv')
+
+    @classmethod
+    def restore(cls, mat: bpy.types.Material, fingerprint: str) -> bool:
+        """从缓存恢复材质预览
+
+        :param mat: bpy.types.Material
+        :param fingerprint: material_fingerprint
+        :return: 是否命中
+        """
+        index = cls.ensure_index()
+        if fingerprint not in index:
+            cls.misses += 1
+            return False
+
+        path = cls.file_path(fingerprint)
+        try:
+            with open(path, 'rb') as f:
+                magic, width, height = _HEADER.unpack(f.read(_HEADER.size))
+                pixels = array('f')
+                pixels.frombytes(zlib.decompress(f.read()))
+            if magic != _MAGIC or len(pixels) != width * height * 4:
+                raise ValueError('Invalid preview cache')
+
+            preview = mat.preview_ensure()
+            preview.image_size = (width, height)
+            preview.image_pixels_float.foreach_set(pixels)
+        except (OSError, ValueError, zlib.error, struct.error):
+            cls.discard(fingerprint)
+            cls.misses += 1
+            return False
+
+        # 更新最近使用时间
+        now = time.time()
+        index[fingerprint][1] = now
+        try:
+            os.utime(path, (now, now))
+        except OSError:
+            pass
+
+        cls.hits += 1
+        return True
+
+    @classmethod
+    def store(cls, mat: bpy.types.Material, fingerprint: str, old_checksum: Optional[int] = None) -> bool:
+        """写入材质预览
+
+        :param mat: bpy.types.Material
+        :param fingerprint: material_fingerprint
+        :param old_checksum: 请求渲染前的预览校验值，像素未变化时视为未完成渲染
+        :return: 是否写入
+        """
+        result = read_preview_pixels(mat)
+        if result is None: return False
+        width, height, pixels = result
+
+        if not any(pixels[3::4]): return False  # 预览未完成渲染
+        if old_checksum is not None and zlib.crc32(pixels.tobytes()) == old_checksum: return False
+
+        index = cls.ensure_index()
+        cache_dir = cls.get_dir()
+        data = _HEADER.pack(_MAGIC, width, height) + zlib.compress(pixels.tobytes(), 1)
+
+        try:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = cache_dir.joinpath(fingerprint + '.tmp')
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, cls.file_path(fingerprint))
+        except OSError as e:
+            print('Material Helper: Write preview cache failed', e)
+            return False
+
+        if fingerprint in index:
+            cls.size -= index[fingerprint][0]
+        index[fingerprint] = [len(data), time.time()]
+        cls.size += len(data)
+
+        cls.evict()
+        return True
+
+    @classmethod
+    def discard(cls, fingerprint: str):
+        index = cls.ensure_index()
+        if fingerprint in index:
+            cls.size -= index.pop(fingerprint)[0]
+        try:
+            cls.file_path(fingerprint).unlink()
+        except OSError:
+            pass
+
+    @classmethod
+    def evict(cls):
+        """超出容量时删除最久未使用的缓存"""
+        max_size = cls.max_size()
+        if cls.size <= max_size: return
+
+        for fingerprint, _ in sorted(cls.index.items(), key=lambda item: item[1][1]):
+            if cls.size <= max_size * 0.9: break  # 留出余量，避免频繁淘汰
+            cls.discard(fingerprint)
+
+    @classmethod
+    def clear(cls):
+        for fingerprint in list(cls.ensure_index()):
+            cls.discard(fingerprint)
+        cls.hits = 0
+        cls.misses = 0
+
+
+class MATHP_OT_clear_preview_cache(bpy.types.Operator):
+    """Remove all cached material previews from disk"""
+    bl_idname = 'mathp.clear_preview_cache'
+    bl_label = 'Clear Preview Cache'
+
+    def invoke(self, context, event):
+        return context.window_manager.invoke_confirm(self, event)
+
+    def execute(self, context):
+        PreviewCache.clear()
+        return {'FINISHED'}
+
+
+def draw_cache_stats(layout):
+    cache = PreviewCache
+    cache.ensure_index()
+    total = cache.hits + cache.misses
+    rate = cache.hits / total * 100 if total else 0
+
+    col = layout.column(align=True)
+    col.label(text=f'Hits: {cache.hits}  Misses: {cache.misses}  ({rate:.0f}%)')
+    col.label(text=f'Cached: {len(cache.index)}  ({cache.size / 1024 / 1024:.1f} MB)')
+
+
+def register():
+    bpy.utils.register_class(MATHP_OT_clear_preview_cache)
+
+
+def unregister():
+    bpy.utils.unregister_class(MATHP_OT_clear_preview_cache)
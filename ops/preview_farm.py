@@ -0,0 +1,447 @@
+import bpy
+import os
+import re
+import json
+import time
+import zlib
+import queue
+import threading
+import subprocess
+from pathlib import Path
+from typing import Optional
+
+from bpy.props import StringProperty, IntProperty, BoolProperty
+
+from .preview_farm_worker import RESULT_PREFIX, apply_previews
+from .op_edit_material_asset import SHADER_BALL_TYPES, tag_redraw
+from ..prefs.get_pref import get_pref
+
+WORKER_SCRIPT = Path(__file__).with_name('preview_farm_worker.py')
+SHADER_BALL_FILE = Path(__file__).parent.parent.joinpath('shader_ball_lib', 'shader_ball.blend')
+LOG_FILENAME = 'render_times.json'
+
+
+def png_name(name: str) -> str:
+    """材质名转为文件名，附加校验值避免不同材质清理后重名"""
+    safe = re.sub(r'[^\w\-. ]', '_', name)
+    return f'{safe}_{zlib.crc32(name.encode()):08x}.png'
+
+
+def library_materials(filepath: str) -> list[str]:
+    """读取库文件中的材质名，不加载数据"""
+    with bpy.data.libraries.load(filepath) as (data_from, data_to):
+        return list(data_from.materials)
+
+
+class FarmWorker:
+    """一个后台blender进程，渲染一组材质"""
+
+    def __init__(self, mode: str, library: str, job: dict, job_file: Path, threads: int = 1):
+        self.materials = list(job.get('materials', ()))
+        self.job_file = job_file
+        self.results = queue.Queue()
+
+        job_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(job_file, 'w', encoding='utf-8') as f:
+            json.dump(job, f)
+
+        cmd = [bpy.app.binary_path, '-b', library, '--factory-startup', '-t', str(threads),
+               '--python', str(WORKER_SCRIPT), '--', mode, str(job_file)]
+        self.proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+                                     encoding='utf-8', errors='replace')
+        # 读取输出的线程，结果在主线程中处理
+        self.reader = threading.Thread(target=self.read_output, daemon=True)
+        self.reader.start()
+
+    def read_output(self):
+        for line in self.proc.stdout:
+            if line.startswith(RESULT_PREFIX):
+                self.results.put(json.loads(line[len(RESULT_PREFIX):]))
+
+    def poll_results(self) -> list[dict]:
+        results = []
+        while not self.results.empty():
+            results.append(self.results.get_nowait())
+        return results
+
+    def finished(self) -> bool:
+        return self.proc.poll() is not None
+
+    def terminate(self):
+        if not self.finished():
+            self.proc.terminate()
+        self.job_file.unlink(missing_ok=True)
+
+
+class PreviewFarm:
+    """将库文件中的材质分配给多个后台进程用Cycles渲染预览
+
+    渲染结果保存为PNG，渲染记录中保存材质指纹，指纹未变化且PNG存在的材质将被跳过，中断后可继续渲染。
+    保存库文件不改变指纹，写入预览后不会导致重新渲染。
+    """
+    library: Optional[str] = None
+    output_dir: Optional[Path] = None
+    settings: dict = {}
+    workers: int = 1
+    threads: int = 1
+    chunk_size: int = 1
+    write_previews: bool = False
+    overwrite: bool = False
+
+    scanning: Optional[FarmWorker] = None  # 读取指纹的进程，完成后才分配渲染
+    pending: list[str] = []
+    running: list[FarmWorker] = []
+    applying: Optional[FarmWorker] = None
+    log: dict[str, dict] = {}  # 材质名: {file, time, fingerprint, applied}
+    fingerprints: dict[str, str] = {}  # 库文件中材质的当前指纹
+    rendered: list[str] = []  # 本次渲染的材质
+    applying_names: list[str] = []
+    failed: dict[str, str] = {}
+
+    total: int = 0
+    done: int = 0
+    start_time: float = 0
+    interval: float = 0.25
+    job_count: int = 0
+
+    @classmethod
+    def is_running(cls) -> bool:
+        return bool(cls.scanning or cls.pending or cls.running or cls.applying)
+
+    @classmethod
+    def start(cls, library: str, output_dir: Path, resolution: int = 256, samples: int = 64, workers: int = 0,
+              write_previews: bool = False, overwrite: bool = False) -> int:
+        """开始渲染，先由后台进程读取材质指纹，再分配渲染
+
+        :param library: 库文件路径
+        :param output_dir: PNG输出目录
+        :param resolution: 分辨率
+        :param samples: 采样数
+        :param workers: 进程数，0为按核心数自动设置
+        :param write_previews: 完成后将PNG写入资产预览，外部库文件会被保存
+        :param overwrite: 忽略已渲染的PNG
+        :return: 库文件中的材质数量
+        """
+        if cls.is_running():
+            raise RuntimeError('Preview farm is already running')
+
+        cores = os.cpu_count() or 1
+        cls.workers = workers if workers > 0 else max(1, cores // 4)
+        cls.threads = max(1, cores // cls.workers)
+
+        cls.library = library
+        cls.output_dir = output_dir
+        cls.write_previews = write_previews
+        cls.overwrite = overwrite
+        cls.settings = {
+            'resolution': resolution,
+            'samples': samples,
+            'threads': cls.threads,
+            'output_dir': str(output_dir),
+            'shader_ball_file': str(SHADER_BALL_FILE),
+            'shader_ball': get_pref().shader_ball,
+            'ball_types': list(SHADER_BALL_TYPES),
+        }
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        cls.log = cls.load_log()
+        cls.fingerprints = {}
+        cls.pending = []
+        cls.rendered = []
+        cls.failed = {}
+        cls.total = cls.done = 0
+        cls.start_time = time.perf_counter()
+
+        # 读取指纹作为第一个任务在计时器中完成，不阻塞界面
+        names = library_materials(library)
+        if names:
+            cls.scanning = cls.spawn('fingerprint', names, cls.threads)
+
+        if not bpy.app.timers.is_registered(farm_timer):
+            bpy.app.timers.register(farm_timer, first_interval=0)
+        return len(names)
+
+    @classmethod
+    def read_fingerprints(cls) -> bool:
+        """收集读取指纹进程的结果，完成后生成待渲染列表
+
+        :return: 是否完成
+        """
+        worker = cls.scanning
+        for result in worker.poll_results():
+            if 'fingerprint' in result:
+                cls.fingerprints[result['material']] = result['fingerprint']
+        if not worker.finished(): return False
+
+        # 无法读取的材质不包含在内
+        worker.reader.join(timeout=1)
+        for result in worker.poll_results():
+            if 'fingerprint' in result:
+                cls.fingerprints[result['material']] = result['fingerprint']
+        worker.terminate()
+        cls.scanning = None
+
+        cls.pending = [name for name, fingerprint in cls.fingerprints.items()
+                       if cls.overwrite or not cls.is_up_to_date(name, fingerprint)]
+        cls.total = len(cls.pending)
+        # 小块分配，渲染时间差异较大时各进程负载更平均
+        cls.chunk_size = max(1, min(8, -(-cls.total // (cls.workers * 2))))
+
+        print(f'Material Helper: Render {cls.total} previews with {cls.workers} workers x {cls.threads} threads '
+              f'({time.perf_counter() - cls.start_time:.2f}s to read fingerprints)')
+        tag_redraw()
+        return True
+
+    @classmethod
+    def is_up_to_date(cls, name: str, fingerprint: str) -> bool:
+        entry = cls.log.get(name)
+        if entry is None or entry.get('fingerprint') != fingerprint: return False
+        return cls.output_dir.joinpath(entry['file']).exists()
+
+    @classmethod
+    def to_apply(cls) -> list[str]:
+        """已渲染且未写入预览的材质，包括之前中断的渲染"""
+        return [name for name, fingerprint in cls.fingerprints.items()
+                if cls.is_up_to_date(name, fingerprint) and not cls.log[name].get('applied')]
+
+    @classmethod
+    def load_log(cls) -> dict:
+        path = cls.output_dir.joinpath(LOG_FILENAME)
+        if not path.exists(): return {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @classmethod
+    def save_log(cls):
+        path = cls.output_dir.joinpath(LOG_FILENAME)
+        tmp = path.with_suffix('.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(cls.log, f, indent=1, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    @classmethod
+    def spawn(cls, mode: str, materials: list[str], threads: int) -> FarmWorker:
+        cls.job_count += 1
+        job = dict(cls.settings, materials=materials, files={name: png_name(name) for name in materials})
+        job_file = cls.output_dir.joinpath('.jobs', f'{os.getpid()}_{cls.job_count}.json')
+        return FarmWorker(mode, cls.library, job, job_file, threads)
+
+    @classmethod
+    def handle_result(cls, result: dict):
+        name = result.get('material')
+        if name is None: return
+
+        cls.done += 1
+        if 'error' in result:
+            cls.failed[name] = result['error']
+            print(f'Material Helper: Render {name} failed, {result["error"]}')
+            return
+
+        cls.rendered.append(name)
+        cls.log[name] = {'file': png_name(name), 'time': round(result['time'], 3),
+                         'fingerprint': cls.fingerprints.get(name), 'applied': False}
+        print(f'Material Helper: Rendered {name} in {result["time"]:.2f}s ({cls.done}/{cls.total})')
+
+    @classmethod
+    def tick(cls):
+        if cls.scanning and not cls.read_fingerprints():
+            return cls.interval
+
+        changed = False
+        for worker in cls.running[:]:
+            for result in worker.poll_results():
+                cls.handle_result(result)
+                changed = True
+            if worker.finished():
+                # 进程退出后读取剩余结果，未返回结果的材质视为失败
+                worker.reader.join(timeout=1)
+                for result in worker.poll_results():
+                    cls.handle_result(result)
+                    changed = True
+                for name in worker.materials:
+                    if name not in cls.rendered and name not in cls.failed:
+                        cls.handle_result({'material': name, 'error': 'worker exited'})
+                worker.terminate()
+                cls.running.remove(worker)
+
+        while cls.pending and len(cls.running) < cls.workers:
+            chunk, cls.pending = cls.pending[:cls.chunk_size], cls.pending[cls.chunk_size:]
+            cls.running.append(cls.spawn('render', chunk, cls.threads))
+
+        if changed:
+            cls.save_log()
+            tag_redraw()
+
+        if cls.running or cls.pending:
+            return cls.interval
+
+        if cls.applying:
+            if not cls.applying.finished(): return cls.interval
+            cls.applying.reader.join(timeout=1)
+            if any('applied' in result for result in cls.applying.poll_results()):
+                cls.mark_applied()
+            cls.applying.terminate()
+            cls.applying = None
+        elif cls.write_previews and cls.to_apply():
+            cls.apply()
+            if cls.applying: return cls.interval
+
+        cls.finish()
+        return None
+
+    @classmethod
+    def apply(cls):
+        """写入资产预览，当前文件直接写入，外部库文件由后台进程写入并保存"""
+        cls.applying_names = cls.to_apply()
+        if cls.library == bpy.data.filepath:
+            apply_previews({name: png_name(name) for name in cls.applying_names}, cls.output_dir)
+            cls.mark_applied()
+            tag_redraw()
+        else:
+            cls.applying = cls.spawn('apply', cls.applying_names, 1)
+
+    @classmethod
+    def mark_applied(cls):
+        for name in cls.applying_names:
+            cls.log[name]['applied'] = True
+        cls.applying_names = []
+        cls.save_log()
+
+    @classmethod
+    def finish(cls):
+        elapsed = time.perf_counter() - cls.start_time
+        print(f'Material Helper: Rendered {len(cls.rendered)} previews in {elapsed:.2f}s, '
+              f'{len(cls.failed)} failed')
+        slowest = sorted(cls.rendered, key=lambda name: cls.log[name]['time'], reverse=True)
+        for name in slowest[:10]:
+            print(f'Material Helper:   {cls.log[name]["time"]:.2f}s  {name}')
+        cls.total = cls.done = 0
+        tag_redraw()
+
+    @classmethod
+    def wait(cls):
+        """后台模式下阻塞直到完成"""
+        while cls.is_running():
+            interval = cls.tick()
+            if interval is None: break
+            time.sleep(interval)
+        if bpy.app.timers.is_registered(farm_timer):
+            bpy.app.timers.unregister(farm_timer)
+
+    @classmethod
+    def cancel(cls):
+        if cls.scanning:
+            cls.scanning.terminate()
+            cls.scanning = None
+        for worker in cls.running:
+            worker.terminate()
+        if cls.applying:
+            cls.applying.terminate()
+        cls.running = []
+        cls.pending = []
+        cls.applying = None
+        # 取消后不写入预览，已渲染的PNG保留在记录中，下次继续
+        cls.rendered = []
+        cls.applying_names = []
+        cls.total = cls.done = 0
+        if cls.output_dir:
+            cls.save_log()
+        if bpy.app.timers.is_registered(farm_timer):
+            bpy.app.timers.unregister(farm_timer)
+
+
+def farm_timer():
+    # 计时器以函数对象识别，不能使用每次访问都不同的绑定方法
+    return PreviewFarm.tick()
+
+
+def default_output_dir(library: str) -> Path:
+    library = Path(library)
+    return library.parent.joinpath(f'{library.stem}_previews')
+
+
+class MATHP_OT_render_library_previews(bpy.types.Operator):
+    """Render material previews with Cycles in background Blender processes"""
+    bl_idname = 'mathp.render_library_previews'
+    bl_label = 'Render Library Previews'
+
+    filepath: StringProperty(name='Library', subtype='FILE_PATH',
+                             description='Blend file to render, use the current file if empty')
+    directory: StringProperty(name='Output', subtype='DIR_PATH',
+                              description='Folder of the rendered PNG files, next to the library if empty')
+    resolution: IntProperty(name='Resolution', default=256, min=32, soft_max=1024)
+    samples: IntProperty(name='Samples', default=64, min=1, soft_max=1024)
+    workers: IntProperty(name='Workers', default=0, min=0, soft_max=32,
+                         description='Number of background processes, 0 to use the core count')
+    write_previews: BoolProperty(name='Write Asset Previews',
+                                 description='Write the PNGs into the asset previews, an external library is saved',
+                                 default=False)
+    overwrite: BoolProperty(name='Overwrite', description='Render again even if the PNG is up to date',
+                            default=False)
+
+    @classmethod
+    def poll(cls, context):
+        return not PreviewFarm.is_running()
+
+    def invoke(self, context, event):
+        return context.window_manager.invoke_props_dialog(self, width=400)
+
+    def draw(self, context):
+        layout = self.layout
+        layout.use_property_split = True
+        for prop in ('filepath', 'directory', 'resolution', 'samples', 'workers', 'write_previews', 'overwrite'):
+            layout.prop(self, prop)
+
+    def execute(self, context):
+        library = bpy.path.abspath(self.filepath) if self.filepath else bpy.data.filepath
+        if not library or not os.path.exists(library):
+            self.report({'ERROR'}, 'Please save the file or choose a library')
+            return {'CANCELLED'}
+        if library == bpy.data.filepath and bpy.data.is_dirty:
+            self.report({'WARNING'}, 'Unsaved changes are not rendered')
+
+        output_dir = Path(bpy.path.abspath(self.directory)) if self.directory else default_output_dir(library)
+        count = PreviewFarm.start(library, output_dir, self.resolution, self.samples, self.workers,
+                                  self.write_previews, self.overwrite)
+        self.report({'INFO'}, f'{count} materials to check')
+        return {'FINISHED'}
+
+
+class MATHP_OT_cancel_library_previews(bpy.types.Operator):
+    """Stop rendering without writing previews, finished PNGs are kept and applied next time"""
+    bl_idname = 'mathp.cancel_library_previews'
+    bl_label = 'Cancel Render'
+
+    @classmethod
+    def poll(cls, context):
+        return PreviewFarm.is_running()
+
+    def execute(self, context):
+        PreviewFarm.cancel()
+        return {'FINISHED'}
+
+
+def draw_progress(layout):
+    """在资产浏览器头部绘制渲染进度"""
+    if not PreviewFarm.is_running(): return
+
+    if PreviewFarm.scanning:
+        layout.label(text='Reading Materials', icon='RENDER_STILL')
+        layout.operator(MATHP_OT_cancel_library_previews.bl_idname, text='', icon='X')
+        return
+    layout.label(text=f'Render {PreviewFarm.done}/{PreviewFarm.total}', icon='RENDER_STILL')
+    layout.operator(MATHP_OT_cancel_library_previews.bl_idname, text='', icon='X')
+
+
+def register():
+    bpy.utils.register_class(MATHP_OT_render_library_previews)
+    bpy.utils.register_class(MATHP_OT_cancel_library_previews)
+
+
+def unregister():
+    PreviewFarm.cancel()
+    bpy.utils.unregister_class(MATHP_OT_render_library_previews)
+    bpy.utils.unregister_class(MATHP_OT_cancel_library_previews)
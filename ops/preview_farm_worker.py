@@ -0,0 +1,213 @@
+"""材质预览渲染进程
+
+由 preview_farm 以后台模式启动，不依赖插件本身::
+
+    blender -b library.blend --factory-startup --python preview_farm_worker.py -- render job.json
+    blender -b library.blend --factory-startup --python preview_farm_worker.py -- apply job.json
+
+fingerprint: 输出每个材质的指纹，包含材质球类型和渲染设置，用于跳过未变化的材质
+render: 在材质球上用Cycles CPU渲染任务中的材质，每完成一个输出一行 MATHP_RESULT {json}
+apply: 将渲染好的PNG写入材质的资产预览并保存文件
+"""
+
+import bpy
+import sys
+import json
+import math
+import time
+from pathlib import Path
+
+RESULT_PREFIX = 'MATHP_RESULT '
+
+
+def load_job() -> tuple[str, dict]:
+    argv = sys.argv[sys.argv.index('--') + 1:]
+    mode, job_file = argv[0], argv[1]
+    with open(job_file, 'r', encoding='utf-8') as f:
+        return mode, json.load(f)
+
+
+def report(**kwargs):
+    print(RESULT_PREFIX + json.dumps(kwargs), flush=True)
+
+
+def setup_scene(job: dict) -> bpy.types.Scene:
+    scene = bpy.data.scenes.new('mathp_preview_farm')
+
+    scene.render.engine = 'CYCLES'
+    scene.cycles.device = 'CPU'
+    scene.cycles.samples = job['samples']
+    scene.cycles.use_denoising = True
+    scene.render.resolution_x = scene.render.resolution_y = job['resolution']
+    scene.render.resolution_percentage = 100
+    scene.render.film_transparent = True
+    scene.render.threads_mode = 'FIXED'
+    scene.render.threads = job['threads']
+    scene.render.image_settings.file_format = 'PNG'
+    scene.render.image_settings.color_mode = 'RGBA'
+
+    world = bpy.data.worlds.new('mathp_preview_farm')
+    world.color = (0.5, 0.5, 0.5)
+    scene.world = world
+
+    light = bpy.data.objects.new('mathp_light', bpy.data.lights.new('mathp_light', 'SUN'))
+    light.data.energy = 3
+    light.rotation_euler = (math.radians(45), 0, math.radians(45))
+    scene.collection.objects.link(light)
+
+    cam = bpy.data.objects.new('mathp_camera', bpy.data.cameras.new('mathp_camera'))
+    scene.collection.objects.link(cam)
+    scene.camera = cam
+
+    return scene
+
+
+def resolve_ball_types(job: dict) -> dict[str, str]:
+    """材质名: 材质球类型，未指定类型时读取材质上保存的 mathp_preview_render_type"""
+    targets = {}
+    for name in job['materials']:
+        mat = bpy.data.materials.get(name)
+        if mat is None:
+            report(material=name, error='not found')
+            continue
+
+        ball_type = job['shader_ball']
+        if ball_type == 'NONE':
+            # 未加载插件时枚举属性以序号保存
+            index = mat.get('mathp_preview_render_type', job['ball_types'].index('SPHERE'))
+            ball_type = job['ball_types'][index] if 0 <= index < len(job['ball_types']) else 'SPHERE'
+        targets[name] = ball_type
+
+    return targets
+
+
+def load_shader_balls(job: dict, scene: bpy.types.Scene, ball_types: set[str]) -> dict[str, bpy.types.Object]:
+    """加载需要的材质球，文件中不存在时使用球体"""
+    balls = {}
+
+    blend_file = Path(job['shader_ball_file'])
+    if blend_file.exists():
+        with bpy.data.libraries.load(str(blend_file), link=False) as (data_from, data_to):
+            names = [name for name in data_from.objects if name in ball_types]
+            data_to.objects = names
+        for name, obj in zip(names, data_to.objects):
+            if obj is None or obj.data is None: continue
+            if obj.type == 'MESH':
+                obj.data.shade_smooth()
+            if not obj.material_slots:
+                obj.data.materials.append(None)
+            obj.material_slots[0].link = 'OBJECT'
+            balls[name] = obj
+
+    fallback = None
+    for ball_type in ball_types:
+        if ball_type in balls: continue
+        if fallback is None:
+            bpy.ops.mesh.primitive_uv_sphere_add(segments=64, ring_count=32)
+            fallback = bpy.context.object
+            fallback.data.shade_smooth()
+            fallback.data.materials.append(None)
+            fallback.material_slots[0].link = 'OBJECT'
+            for coll in fallback.users_collection:
+                coll.objects.unlink(fallback)
+        balls[ball_type] = fallback
+
+    for obj in set(balls.values()):
+        obj.location = (0, 0, 0)
+        obj.hide_render = True
+        scene.collection.objects.link(obj)
+
+    return balls
+
+
+def frame_camera(cam: bpy.types.Object, obj: bpy.types.Object):
+    """相机斜向对准物体，距离按物体尺寸计算"""
+    size = max(max(obj.dimensions), 0.01)
+    distance = size / (2 * math.tan(cam.data.angle / 2)) * 1.4 + size / 2
+    pitch, yaw = math.radians(70), math.radians(0)
+    cam.location = (distance * math.sin(pitch) * math.sin(yaw),
+                    -distance * math.sin(pitch) * math.cos(yaw),
+                    distance * math.cos(pitch))
+    cam.rotation_euler = (pitch, 0, yaw)
+
+
+def render(job: dict):
+    targets = resolve_ball_types(job)
+    scene = setup_scene(job)
+    balls = load_shader_balls(job, scene, set(targets.values()))
+    output_dir = Path(job['output_dir'])
+
+    for name, ball_type in targets.items():
+        mat = bpy.data.materials[name]
+        obj = balls[ball_type]
+        for other in balls.values():
+            other.hide_render = other is not obj
+        obj.material_slots[0].material = mat
+        frame_camera(scene.camera, obj)
+
+        filepath = output_dir.joinpath(job['files'][name])
+        scene.render.filepath = str(filepath)
+
+        start = time.perf_counter()
+        try:
+            bpy.ops.render.render(write_still=True, scene=scene.name)
+        except Exception as e:
+            report(material=name, error=str(e))
+            continue
+
+        report(material=name, file=str(filepath), time=time.perf_counter() - start)
+
+
+def fingerprints(job: dict):
+    # material_hash只依赖bpy，可直接从插件目录导入
+    sys.path.insert(0, str(Path(__file__).parent))
+    from material_hash import material_fingerprint
+
+    tree_hashes = {}
+    for name, ball_type in resolve_ball_types(job).items():
+        fingerprint = material_fingerprint(bpy.data.materials[name], tree_hashes)
+        report(material=name, fingerprint=f'{fingerprint}:{ball_type}:{job["resolution"]}:{job["samples"]}')
+
+
+def apply_previews(files: dict[str, str], output_dir: Path) -> int:
+    """PNG写入资产预览
+
+    :param files: {材质名: PNG文件名}
+    :param output_dir: PNG目录
+    :return: 写入数量
+    """
+    count = 0
+    for name, file in files.items():
+        mat = bpy.data.materials.get(name)
+        path = output_dir.joinpath(file)
+        if mat is None or mat.library is not None or not path.exists(): continue
+
+        image = bpy.data.images.load(str(path))
+        width, height = image.size
+        pixels = [0.0] * (width * height * 4)
+        image.pixels.foreach_get(pixels)
+        bpy.data.images.remove(image)
+
+        preview = mat.preview_ensure()
+        preview.image_size = (width, height)
+        preview.image_pixels_float.foreach_set(pixels)
+        count += 1
+
+    return count
+
+
+def apply(job: dict):
+    count = apply_previews(job['files'], Path(job['output_dir']))
+    if count:
+        bpy.ops.wm.save_mainfile()
+    report(applied=count)
+
+
+if __name__ == '__main__':
+    mode, job = load_job()
+    if mode == 'fingerprint':
+        fingerprints(job)
+    elif mode == 'render':
+        render(job)
+    elif mode == 'apply':
+        apply(job)
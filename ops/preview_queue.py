@@ -0,0 +1,177 @@
+import bpy
+import time
+from typing import Iterable
+
+from .functions import material_key
+from .material_hash import material_fingerprint
+from .preview_cache import PreviewCache, preview_checksum
+from ..prefs.get_pref import get_pref
+
+ALL_CATALOG = '00000000-0000-0000-0000-000000000000'
+
+
+def visible_catalogs() -> set[str]:
+    """获取已打开的资产浏览器所显示的目录
+
+    :return: set[catalog_id]，包含ALL_CATALOG时表示显示全部
+    """
+    catalogs = set()
+    for window in bpy.context.window_manager.windows:
+        for area in window.screen.areas:
+            if area.type != 'FILE_BROWSER' or area.ui_type != 'ASSETS': continue
+            params = area.spaces[0].params
+            if params is None: continue
+            if params.asset_library_reference not in {'LOCAL', 'ALL'}: continue
+
+            catalogs.add(params.catalog_id or ALL_CATALOG)
+    return catalogs
+
+
+def tag_redraw_asset_browser():
+    for window in bpy.context.window_manager.windows:
+        for area in window.screen.areas:
+            if area.type == 'FILE_BROWSER':
+                area.tag_redraw()
+
+
+class PreviewQueue:
+    """分时生成资产预览，避免一次性生成卡住界面"""
+    high: dict[int, bpy.types.Material] = {}  # 资产浏览器中可见的材质，优先处理
+    low: dict[int, bpy.types.Material] = {}
+
+    time_budget: float = 0.008  # 每次计时器最多占用的时间 秒
+    interval: float = 0.02  # 计时器间隔 秒
+
+    total: int = 0  # 本轮请求数量，用于显示进度
+    done: int = 0
+
+    # 预览为后台渲染，渲染完成后再写入缓存
+    storing: dict[int, tuple[bpy.types.Material, str, int, float]] = {}  # key: (mat, fingerprint, checksum, time)
+    no_restore: set[int] = set()  # 重新渲染而不从缓存恢复的材质
+    store_delay: float = 0.5  # 秒
+    store_timeout: float = 10  # 秒
+
+    @classmethod
+    def pending(cls) -> int:
+        return len(cls.high) + len(cls.low)
+
+    @classmethod
+    def request(cls, mats: Iterable[bpy.types.Material], restore: bool = True):
+        """请求生成预览，同一材质的请求将合并
+
+        :param mats: Iterable[bpy.types.Material]
+        :param restore: 允许从缓存恢复，为False时重新渲染并更新缓存
+        """
+        catalogs = None
+
+        for mat in mats:
+            key = material_key(mat)
+            if not restore: cls.no_restore.add(key)
+            if key in cls.high or key in cls.low: continue
+
+            if catalogs is None: catalogs = visible_catalogs()
+
+            if catalogs and (ALL_CATALOG in catalogs or
+                             (mat.asset_data and mat.asset_data.catalog_id in catalogs)):
+                cls.high[key] = mat
+            else:
+                cls.low[key] = mat
+            cls.total += 1
+
+        cls.ensure_timer()
+
+    @classmethod
+    def ensure_timer(cls):
+        if cls.pending() == 0 and not cls.storing: return
+        # 计时器以函数对象识别，每次访问cls.tick都会得到新的绑定方法，需使用模块级函数
+        if bpy.app.timers.is_registered(queue_timer): return
+
+        bpy.app.timers.register(queue_timer, first_interval=0)
+
+    @classmethod
+    def pop(cls):
+        queue = cls.high if cls.high else cls.low
+        key = next(iter(queue))
+        return queue.pop(key)
+
+    @classmethod
+    def generate(cls, mat: bpy.types.Material, use_cache: bool, tree_hashes: dict):
+        restore = material_key(mat) not in cls.no_restore
+        cls.no_restore.discard(material_key(mat))
+
+        if not use_cache:
+            mat.asset_generate_preview()
+            return
+
+        fingerprint = material_fingerprint(mat, tree_hashes, include_preview=True)
+        if restore and PreviewCache.restore(mat, fingerprint): return
+
+        checksum = preview_checksum(mat)
+        mat.asset_generate_preview()
+        cls.storing[material_key(mat)] = (mat, fingerprint, checksum, time.time())
+
+    @classmethod
+    def store_finished(cls):
+        now = time.time()
+        for key, (mat, fingerprint, checksum, request_time) in list(cls.storing.items()):
+            if now - request_time < cls.store_delay: continue
+            try:
+                if PreviewCache.store(mat, fingerprint, checksum) or now - request_time > cls.store_timeout:
+                    cls.storing.pop(key)
+            except ReferenceError:
+                cls.storing.pop(key)
+
+    @classmethod
+    def tick(cls):
+        start = time.perf_counter()
+        use_cache = get_pref().use_preview_cache
+        tree_hashes = {}
+
+        while cls.pending():
+            mat = cls.pop()
+            cls.done += 1
+            try:
+                cls.generate(mat, use_cache, tree_hashes)
+            except ReferenceError:  # 材质已被删除
+                pass
+
+            if time.perf_counter() - start > cls.time_budget: break
+
+        if cls.storing and time.perf_counter() - start < cls.time_budget:
+            cls.store_finished()
+
+        tag_redraw_asset_browser()
+
+        if cls.pending() == 0:
+            cls.total = 0
+            cls.done = 0
+            if not cls.storing: return None
+
+        return cls.interval
+
+    @classmethod
+    def clear(cls):
+        cls.high.clear()
+        cls.low.clear()
+        cls.storing.clear()
+        cls.no_restore.clear()
+        cls.total = 0
+        cls.done = 0
+
+        if bpy.app.timers.is_registered(queue_timer):
+            bpy.app.timers.unregister(queue_timer)
+
+
+def queue_timer():
+    return PreviewQueue.tick()
+
+
+def draw_progress(layout):
+    """在资产浏览器头部绘制预览进度"""
+    if PreviewQueue.total == 0: return
+
+    layout.label(text=f'Preview {PreviewQueue.done}/{PreviewQueue.total}', icon='TIME')
+
+
+def unregister():
+    PreviewQueue.clear()
@@ -0,0 +1,129 @@
+import bpy
+from typing import Optional
+
+from bpy.app.handlers import persistent
+from bpy_extras import asset_utils
+
+from .functions import material_key
+
+SYNC_OBJECT_TYPES = {'MESH', 'CURVE', 'FONT', 'META', 'VOLUME', 'GPENCIL', 'SURFACE'}
+
+_msgbus_owner = object()
+
+
+class AssetBrowserCache:
+    """缓存资产浏览器区域位置，区域本身不是ID，只保存索引并从screen重新获取"""
+    screen_key: int = 0
+    area_index: int = -1
+
+    @classmethod
+    def get(cls, screen: bpy.types.Screen) -> Optional[bpy.types.Area]:
+        areas = screen.areas
+        if cls.screen_key == screen.as_pointer() and 0 <= cls.area_index < len(areas):
+            area = areas[cls.area_index]
+            if area.type == 'FILE_BROWSER' and area.ui_type == 'ASSETS':
+                return area
+
+        cls.screen_key = screen.as_pointer()
+        cls.area_index = -1
+        for i, area in enumerate(areas):
+            if area.type == 'FILE_BROWSER' and area.ui_type == 'ASSETS':
+                cls.area_index = i
+                return area
+        return None
+
+
+class SelectionSync:
+    """物体/材质选择同步，只在选择变化时更新资产浏览器"""
+    last_object: int = 0
+    last_mats: tuple[int, ...] = ()
+
+    @classmethod
+    def reset(cls):
+        cls.last_object = 0
+        cls.last_mats = ()
+
+    @classmethod
+    def apply(cls, area: bpy.types.Area, obj: bpy.types.Object):
+        mats = [slot.material for slot in obj.material_slots if slot.material]
+        mats.reverse()
+        keys = tuple(material_key(mat) for mat in mats)
+        obj_key = obj.as_pointer()
+
+        if obj_key == cls.last_object and keys == cls.last_mats: return
+
+        space_data = area.spaces[0]
+        if not asset_utils.SpaceAssetInfo.is_asset_browser(space_data): return
+
+        # 有材质被移除时需要重新选择，否则只激活新增的材质
+        if obj_key != cls.last_object or not set(cls.last_mats).issubset(keys):
+            space_data.deselect_all()  # window上有bug
+            new_mats = mats
+        else:
+            known = set(cls.last_mats)
+            new_mats = [mat for mat, key in zip(mats, keys) if key not in known]
+
+        for mat in new_mats:
+            space_data.activate_asset_by_id(mat, deferred=False)
+
+        cls.last_object = obj_key
+        cls.last_mats = keys
+        area.tag_redraw()
+
+
+def update_active_object_material():
+    context = bpy.context
+    wm = context.window_manager
+    if context.scene is None or context.scene.mathp_update_mat is False:
+        return
+    elif wm.mathp_update_active_obj_mats is False:
+        return
+    elif context.window is None:
+        return
+
+    obj = context.view_layer.objects.active
+    if obj is None or obj.type not in SYNC_OBJECT_TYPES: return
+    if len(obj.material_slots) == 0: return
+    if not obj.select_get(): return
+
+    asset_area = AssetBrowserCache.get(context.window.screen)
+    if asset_area is None: return
+
+    try:
+        SelectionSync.apply(asset_area, obj)
+    except Exception as e:
+        print(e)
+
+
+def on_sync_toggle(self, context):
+    SelectionSync.reset()
+    update_active_object_material()
+
+
+def subscribe():
+    bpy.msgbus.clear_by_owner(_msgbus_owner)
+
+    for key in (
+            (bpy.types.LayerObjects, 'active'),
+            (bpy.types.MaterialSlot, 'material'),
+            (bpy.types.Object, 'active_material'),
+    ):
+        bpy.msgbus.subscribe_rna(key=key, owner=_msgbus_owner, args=(),
+                                 notify=update_active_object_material)
+
+
+@persistent
+def resubscribe(dummy):
+    # 打开文件后订阅会被清除
+    SelectionSync.reset()
+    subscribe()
+
+
+def register():
+    subscribe()
+    bpy.app.handlers.load_post.append(resubscribe)
+
+
+def unregister():
+    bpy.app.handlers.load_post.remove(resubscribe)
+    bpy.msgbus.clear_by_owner(_msgbus_owner)
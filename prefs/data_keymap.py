@@ -34,6 +34,11 @@ def register():
     km = wm.keyconfigs.addon.keymaps.new(name='Node Editor', space_type='NODE_EDITOR')
     kmi = km.keymap_items.new('mathp.align_dependence', 'A', 'PRESS', ctrl=True)
     addon_keymaps.append((km, kmi))
+    # 整体布局
+    km = wm.keyconfigs.addon.keymaps.new(name='Node Editor', space_type='NODE_EDITOR')
+    kmi = km.keymap_items.new('mathp.align_dependence', 'A', 'PRESS', ctrl=True, shift=True)
+    kmi.properties.mode = 'TREE'
+    addon_keymaps.append((km, kmi))
     # 控制依赖项
     km = wm.keyconfigs.addon.keymaps.new(name='Node Editor', space_type='NODE_EDITOR')
     kmi = km.keymap_items.new('mathp.move_dependence', 'D', 'PRESS')
@@ -1,7 +1,7 @@
 import bpy
 import rna_keymap_ui
 from .. import __ADDON_NAME__
-from bpy.props import EnumProperty, StringProperty, IntProperty, BoolProperty, PointerProperty
+from bpy.props import EnumProperty, StringProperty, IntProperty, FloatProperty, BoolProperty, PointerProperty
 from bpy.types import PropertyGroup
 
 
@@ -49,6 +49,21 @@ class MATHP_Preference(bpy.types.AddonPreferences):
     # align
     node_dis_x: IntProperty(name='Node Distance X', default=100, min=0, soft_max=200)
     node_dis_y: IntProperty(name='Node Distance Y', default=50, min=0, soft_max=100)
+    align_anim_fps: IntProperty(name='Animation FPS', default=60, min=10, max=240,
+                                description='Update rate of the align animation, match it to the display refresh rate')
+    align_anim_max_nodes: IntProperty(name='Max Animated Nodes', default=300, min=0,
+                                      description='Move nodes directly without animation above this node count')
+
+    # auto update
+    handler_quiet_time: FloatProperty(name='Update Delay (s)', default=0.25, min=0.01, soft_max=2,
+                                      description='Wait until the scene stops changing for this long before updating temp assets and selection')
+
+    # preview cache
+    use_preview_cache: BoolProperty(name='Preview Cache', default=True,
+                                    description='Restore previews of unchanged materials from disk instead of rendering')
+    preview_cache_dir: StringProperty(name='Cache Directory', subtype='DIR_PATH',
+                                      description='Leave empty to use the default directory in user data files')
+    preview_cache_size: IntProperty(name='Cache Size (MB)', default=256, min=16, soft_max=4096)
 
     def draw(self, context):
         layout = self.layout
@@ -95,6 +110,27 @@ class MATHP_Preference(bpy.types.AddonPreferences):
         box.label(text='Align Dependence', icon='NODETREE')
         box.prop(self, 'node_dis_x', slider=True)
         box.prop(self, 'node_dis_y', slider=True)
+        box.prop(self, 'align_anim_fps')
+        box.prop(self, 'align_anim_max_nodes')
+
+        col.separator()
+
+        box = col.box()
+        box.label(text='Auto Update', icon='FILE_REFRESH')
+        box.prop(self, 'handler_quiet_time')
+
+        col.separator()
+
+        box = col.box()
+        box.label(text='Preview Cache', icon='FILE_CACHE')
+        box.prop(self, 'use_preview_cache')
+        if self.use_preview_cache:
+            from ..ops.preview_cache import draw_cache_stats
+
+            box.prop(self, 'preview_cache_dir')
+            box.prop(self, 'preview_cache_size')
+            draw_cache_stats(box)
+            box.operator('mathp.clear_preview_cache', icon='TRASH')
 
     def draw_keymap(self, context, layout):
         col = layout.box().column()
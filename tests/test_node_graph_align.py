@@ -0,0 +1,121 @@
+"""DependenceAligner在树形结构上与原逐层递归实现的结果对比，不需要Blender::
+
+    python -m pytest tests
+"""
+
+import sys
+import random
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from node_graph import GraphIndex, DependenceAligner  # noqa: E402
+from node_graph.model import NodeTree, abs_location  # noqa: E402
+
+
+def reference_align(index, sizes, locations, node, selected_nodes=None, check_dependent=False,
+                    dis_x=100, dis_y=50, targets=None):
+    """原op_align_nodes中的递归实现，没有任何剪枝"""
+    if targets is None: targets = {}
+
+    dependence = index.dependence(node, selected_nodes)
+    if node in targets:
+        last_location_x, last_location_y = targets[node]
+    else:
+        last_location_x, last_location_y = locations[node]
+        targets[node] = locations[node]
+    last_dimensions_y = sizes[node][1]
+
+    for i, sub_node in enumerate(dependence):
+        if selected_nodes and sub_node not in selected_nodes: continue
+        sub_dim_x, sub_dim_y = sizes[sub_node]
+
+        if check_dependent:
+            dependent_nodes = index.dependent(sub_node, selected_nodes)
+            if len(dependent_nodes) > 1:
+                dep_locations = [targets.get(n, locations[n]) for n in dependent_nodes]
+                targets[sub_node] = (min(loc[0] for loc in dep_locations) - sub_dim_x - dis_x,
+                                     sum(loc[1] for loc in dep_locations) / len(dep_locations))
+            elif len(dependent_nodes) == 1:
+                reference_align(index, sizes, locations, dependent_nodes[0], selected_nodes,
+                                dis_x=dis_x, dis_y=dis_y, targets=targets)
+        else:
+            tg_loc_x = last_location_x - sub_dim_x - dis_x
+            tg_loc_y = last_location_y - last_dimensions_y - dis_y if i != 0 else last_location_y
+            targets[sub_node] = (tg_loc_x, tg_loc_y)
+            last_location_y = tg_loc_y
+            last_dimensions_y = sub_dim_y
+
+        reference_align(index, sizes, locations, sub_node, selected_nodes, check_dependent,
+                        dis_x, dis_y, targets)
+
+    return targets
+
+
+def tree_data(tree):
+    index = GraphIndex.from_tree(tree)
+    nodes = [node for node in tree.nodes if node not in index.reroutes]
+    sizes = {node: node.dimensions for node in nodes}
+    locations = {node: abs_location(node) for node in nodes}
+    return index, sizes, locations
+
+
+def random_tree(count, seed):
+    """每个节点只连接一个下游节点的随机树"""
+    rng = random.Random(seed)
+    tree = NodeTree()
+    tree.new_node('ShaderNodeOutputMaterial', inputs=3, outputs=0)
+    for i in range(1, count):
+        node = tree.new_node(inputs=3, dimensions=(140.0, rng.uniform(80.0, 400.0)))
+        node.location = [rng.uniform(-2000, 0), rng.uniform(-1000, 1000)]
+        target = tree.nodes[rng.randrange(i)]
+        tree.link(node, target, rng.randrange(len(target.inputs)))
+    return tree
+
+
+def test_diamond_places_shared_node_once():
+    tree = NodeTree()
+    out = tree.new_node('ShaderNodeOutputMaterial', inputs=2, outputs=0)
+    a, b, s, x = (tree.new_node() for _ in range(4))
+    a.location, b.location = [0.0, 300.0], [0.0, -300.0]
+    tree.link(a, out, 0)
+    tree.link(b, out, 1)
+    tree.link(s, a)
+    tree.link(s, b)
+    tree.link(x, s)
+
+    index, sizes, locations = tree_data(tree)
+    result = DependenceAligner(index, sizes, locations).align(out, None, True)
+    assert set(result) == {out, a, b, s, x}
+    # 共享节点放在下游节点的平均高度
+    assert result[s][1] == (result[a][1] + result[b][1]) / 2
+
+
+def test_closure_reroutes_and_muted_links():
+    tree = NodeTree()
+    out = tree.new_node('ShaderNodeOutputMaterial', inputs=2, outputs=0)
+    a, b = tree.new_node(), tree.new_node()
+    reroute = tree.new_node('NodeReroute')
+    tree.link(a, reroute)
+    tree.link(reroute, out, 0)
+    tree.link(b, out, 1).is_muted = True
+
+    index = GraphIndex.from_tree(tree)
+    assert index.all_dependence(out) == [a, b]
+    assert index.all_dependence(out, keep_reroutes=True) == [reroute, a, b]
+    assert index.all_dependent(a, keep_reroutes=True) == [reroute, out]
+
+
+@pytest.mark.parametrize('check_dependent', (False, True))
+@pytest.mark.parametrize('seed', range(20))
+def test_tree_matches_reference(seed, check_dependent):
+    tree = random_tree(60, seed)
+    index, sizes, locations = tree_data(tree)
+    output = tree.nodes[0]
+    selected = set(index.all_dependence(output)) | {output}
+
+    expected = reference_align(index, sizes, locations, output, selected, check_dependent)
+    result = DependenceAligner(index, sizes, locations).align(output, selected, check_dependent)
+    assert result == expected